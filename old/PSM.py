@@ -1,45 +1,99 @@
 import random
-from itertools import combinations
 
-def generate_PSM(players):
-    try:
-        if len(players) % 2 != 0:
-            raise ValueError("Number of players must be even")
 
-        # All unique player pairs
-        all_pairs = set(combinations(players, 2))
-        used_pairs = set()
-        rounds = []
+def circle_rounds(n):
+    """
+    Circle method on player indices 0..n-1 (n even): index n-1 stays fixed and the
+    others rotate. Returns n - 1 rounds of n / 2 index pairs; every pair meets once.
+    """
+    m = n - 1
+    rounds = []
+    for r in range(m):
+        pairs = [(r, m)]
+        for j in range(1, n // 2):
+            pairs.append(((r + j) % m, (r - j) % m))
+        rounds.append(pairs)
+    return rounds
 
-        # Number of rounds needed: (n choose 2) / (n / 2) = n - 1
-        max_rounds = len(players) - 1
 
-        for _ in range(max_rounds):
-            available_pairs = list(all_pairs - used_pairs)
-            random.shuffle(available_pairs)
+def stranger_rounds(n):
+    """
+    Contagion-free rounds on indices 0..n-1 (padded to the next power of two, 2^k):
+    in round r, i meets i XOR 2^r. After r rounds a player has only been influenced by
+    their aligned block of 2^r indices, and each new partner comes from a disjoint
+    block, so no one ever meets a past opponent's later partner (directly or through a
+    longer chain). This gives k = ceil(log2 n) rounds, the most any contagion-free
+    schedule can have when the pool is a power of two. Pairs with a padding index are byes.
+    """
+    k = max(1, (n - 1).bit_length())
+    rounds = []
+    for r in range(k):
+        bit = 1 << r
+        pairs = []
+        for i in range(n):
+            j = i ^ bit
+            if i < j:  # Each pair once, from its lower index
+                pairs.append((i, j if j < n else None))
+        rounds.append(pairs)
+    return rounds
 
-            round_pairs = []
-            used_players = set()
 
-            for pair in available_pairs:
-                a, b = pair
-                if a in used_players or b in used_players:
-                    continue
-                round_pairs.append(pair)
-                used_players.update([a, b])
-                used_pairs.add(pair)
+def generate_PSM(players, seed=None, no_contagion=False):
+    """
+    Perfect stranger matching schedule: a list of rounds, each a list of (a, b) pairs.
 
-                if len(used_players) == len(players):
-                    break
+    Default: a full round robin by the circle method (n - 1 rounds for even n,
+    n rounds for odd n), so every pair meets exactly once.
+    no_contagion=True: ceil(log2 n) rounds where no player ever meets anyone
+    their past opponents have met since (see stranger_rounds).
 
-            if len(round_pairs) != len(players) // 2:
-                raise Exception("Could not find valid non-repeating pairings.")
+    With an odd number of players (or in no_contagion mode when n is not a power of
+    two), a player with a bye is paired with None.
+    seed shuffles which player gets which slot in the schedule; the same seed gives the
+    same schedule. Runs in O(n^2) (O(n log n) with no_contagion).
+    """
+    labels = list(players)
+    random.Random(seed).shuffle(labels)
+    n = len(labels)
+    if n < 2:
+        return []
 
-            rounds.append(round_pairs)
+    if no_contagion:
+        index_rounds = stranger_rounds(n)
+    else:
+        if n % 2:
+            labels.append(None)  # Bye
+        index_rounds = circle_rounds(len(labels))
 
-        return rounds
-    except:
-        return generate_PSM(players)
+    def label(i):
+        return None if i is None else labels[i]
+
+    rounds = []
+    for index_pairs in index_rounds:
+        rounds.append([(label(a), label(b)) for a, b in index_pairs])
+    return rounds
+
+
+def has_contagion(rounds):
+    """
+    True if some player meets someone already influenced by them: a past opponent,
+    or anyone reachable through the later games of past opponents.
+    """
+    influenced = {}  # player -> set of players whose influence has reached them
+    for round_pairs in rounds:
+        updates = []
+        for a, b in round_pairs:
+            if a is None or b is None:
+                continue
+            seen_a = influenced.setdefault(a, {a})
+            seen_b = influenced.setdefault(b, {b})
+            if seen_a & seen_b:
+                return True
+            updates.append((a, b, seen_a | seen_b))
+        for a, b, merged in updates:
+            influenced[a] = merged
+            influenced[b] = set(merged)
+    return False
 
 
 # players = ['P1', 'P2', 'P3', 'P4']
@@ -0,0 +1,288 @@
+"""
+Streaming analytics over the text session logs.
+
+Session logs are memory-mapped (or streamed, for .gz archives) one line at a time, so a
+multi-GB log never has to fit in memory. Each game line becomes a typed GameRecord with
+the players' names joined from the matching name log. Summary aggregates games in
+constant memory (the only per-game state is a take-turn histogram, bounded by the
+longest game).
+
+    python analytics.py logs/                        # every session log in a directory
+    python analytics.py logs/session_lab2_*.txt --json
+    python analytics.py archive/ --games | head      # one tab-separated line per game
+    python analytics.py archive/ --jobs 8            # summarize files in 8 processes
+
+Both servers write the player who took the pot first ("taker:other|moves" in app.py,
+"P1_SID: taker, P2_SID: other, ..." in app_gemini.py). Player 1 moves on odd turns, so
+the take turn's parity says which of the two was player 1.
+"""
+import argparse, glob, gzip, json, mmap, multiprocessing, os, sys
+from typing import NamedTuple, Optional
+
+from game_record import parse_session_line
+from payoff import PayoffTable
+from score_ledger import replay_score_log
+
+SESSION_PREFIX = 'session_'
+NAME_PREFIX = 'name_log_'
+SCORE_PREFIX = 'totalscore_log_'
+
+
+class GameRecord(NamedTuple):
+    session: str  # Session log file name
+    p1: str  # Player 1 (moves first) sid or token
+    p2: str
+    p1_name: Optional[str]  # From the name log, None if the player is not in it
+    p2_name: Optional[str]
+    moves: str  # '0' pass, '2' pass with the random event, 'x' take ('P' pass of unknown kind)
+    take_turn: int  # 1-based turn the pot was taken on, 0 if nobody took it
+    taker: Optional[str]  # 'p1', 'p2' or None
+    events: Optional[int]  # Random '2' events, None if the log format does not record them
+    p1_payoff: int  # Final payoffs under linear_payoff
+    p2_payoff: int
+    bot: bool  # A bot player (token 'bot_...') was in the game
+
+
+def iter_lines(path):
+    """
+    Yields the lines of a log file as bytes (without the newline). Plain files are
+    memory-mapped; .gz files are decompressed as a stream.
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            for line in f:
+                yield line.rstrip(b'\r\n')
+        return
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return  # mmap cannot map an empty file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for line in iter(buf.readline, b''):
+                yield line.rstrip(b'\r\n')
+
+
+def companion_path(session_path, prefix):
+    """
+    The name or score log written alongside a session log
+    (session_lab2_20250101_120000.txt -> name_log_lab2_20250101_120000.txt).
+    A compressed session log may sit next to plain companion logs.
+    """
+    directory, base = os.path.split(session_path)
+    path = os.path.join(directory, prefix + base[len(SESSION_PREFIX):])
+    if not os.path.exists(path) and path.endswith('.gz'):
+        return path[:-len('.gz')]
+    return path
+
+
+def load_names(path):
+    """
+    Returns {sid: name} from a name log ("sid: name" per line); {} if there is none.
+    """
+    names = {}
+    if not os.path.exists(path):
+        return names
+    for line in iter_lines(path):
+        sid, sep, name = line.decode('utf-8', 'replace').partition(': ')
+        if sep:
+            names[sid] = name
+    return names
+
+
+def find_session_logs(paths):
+    """
+    Expands directories into the session logs they contain; files are kept as given.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, f"{SESSION_PREFIX}*.txt*"))))
+        else:
+            found.append(path)
+    return found
+
+
+def iter_games(session_path, names=None, payoff_table=None):
+    """
+    Yields a GameRecord for every game line in one session log. names defaults to the
+    session's name log; payoff_table to linear_payoff.
+    """
+    if names is None:
+        names = load_names(companion_path(session_path, NAME_PREFIX))
+    table = payoff_table or PayoffTable.from_schedule('linear')
+    session = os.path.basename(session_path)
+    for line in iter_lines(session_path):
+        # Fast path for the app.py format; anything else goes through the shared parser
+        players, sep, moves = line.partition(b'|')
+        sid1, colon, sid2 = players.partition(b':')
+        if sep and colon:
+            sid1, sid2, moves = sid1.decode(), sid2.decode(), moves.decode()
+            events = moves.count('2')
+        else:
+            parsed = parse_session_line(line.decode('utf-8', 'replace'))
+            if parsed is None:
+                continue
+            sid1, sid2, moves = parsed
+            moves = moves.replace(',', '').replace('T', 'x')
+            events = None  # app_gemini.py logs every pass as 'P'
+        take_turn = moves.find('x') + 1
+        if take_turn % 2:  # Taken on an odd turn (by player 1), or not taken at all
+            p1, p2 = sid1, sid2
+        else:
+            p1, p2 = sid2, sid1
+        taker = None if not take_turn else ('p1' if take_turn % 2 else 'p2')
+        p1_payoff, p2_payoff = table.lookup(take_turn) if take_turn else (0, 0)
+        yield GameRecord(session, p1, p2, names.get(p1), names.get(p2), moves, take_turn, taker, events,
+                         p1_payoff, p2_payoff, p1.startswith('bot_') or p2.startswith('bot_'))
+
+
+def iter_players(session_path):
+    """
+    Yields (session, sid, name, final total score) for every player in a session's
+    name log, with the total from its score log (0 if they never finished a game).
+    """
+    session = os.path.basename(session_path)
+    totals = replay_score_log(companion_path(session_path, SCORE_PREFIX))
+    for sid, name in load_names(companion_path(session_path, NAME_PREFIX)).items():
+        yield session, sid, name, totals.get(sid, 0)
+
+
+class Summary:
+    """
+    Constant-memory aggregates over a stream of GameRecords.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.bot_games = 0
+        self.sessions = set()
+        self.moves = 0
+        self.taken = 0
+        self.p1_takes = 0
+        self.events = 0
+        self.event_moves = 0  # Passes in logs that record events
+        self.p1_payoff = 0
+        self.p2_payoff = 0
+        self.take_turns = []  # take_turns[t] = games taken on turn t
+
+    def add(self, game):
+        self.games += 1
+        self.bot_games += game.bot
+        self.sessions.add(game.session)
+        self.moves += len(game.moves)
+        if game.take_turn:
+            self.taken += 1
+            self.p1_takes += game.taker == 'p1'
+            if game.take_turn >= len(self.take_turns):
+                self.take_turns.extend([0] * (game.take_turn + 1 - len(self.take_turns)))
+            self.take_turns[game.take_turn] += 1
+        if game.events is not None:
+            self.events += game.events
+            self.event_moves += len(game.moves) - (game.take_turn > 0)
+        self.p1_payoff += game.p1_payoff
+        self.p2_payoff += game.p2_payoff
+
+    def merge(self, other):
+        """
+        Adds another Summary's counts to this one (e.g. from another file or process).
+        """
+        for name in ('games', 'bot_games', 'moves', 'taken', 'p1_takes', 'events', 'event_moves',
+                     'p1_payoff', 'p2_payoff'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.sessions |= other.sessions
+        if len(other.take_turns) > len(self.take_turns):
+            self.take_turns.extend([0] * (len(other.take_turns) - len(self.take_turns)))
+        for turn, count in enumerate(other.take_turns):
+            self.take_turns[turn] += count
+
+    def take_turn_percentile(self, p):
+        target = self.taken * p / 100
+        seen = 0
+        for turn, count in enumerate(self.take_turns):
+            seen += count
+            if count and seen >= target:
+                return turn
+        return 0
+
+    def to_dict(self):
+        games = max(self.games, 1)
+        return {
+            'sessions': len(self.sessions),
+            'games': self.games,
+            'bot_games': self.bot_games,
+            'moves': self.moves,
+            'mean_moves': round(self.moves / games, 3),
+            'take_turn_p25': self.take_turn_percentile(25),
+            'take_turn_median': self.take_turn_percentile(50),
+            'take_turn_p75': self.take_turn_percentile(75),
+            'p1_take_share': round(self.p1_takes / max(self.taken, 1), 4),
+            'event_rate': round(self.events / self.event_moves, 4) if self.event_moves else None,
+            'mean_p1_payoff': round(self.p1_payoff / games, 3),
+            'mean_p2_payoff': round(self.p2_payoff / games, 3),
+            'take_turns': {turn: count for turn, count in enumerate(self.take_turns) if count},
+        }
+
+
+def summarize_file(path, include_bots=True):
+    summary = Summary()
+    for game in iter_games(path):
+        if include_bots or not game.bot:
+            summary.add(game)
+    return summary
+
+
+def summarize(paths, include_bots=True, jobs=1):
+    """
+    Summarizes every session log under paths. With jobs > 1 the files are split across
+    that many processes, each streaming its own files, and the results are merged.
+    """
+    files = find_session_logs(paths)
+    summary = Summary()
+    if jobs > 1 and len(files) > 1:
+        with multiprocessing.Pool(min(jobs, len(files))) as pool:
+            for part in pool.starmap(summarize_file, [(path, include_bots) for path in files]):
+                summary.merge(part)
+    else:
+        for path in files:
+            summary.merge(summarize_file(path, include_bots))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream session logs into game records and aggregates.")
+    parser.add_argument('paths', nargs='+', help="session logs or directories of them")
+    parser.add_argument('--games', action='store_true', help="print one tab-separated line per game instead")
+    parser.add_argument('--players', action='store_true', help="print each player's name and final total instead")
+    parser.add_argument('--no-bots', action='store_true', help="leave out games with a bot player")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    parser.add_argument('--jobs', type=int, default=1, help="processes to summarize files in")
+    args = parser.parse_args()
+
+    if args.games:
+        print('\t'.join(GameRecord._fields))
+        for path in find_session_logs(args.paths):
+            for game in iter_games(path):
+                if not (args.no_bots and game.bot):
+                    print('\t'.join('' if value is None else str(value) for value in game))
+        return
+
+    if args.players:
+        print('session\tsid\tname\ttotal_score')
+        for path in find_session_logs(args.paths):
+            for row in iter_players(path):
+                if not (args.no_bots and row[1].startswith('bot_')):
+                    print('\t'.join(str(value) for value in row))
+        return
+
+    summary = summarize(args.paths, include_bots=not args.no_bots, jobs=args.jobs).to_dict()
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+        return
+    for key, value in summary.items():
+        if key != 'take_turns':
+            print(f"{key:>16}: {value}")
+    print(f"{'take turns':>16}: " + ' '.join(f"{turn}:{count}" for turn, count in summary['take_turns'].items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,110 +1,196 @@
-from flask import Flask, render_template, request
+import server_backend  # First: selects the async backend (and monkey-patches for eventlet/gevent)
+from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO, emit, join_room
-import random, os, datetime, time
+import os, re, threading, time, atexit
+from log_pipeline import LogPipeline
+from protocol import Protocol
+from session import Session
+from checkpoint import saved_sessions
+import metrics
+import profiling
+from timers import DeadlineScheduler
 
 app = Flask(__name__)
-socketio = SocketIO(app)
+socketio = SocketIO(app, async_mode=server_backend.ASYNC_MODE)
+profiler = profiling.install(socketio)  # Times every handler and background task once enabled (PROFILE=1)
 
-# Session log setup
+# Session log setup (each session writes its own session/name/score files here)
 log_dir = "logs"
 os.makedirs(log_dir, exist_ok=True)
-session_log_filename = f"session_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-session_log_path = os.path.join(log_dir, session_log_filename)
-name_log_filename = f"name_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-name_log_path = os.path.join(log_dir, name_log_filename)
-score_log_filename = f"totalscore_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-score_log_path = os.path.join(log_dir, score_log_filename)
 
+# All log writes go through a background write-behind pipeline so handlers never block on disk
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '0.5'))  # seconds between batched writes
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))  # max queued lines before writers wait
+log_pipeline = LogPipeline(flush_interval=LOG_FLUSH_INTERVAL, max_queue=LOG_QUEUE_SIZE)
+atexit.register(log_pipeline.close)  # Durable flush on shutdown (runs after the ledger compacts)
 
-# Data structures
-players = {}  # sid -> {'game_log': str, 'opponent': sid, 'turn': bool, 'ready_for_next_game': bool}
-waiting_players = []
-current_round_index = -1 # Tracks the current round being played (-1 means not started)
-all_rounds_pairings = [] # Stores all generated round-robin pairings
-games_in_current_round = {} # game_id -> {'p1_sid': sid, 'p2_sid': sid, 'completed': bool}
-
-# --- Helpers ---
-
-def update_total_score_log(sid, total_score):
-    if not os.path.exists(score_log_path):
-        with open(score_log_path, 'w') as f:
-            pass  # Just create the file if it doesn't exist
-
-    # Read all existing lines
-    with open(score_log_path, 'r') as f:
-        lines = f.readlines()
-
-    # Remove any previous entry for this sid
-    lines = [line for line in lines if not line.startswith(sid)]
+# Payoffs are precomputed once per session; PAYOFF_CONFIG points to a JSON schedule/array config.
+# These are the defaults; a commander can pick another schedule when creating a session.
+PAYOFF_SCHEDULE = os.environ.get('PAYOFF_SCHEDULE', 'linear')
+PAYOFF_CONFIG = os.environ.get('PAYOFF_CONFIG')
 
-    # Add new score entry
-    lines.append(f"{sid}:{total_score}\n")
+# Game frames use protocol v2 (one combined frame per player) unless SOCKET_PROTOCOL=1
+protocol = Protocol(socketio, version=int(os.environ.get('SOCKET_PROTOCOL', '2')))
 
-    # Write back to file
-    with open(score_log_path, 'w') as f:
-        f.writelines(lines)
-def update_total_score_log(sid, total_score):
-    if not os.path.exists(score_log_path):
-        with open(score_log_path, 'w') as f:
-            pass  # Just create the file if it doesn't exist
+# Commander roster updates are coalesced and sent every COMMANDER_TICK seconds
+COMMANDER_TICK = float(os.environ.get('COMMANDER_TICK', '0.25'))
 
-    # Read all existing lines
-    with open(score_log_path, 'r') as f:
-        lines = f.readlines()
 
-    # Remove any previous entry for this sid
-    lines = [line for line in lines if not line.startswith(sid)]
-
-    # Add new score entry
-    lines.append(f"{sid}:{total_score}\n")
-
-    # Write back to file
-    with open(score_log_path, 'w') as f:
-        f.writelines(lines)
-
-
-def linear_payoff(turn_number, p1_start=2, p2_start=1, increment=2):
-    if turn_number < 1:
-        return p1_start, p2_start  # Fallback if something weird happens
-    p1 = p1_start + ((turn_number - 1) // 2) * increment
-    p2 = p2_start + ((turn_number) // 2) * increment
-    return p1, p2
+# Data structures
+# One process hosts many sessions; each Session has its own players, schedule, round
+# tracker, payoff table, commander room and log files (see session.py).
+# Players are identified by a stable token (not request.sid), so they can rejoin.
+sessions = {}  # session code -> Session
+connections = {}  # sid -> (Session, player token) for each connected player
+commander_sessions = {}  # commander sid -> Session they are monitoring
+sessions_lock = threading.Lock()
+DEFAULT_SESSION = os.environ.get('DEFAULT_SESSION', 'main') # Used when a player or commander gives no code
+SESSION_CODE = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+ROUND_DELAY = float(os.environ.get('ROUND_DELAY', '2')) # Seconds between the end of a round and the next
+MAX_ROUNDS = int(os.environ.get('MAX_ROUNDS', '0')) # Play only this many rounds (0 = the full round robin)
+# 'barrier': a round starts when every game of the previous one is over. 'pipelined': a
+# player's next game starts as soon as they and their next scheduled opponent are free.
+ROUND_MODE = os.environ.get('ROUND_MODE', 'barrier')
+# Each session draws its shuffle, '2' events and bot moves from one seed, written to its
+# params log. SEED fixes it for every new session (default: a fresh seed per session).
+SEED = os.environ.get('SEED') or None
+EVENT_PROBABILITY = float(os.environ.get('EVENT_PROBABILITY', '0.25'))  # Chance a pass is a '2' pass
+# Bot that fills the bye when a session has an odd number of players: 'mimic', 'fixed:<turn>'
+# or 'random:<p>' (see bots.py). Set to '' to give byes instead.
+BOT_STRATEGY = os.environ.get('BOT_STRATEGY', 'mimic')
+# Turn deadlines: a player who has not moved within TURN_TIMEOUT seconds gets TURN_TIMEOUT_MOVE
+# ('pass' or 'take') played for them; after TURN_TIMEOUT_STRIKES timeouts in one game they
+# take, so a game always ends and its round can finish. TURN_TIMEOUT=0 turns this off.
+TURN_TIMEOUT = float(os.environ.get('TURN_TIMEOUT', '60'))
+TURN_TIMEOUT_MOVE = os.environ.get('TURN_TIMEOUT_MOVE', 'pass')
+TURN_TIMEOUT_STRIKES = int(os.environ.get('TURN_TIMEOUT_STRIKES', '2'))
+if TURN_TIMEOUT_MOVE not in ('pass', 'take'):
+    raise ValueError(f"TURN_TIMEOUT_MOVE must be 'pass' or 'take', not '{TURN_TIMEOUT_MOVE}'")
+turn_deadlines = DeadlineScheduler(socketio)  # One timer task for every game's turn deadline
+
+# Crash safety: every state change goes to a per-session WAL and sessions are snapshotted
+# every CHECKPOINT_EVERY changes or CHECKPOINT_INTERVAL seconds. Sessions found in
+# CHECKPOINT_DIR are restored at startup. Set CHECKPOINT_DIR to '' to turn this off.
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR', 'checkpoints')
+CHECKPOINT_EVERY = int(os.environ.get('CHECKPOINT_EVERY', '500'))
+CHECKPOINT_INTERVAL = float(os.environ.get('CHECKPOINT_INTERVAL', '30'))
+session_settings = dict(log_dir=log_dir, commander_tick=COMMANDER_TICK, checkpoint_every=CHECKPOINT_EVERY,
+                        checkpoint_interval=CHECKPOINT_INTERVAL)
+
+# Live health metrics (served at /metrics and in the commander panel)
+JOINS = metrics.counter('joins_total', "Players who joined a session")
+REJOINS = metrics.counter('rejoins_total', "Players who rejoined with their token")
+MOVES = metrics.counter('moves_total', "Moves handled, including bot moves")
+MOVE_SECONDS = metrics.histogram('move_handler_seconds', "Time to handle one move")
+GAMES = metrics.counter('games_total', "Games finished")
+ROUNDS = metrics.counter('rounds_total', "Rounds finished")
+ROUND_SECONDS = metrics.histogram('round_duration_seconds', "Time from a round's start to its last game ending",
+                                  buckets=metrics.DURATION_BUCKETS)
+TIMEOUTS = metrics.counter('turn_timeouts_total', "Turns played automatically after their deadline")
+metrics.gauge('turn_deadlines', "Pending turn deadlines", fn=lambda: len(turn_deadlines))
+ROUND_START_SECONDS = metrics.histogram('round_setup_seconds', "Time to pair players and send a round's start frames")
+metrics.gauge('sessions', "Sessions hosted by this process", fn=lambda: len(sessions))
+metrics.gauge('connected_players', "Player connections", fn=lambda: len(connections))
+metrics.gauge('active_games', "Games in progress across all sessions",
+              fn=lambda: sum(active_games(session) for session in list(sessions.values())))
 
-def exponential_payoff(turn_number, p1_base=2, p2_base=1, growth_rate=1.5):
-    if turn_number < 1:
-        return p1_base, p2_base
-    p1 = int(p1_base * (growth_rate ** ((turn_number - 1) // 2)))
-    p2 = int(p2_base * (growth_rate ** ((turn_number) // 2)))
-    return p1, p2
+# --- Helpers ---
 
-def strip_game_log(game_log):
-    try:
-        _, moves = game_log.split(':')
-        return len(moves.split('|')) if moves else 1
-    except ValueError:
-        return 0
-
-def save_game_log(game_log, sid1, sid2, final_score):
-    game_id, moves = game_log.split(':')
-    moves = moves.replace('|', '')  # Use comma for better readability in logs
-    with open(session_log_path, 'a') as f:
-        f.write(f"{sid1}:{sid2}|{moves}\n")
-
-def round_robin(players_list):
-    players_copy = list(players_list)
-    if len(players_copy) % 2 == 1:
-        players_copy.append(None)  # Bye round for odd player
-    n = len(players_copy)
-    rounds = []
-    for _ in range(n - 1):
-        pairs = []
-        for j in range(n // 2):
-            p1 = players_copy[j]
-            p2 = players_copy[n - 1 - j]
-            pairs.append((p1, p2))
-        rounds.append(pairs)
-        players_copy.insert(1, players_copy.pop())
-    return rounds
+def get_session(code, create=False, **settings):
+    """
+    Returns the session for code, creating it if create is set (or it is the default session).
+    Returns None for an unknown or malformed code.
+    """
+    code = code or DEFAULT_SESSION
+    if not SESSION_CODE.match(code):
+        return None
+    with sessions_lock:
+        session = sessions.get(code)
+        if session is None and (create or code == DEFAULT_SESSION):
+            session = sessions[code] = Session(
+                code, socketio, log_pipeline,
+                payoff_schedule=settings.get('payoff_schedule') or PAYOFF_SCHEDULE,
+                payoff_config=PAYOFF_CONFIG if not settings.get('payoff_schedule') else None,
+                max_rounds=settings.get('max_rounds', MAX_ROUNDS), checkpoint_dir=CHECKPOINT_DIR or None,
+                bot_strategy=BOT_STRATEGY if settings.get('bot_strategy') is None else settings['bot_strategy'],
+                round_mode=settings.get('round_mode') or ROUND_MODE,
+                seed=SEED if settings.get('seed') in (None, '') else settings['seed'],
+                event_probability=EVENT_PROBABILITY if settings.get('event_probability') in (None, '') else settings['event_probability'],
+                **session_settings)
+            print(f"Created session {code} (seed {session.random.seed}).")
+        return session
+
+def restore_sessions():
+    """
+    Restores every checkpointed session that is still waiting or mid-tournament, and
+    restarts any round that was due. A finished one (stopped before it was archived) is
+    archived instead.
+    """
+    for code in saved_sessions(CHECKPOINT_DIR):
+        start = time.perf_counter()
+        session, next_round_pending = Session.restore(code, socketio, log_pipeline, CHECKPOINT_DIR,
+                                                      **session_settings)
+        if session.is_finished():
+            session.archive_checkpoint()
+            session.close()
+            print(f"Archived the checkpoint of finished session {code}.")
+            continue
+        sessions[code] = session
+        for token in session.players:
+            rejoin_commander_feed(session, token)
+        print(f"Restored session {code}: {len(session.players)} players, round {session.current_round_index + 1} "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms.")
+        if next_round_pending:
+            schedule_next_round(session, ROUND_DELAY)
+        for game in list(session.games.values()):
+            if game.is_over():
+                continue
+            if bot_to_move(session, game):
+                play_bot_move(session, game)
+            else:
+                arm_turn_deadline(session, game)
+
+def active_games(session):
+    if session.dispatcher:
+        return len(session.games)  # Pipelined games leave session.games when they end
+    return len(session.round_tracker.outstanding)
+
+def close_sessions():
+    for session in list(sessions.values()):
+        session.close()
+
+atexit.register(close_sessions)  # Compact every session's score ledger on shutdown
+
+@profiler.timed
+def update_total_score_log(session, player, total_score):
+    session.score_ledger.record(player, total_score)
+
+
+@profiler.timed
+def save_game_log(session, game, player1, player2, final_score):
+    session.write_log(session.session_log_path, f"{player1}:{player2}|{game.moves_str()}\n")
+
+def rejoin_commander_feed(session, token):
+    # Puts a player back on the commander roster with their current score and status
+    data = session.players[token]
+    in_game = data['game'] is not None and not data['game'].is_over()
+    session.commander_feed.join(token, 'BOT' if data['bot'] else token[:4], data['total_score'], 'g' if in_game else 'w')
+
+def send_game_state(session, player):
+    """
+    Sends a (re)joining player the frame for where their game stands.
+    """
+    game = session.players[player]['game']
+    if game is None or game.is_over():
+        socketio.emit('message', {'msg': 'Waiting for next round...'}, room=player, namespace='/')
+        return
+    your_turn = session.players[player]['turn']
+    expected = session.payoff_table.lookup(game.turn_number + 1)
+    ys, os_ = expected if game.player_num(player) == 'p1' else (expected[1], expected[0])
+    if game.turn_number == 0:
+        protocol.start(player, game, ys, os_, your_turn=your_turn)
+    else:
+        protocol.update(player, game, ys, os_, your_turn=your_turn)
 
 # --- Routes ---
 @app.route('/')
@@ -115,233 +201,371 @@ def index():
 def commander():
     return render_template('commander.html')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+@app.route('/profile/stacks')
+def profile_stacks():
+    # Collapsed stacks for flamegraph.pl or speedscope
+    return profiler.collapsed_stacks(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@app.route('/sessions')
+def list_sessions():
+    return jsonify([session.stats() for session in list(sessions.values())])
+
 # --- SocketIO Events ---
 
 @socketio.on('commander_start')
 def commander_start():
+    session = commander_sessions.get(request.sid) or get_session(None)
     # Only allow starting if no rounds are currently in progress or all rounds are finished
-    if current_round_index == -1 or current_round_index >= len(all_rounds_pairings):
-        start_game_tournament()
+    # (other sessions' tournaments do not matter)
+    if not session.is_running():
+        start_game_tournament(session)
     else:
-        print("A tournament is already in progress or has unfinished rounds.")
+        print(f"Session {session.code}: a tournament is already in progress or has unfinished rounds.")
 
 @socketio.on('commander_join')
-def commander_join():
-    join_room('commander')
-    socketio.emit('update_players', {'players': [p[:4] for p in waiting_players]}, room='commander', namespace='/')
+def commander_join(data=None):
+    # data: {'session': code, 'payoff_schedule': name, 'max_rounds': int, 'bot_strategy': spec,
+    # 'round_mode': 'barrier' or 'pipelined', 'seed': int, 'event_probability': float}, all optional;
+    # the settings only apply when this commander creates the session
+    data = data or {}
+    try:
+        session = get_session(data.get('session'), create=True, payoff_schedule=data.get('payoff_schedule'),
+                              max_rounds=int(data.get('max_rounds') or MAX_ROUNDS),
+                              bot_strategy=data.get('bot_strategy'), round_mode=data.get('round_mode'),
+                              seed=data.get('seed'), event_probability=data.get('event_probability'))
+    except ValueError as e:  # Unknown payoff schedule, bot strategy or round mode, or bad max_rounds, seed or probability
+        emit('message', {'msg': f'Could not create session: {e}'})
+        return
+    if session is None:
+        emit('message', {'msg': 'Invalid session code (use letters, digits, - and _).'})
+        return
+    commander_sessions[request.sid] = session
+    join_room(session.commander_room)
+    session.commander_feed.start()
+    session.commander_feed.snapshot(request.sid)
+    emit('session_stats', session.stats())
+
+@socketio.on('commander_compact_scores')
+def commander_compact_scores():
+    session = commander_sessions.get(request.sid)
+    if session:
+        session.score_ledger.compact()
+
+@socketio.on('commander_profile')
+def commander_profile(data=None):
+    # data: {'enable': bool, 'sample': bool, 'interval_ms': float, 'reset': bool}; the
+    # profiler is process-wide, so this covers every session
+    data = data or {}
+    if data.get('reset'):
+        profiler.reset()
+    if data.get('enable'):
+        profiler.enable(sample=data.get('sample', False), interval_ms=data.get('interval_ms'))
+    elif 'enable' in data:
+        profiler.disable()
+    emit('profile_report', profiler.report())
+
+@socketio.on('commander_log_stats')
+def commander_log_stats():
+    # The log pipeline is shared by all sessions; the session stats are this commander's
+    session = commander_sessions.get(request.sid)
+    emit('log_stats', log_pipeline.stats())
+    emit('metrics', metrics.REGISTRY.snapshot())
+    if profiler.enabled:
+        emit('profile_report', profiler.report())
+    if session:
+        emit('session_stats', session.stats())
 
 @socketio.on('join')
 def handle_join(data):
     sid = request.sid
     name = data.get('name', f'Player_{sid[:4]}')   # Default name if not provided
-    with open(name_log_path, 'a') as f:
-        f.write(f"{sid}: {name}\n")
-
-    players[sid] = {'game_log': '', 'opponent': None, 'turn': False, 'ready_for_next_game': False, 'total_score': 0,}
-    if sid not in waiting_players: # Prevent duplicate entries if player refreshes
-        waiting_players.append(sid)
-    socketio.emit('message', {'msg': 'Waiting to start...'}, room=sid, namespace='/')
-    socketio.emit('update_players', {'players': [p[:4] for p in waiting_players]}, room='commander', namespace='/')
-
-def start_game_tournament():
-    global all_rounds_pairings, current_round_index, games_in_current_round
-
-    if not waiting_players:
-        print("No players to start a tournament!")
+    session = get_session(data.get('session'))
+    if session is None:
+        socketio.emit('message', {'msg': 'Unknown session code. Check the code and try again.'}, room=sid, namespace='/')
         return
 
-    random.shuffle(waiting_players) # Shuffle once at the beginning of the tournament
-    all_rounds_pairings = round_robin(waiting_players)
-    current_round_index = 0
-    print(f"Tournament started with {len(all_rounds_pairings)} rounds.")
-    play_next_round()
+    token = data.get('token')
+    if token and (token not in session.players or session.is_finished()):
+        # A token from an earlier tournament (or one the server no longer has): join afresh
+        emit('forget_token', {'rejoin': True})
+        return
+    if token:
+        # Rejoin (reconnect or server restart): same player, new connection
+        connections[sid] = (session, token)
+        join_room(token)
+        join_room(session.room)
+        REJOINS.inc()
+        rejoin_commander_feed(session, token)  # handle_disconnect took them off the roster
+        send_game_state(session, token)
+        return
 
-def play_next_round():
-    global current_round_index, games_in_current_round
+    token = session.add_player(name)
+    connections[sid] = (session, token)
+    join_room(token) # Player frames go to the token's room, whichever connection holds it
+    join_room(session.room)
+    session.write_log(session.name_log_path, f"{token}: {name}\n")
+    session.count(joins=1)
+    JOINS.inc()
+    emit('player_token', {'token': token, 'session': session.code})
+    socketio.emit('message', {'msg': 'Waiting to start...'}, room=token, namespace='/')
+    session.commander_feed.join(token, token[:4])
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    sid = request.sid
+    commander_sessions.pop(sid, None)
+    connection = connections.pop(sid, None)
+    if connection is None:
+        return
+    session, token = connection
+    if connection in connections.values():
+        return  # The player is still connected elsewhere
+    session.commander_feed.leave(token)
+    # Before the tournament starts a disconnected player is simply dropped from the pool;
+    # once it is running the schedule still references them, so their entry is kept
+    # and they can rejoin with their token.
+    if session.current_round_index == -1 and token in session.players:
+        session.remove_player(token)
+
+def start_game_tournament(session):
+    if not session.waiting_players:
+        print(f"Session {session.code}: no players to start a tournament!")
+        return
 
-    if current_round_index >= len(all_rounds_pairings):
-        print("Tournament finished!")
-        socketio.emit('message', {'msg': 'All rounds complete! Thanks for playing.'}, namespace='/')
-        # reset_tournament_state() # Reset for a new tournament
+    present = {token for connected_session, token in list(connections.values()) if connected_session is session}
+    session.start_tournament(present)
+    for bot in session.bots:
+        session.write_log(session.name_log_path, f"{bot}: {session.players[bot]['name']}\n")
+        session.commander_feed.join(bot, 'BOT')
+    print(f"Session {session.code}: {session.round_mode} tournament started with {len(session.tournament_schedule)} rounds.")
+    if session.round_mode == 'pipelined':
+        start = time.perf_counter()
+        start_games(session, session.start_pipelined())
+        ROUND_START_SECONDS.observe(time.perf_counter() - start)
+    else:
+        play_next_round(session)
+
+def finish_tournament(session):
+    if not session.finish_tournament():
+        return  # Another game end already finished it
+    stats = session.tournament_stats()
+    print(f"Session {session.code}: tournament finished in {stats['makespan_s']}s "
+          f"({stats['mode']}, mean idle {stats['idle_mean_s']}s, max idle {stats['idle_max_s']}s).")
+    socketio.emit('message', {'msg': 'All rounds complete! Thanks for playing.'}, room=session.room, namespace='/')
+    socketio.emit('forget_token', {'rejoin': False}, room=session.room, namespace='/')
+    # The commander's roster is keyed by feed ids, not tokens: send [[id, idle seconds], ...], most idle first
+    idle = sorted(stats.pop('idle_s').items(), key=lambda item: -item[1])
+    stats['idle'] = [[session.commander_feed.id_of(token), seconds] for token, seconds in idle]
+    socketio.emit('tournament_stats', stats, room=session.commander_room, namespace='/')
+    # reset_tournament_state() # Reset for a new tournament
+
+def play_next_round(session):
+    current_round_index = session.current_round_index
+
+    if current_round_index >= len(session.tournament_schedule):
+        finish_tournament(session)
         return
 
-    current_round_pairings = all_rounds_pairings[current_round_index]
-    games_in_current_round = {} # Reset for the new round
-    print(f"Starting Round {current_round_index + 1} with {len(current_round_pairings)} games.")
-
-    active_games_in_round = 0
-
-    for p1, p2 in current_round_pairings:
-        if p1 is None or p2 is None: # Handle bye player
-            bye_player_sid = p1 if p1 is not None else p2
-            if bye_player_sid and bye_player_sid in players:
-                players[bye_player_sid]['opponent'] = None
-                players[bye_player_sid]['turn'] = False
-                players[bye_player_sid]['game_log'] = '' # Clear any previous game log
-                players[bye_player_sid]['ready_for_next_game'] = True # Mark as ready for next round
-                socketio.emit('message', {'msg': f'Round {current_round_index + 1}: You have a BYE this round! Waiting for the next round...'}, room=bye_player_sid, namespace='/')
-                socketio.emit('bye_status', {'has_bye': True, 'round': current_round_index + 1}, room=bye_player_sid, namespace='/') # New event for bye status
-                print(f"Player {bye_player_sid[:4]} has a BYE in Round {current_round_index + 1}.")
-            continue # Skip to next pairing
-
-
-        active_games_in_round += 1
-        players[p1]['opponent'] = p2
-        players[p2]['opponent'] = p1
-        players[p1]['player_num'] = 'p1'
-        players[p2]['player_num'] = 'p2'
-        short_id = f"{p1[:2]}{p2[:2]}"
-        game_log = f"{short_id}:"
-        players[p1]['game_log'] = game_log
-        players[p2]['game_log'] = game_log
-        players[p1]['turn'] = True
-        players[p2]['turn'] = False
-        players[p1]['ready_for_next_game'] = False # Not ready until game is over
-        players[p2]['ready_for_next_game'] = False # Not ready until game is over
-        score = linear_payoff(1)
-
-        # Store game info for tracking completion
-        games_in_current_round[short_id] = {'p1_sid': p1, 'p2_sid': p2, 'completed': False}
-
-        socketio.emit('start', {'game_log': game_log, 'your_score': score[0], 'opponents_score': score[1], 'round': current_round_index + 1}, room=p1, namespace='/')
-        socketio.emit('start', {'game_log': game_log, 'your_score': score[1], 'opponents_score': score[0], 'round': current_round_index + 1}, room=p2, namespace='/')
-        socketio.emit('message', {'msg': 'Your turn! Choose a move:'}, room=p1, namespace='/')
-        socketio.emit('message', {'msg': 'Waiting for opponent...'}, room=p2, namespace='/')
-
-    if active_games_in_round == 0 and current_round_pairings: # If all pairs were byes or disconnected
-        socketio.emit('message', {'msg': f'Round {current_round_index + 1} has no active games. Advancing to next round.'}, room='commander', namespace='/')
-        current_round_index += 1
-        socketio.sleep(1) # Small delay
-        socketio.start_background_task(target=play_next_round)
+    start = time.perf_counter()
+    current_round_pairings, round_games, byes = session.setup_round()
+    print(f"Session {session.code}: starting Round {current_round_index + 1} with {len(current_round_pairings)} games.")
+
+    for bye_player in byes:
+        socketio.emit('message', {'msg': f'Round {current_round_index + 1}: You have a BYE this round! Waiting for the next round...'}, room=bye_player, namespace='/')
+        socketio.emit('bye_status', {'has_bye': True, 'round': current_round_index + 1}, room=bye_player, namespace='/') # New event for bye status
+        print(f"Player {bye_player[:4]} has a BYE in Round {current_round_index + 1}.")
+
+    start_games(session, round_games)
+    ROUND_START_SECONDS.observe(time.perf_counter() - start)
+
+    if not round_games and current_round_pairings: # If all pairs were byes or disconnected
+        socketio.emit('message', {'msg': f'Round {current_round_index + 1} has no active games. Advancing to next round.'}, room=session.commander_room, namespace='/')
+        session.current_round_index += 1
+        schedule_next_round(session, 1) # Small delay
+
+def start_games(session, games):
+    score = session.payoff_table.lookup(1)
+    for game in games:
+        session.commander_feed.status(game.p1_sid, 'g')
+        session.commander_feed.status(game.p2_sid, 'g')
+        protocol.start(game.p1_sid, game, score[0], score[1], your_turn=True)
+        protocol.start(game.p2_sid, game, score[1], score[0], your_turn=False)
+        if bot_to_move(session, game):
+            play_bot_move(session, game)
+        else:
+            arm_turn_deadline(session, game)
 
 @socketio.on('move')
 def handle_move(data):
-    sid = request.sid
-    move = data['move']
-    player_data = players.get(sid)
+    connection = connections.get(request.sid)
+    if connection is None:
+        print("Player not found.")
+        return
+    session, player = connection
+    start = time.perf_counter()
+    apply_move(session, player, data['move'])
+    elapsed = time.perf_counter() - start
+    session.count(moves=1, handler_seconds=elapsed)
+    MOVES.inc()
+    MOVE_SECONDS.observe(elapsed)
+
+def apply_move(session, player, move, turn_number=None, notice=None):
+    """
+    Plays player's move and sends the updates. With turn_number, the move only counts for
+    that turn (a turn deadline); notice is sent to the player just before it is played.
+    Returns True if the move was played.
+    """
+    players = session.players
+    payoff_table = session.payoff_table
+    player_data = players.get(player)
 
     if not player_data:
         print("Player not found.")
-        return
+        return False
 
-    opponent_sid = player_data.get('opponent')
-    if not opponent_sid or opponent_sid not in players:
-        socketio.emit('message', {'msg': 'No opponent found or opponent disconnected.'}, room=sid, namespace='/')
+    opponent = player_data.get('opponent')
+    game = player_data.get('game')
+    if not opponent or opponent not in players or game is None:
+        socketio.emit('message', {'msg': 'No opponent found or opponent disconnected.'}, room=player, namespace='/')
         player_data['ready_for_next_game'] = True
-        game_id_prefix = player_data['game_log'].split(':')[0]
-        if game_id_prefix in games_in_current_round:
-            games_in_current_round[game_id_prefix]['completed'] = True
-        check_round_completion()
-        return
-
-    game_log = player_data['game_log']
-    base, moves = game_log.split(':')
-    move_symbol = 'x' if move == 'take' else ('2' if random.random() < 0.25 else '0')
-    updated_moves = moves + '|' + move_symbol if moves else move_symbol
-    updated_log = f"{base}:{updated_moves}"
-    players[sid]['game_log'] = updated_log
-    players[opponent_sid]['game_log'] = updated_log
-
-    turn_number = strip_game_log(updated_log)
-    current_score = linear_payoff(turn_number)
-    expected_score = linear_payoff(turn_number + 1)
-    ui_log = updated_moves.replace('|', '')
-    ui_log = ui_log.replace('0', '🟩')
-    ui_log = ui_log.replace('2', '🟩')
-    ui_log = ui_log.replace('x', '🟥')
+        if game:
+            turn_deadlines.cancel((session.code, game.key))
+            complete_game(session, game)
+        return False
+    # A turn deadline can fire while the player's own move is in flight: check and play
+    # under the game's lock, so only one of them gets the turn
+    with game.lock:
+        if not player_data['turn'] or game.is_over() or turn_number not in (None, game.turn_number):
+            return False  # Not this player's turn (a duplicate click after a rejoin, or they beat the deadline)
+        if notice:
+            # Before the move: a bot opponent replies within it, and the 'Your turn' frame must come last
+            socketio.emit('message', {'msg': notice}, room=player, namespace='/')
+        move_symbol = 'x' if move == 'take' else ('2' if session.event(game) else '0')
+        turn_number = session.play_move(game, player, move_symbol)
+    current_score = game.current_payoff
+    expected_score = payoff_table.lookup(turn_number + 1)
 
     # Score from each player's perspective
-    def get_scores(player_sid, score_tuple):
-        return (score_tuple[0], score_tuple[1]) if players[player_sid]['player_num'] == 'p1' else (score_tuple[1], score_tuple[0])
+    def get_scores(player_id, score_tuple):
+        return (score_tuple[0], score_tuple[1]) if game.player_num(player_id) == 'p1' else (score_tuple[1], score_tuple[0])
 
-    your_current_score, your_opponent_current_score = get_scores(sid, current_score)
-    opp_current_score, opp_opponent_current_score = get_scores(opponent_sid, current_score)
+    your_current_score, your_opponent_current_score = get_scores(player, current_score)
+    opp_current_score, opp_opponent_current_score = get_scores(opponent, current_score)
 
-    your_expected_score, your_opponent_expected_score = get_scores(sid, expected_score)
-    opp_expected_score, opp_opponent_expected_score = get_scores(opponent_sid, expected_score)
+    your_expected_score, your_opponent_expected_score = get_scores(player, expected_score)
+    opp_expected_score, opp_opponent_expected_score = get_scores(opponent, expected_score)
 
-    # If someone took the pot
+    # If someone took the pot (play_move has already added the payoffs to both totals)
     if move_symbol == 'x':
-        save_game_log(updated_log, sid, opponent_sid, current_score)
-        players[sid]['turn'] = False
-        players[opponent_sid]['turn'] = False
-        players[sid]['ready_for_next_game'] = True
-        players[opponent_sid]['ready_for_next_game'] = True
-
-        # Update total scores
-        players[sid]['total_score'] += your_current_score
-        players[opponent_sid]['total_score'] += your_opponent_current_score
-        update_total_score_log(sid, players[sid]['total_score'])
-        update_total_score_log(opponent_sid, players[opponent_sid]['total_score'])
-
-
-        print(f"{sid[:4]} total_score: {players[sid]['total_score']}")
-        print(f"{opponent_sid[:4]} total_score: {players[opponent_sid]['total_score']}")
-        socketio.emit('game_over', {
-            'msg': 'Game Over, you took the pot!',
-            'winner': 'true',
-            'your_score': your_current_score,
-            'opponents_score': your_opponent_current_score,
-            'final_log': updated_log
-        }, room=sid, namespace='/')
-
-        socketio.emit('game_over', {
-            'msg': 'Game Over, your opponent took the pot!',
-            'winner': 'false',
-            'your_score': opp_current_score,
-            'opponents_score': opp_opponent_current_score,
-            'final_log': updated_log
-        }, room=opponent_sid, namespace='/')
-
-        socketio.emit('message', {'msg': 'Waiting for next round...'}, room=sid, namespace='/')
-        socketio.emit('message', {'msg': 'Waiting for next round...'}, room=opponent_sid, namespace='/')
-
-        game_id = base
-        if game_id in games_in_current_round:
-            games_in_current_round[game_id]['completed'] = True
-        check_round_completion()
+        save_game_log(session, game, player, opponent, current_score)
+        final_log = game.legacy_log() if protocol.version == 1 else None
+        update_total_score_log(session, player, players[player]['total_score'])
+        update_total_score_log(session, opponent, players[opponent]['total_score'])
+        for player_id in (player, opponent):
+            session.commander_feed.score(player_id, players[player_id]['total_score'])
+            session.commander_feed.status(player_id, 'w')
 
-    else:
-        # Normal move: update and switch turn
-        socketio.emit('update', {
-            'your_score': your_expected_score,
-            'opponents_score': your_opponent_expected_score,
-            'log': ui_log,
-        }, room=sid, namespace='/')
-
-        socketio.emit('update', {
-            'your_score': opp_expected_score,
-            'opponents_score': opp_opponent_expected_score,
-            'log': ui_log,
-        }, room=opponent_sid, namespace='/')
-
-        players[sid]['turn'] = False
-        players[opponent_sid]['turn'] = True
-        socketio.emit('message', {'msg': 'Waiting for opponent...'}, room=sid, namespace='/')
-        socketio.emit('message', {'msg': 'Your turn! Choose a move:'}, room=opponent_sid, namespace='/')
-
-
-def check_round_completion():
-    global current_round_index
-
-    # If there are no games being tracked, it means all were byes or disconnected, so round is complete
-    if not games_in_current_round:
-        all_games_completed_in_round = True
-    else:
-        all_games_completed_in_round = True
-        for game_info in games_in_current_round.values():
-            if not game_info['completed']:
-                all_games_completed_in_round = False
-                break
 
-    if all_games_completed_in_round:
-        print(f"Round {current_round_index + 1} completed with all games finished.")
-        current_round_index += 1
-        # Use a short delay to allow clients to process the "Round X completed" message
-        socketio.sleep(2) # Non-blocking sleep
-        socketio.start_background_task(target=play_next_round)
+        print(f"{player[:4]} total_score: {players[player]['total_score']}")
+        print(f"{opponent[:4]} total_score: {players[opponent]['total_score']}")
+        protocol.game_over(player, game, True, your_current_score, your_opponent_current_score, final_log, after='r')
+        protocol.game_over(opponent, game, False, opp_current_score, opp_opponent_current_score, final_log, after='r')
+
+        session.count(games=1)
+        GAMES.inc()
+        turn_deadlines.cancel((session.code, game.key))
+        complete_game(session, game)
 
+    else:
+        # Normal move: update both players (play_move has switched the turn)
+        protocol.update(player, game, your_expected_score, your_opponent_expected_score, your_turn=False)
+        protocol.update(opponent, game, opp_expected_score, opp_opponent_expected_score, your_turn=True)
+        if opponent in session.bots:
+            play_bot_move(session, game)
+        else:
+            arm_turn_deadline(session, game)
+    return True
+
+def bot_to_move(session, game):
+    """
+    The bot whose turn it is in game, or None if it is a person's turn (or the game is over).
+    """
+    if game.is_over():
+        return None
+    mover = game.p1_sid if session.players[game.p1_sid]['turn'] else game.p2_sid
+    return mover if mover in session.bots else None
+
+def arm_turn_deadline(session, game):
+    # Replaces the game's previous deadline, so each game has at most one pending
+    if TURN_TIMEOUT > 0:
+        turn_deadlines.set((session.code, game.key), TURN_TIMEOUT, turn_timeout, session, game, game.turn_number)
+
+def turn_timeout(session, game, turn_number):
+    """
+    Plays the default move for a player who let their turn's deadline pass.
+    """
+    if game.is_over() or game.turn_number != turn_number:
+        return  # They moved just in time
+    player = game.p1_sid if session.players[game.p1_sid]['turn'] else game.p2_sid
+    strikes = session.turn_strikes[(game.key, player)] + 1
+    move = 'take' if strikes >= TURN_TIMEOUT_STRIKES else TURN_TIMEOUT_MOVE
+    if not apply_move(session, player, move, turn_number, notice=f"Time's up! The game played '{move}' for you."):
+        return  # They moved just in time
+    session.turn_strikes[(game.key, player)] += 1
+    session.write_log(session.timeout_log_path, f"{player}|{game.round}|{turn_number + 1}|{move}\n")
+    session.count(timeouts=1)
+    TIMEOUTS.inc()
+    print(f"Session {session.code}: {player[:4]} timed out on turn {turn_number + 1} of round {game.round}; playing '{move}'.")
+    session.count(moves=1)
+    MOVES.inc()
+
+def play_bot_move(session, game):
+    # Bots move straight away, through the same path as a person's move
+    bot = bot_to_move(session, game)
+    apply_move(session, bot, session.bots[bot].decide(session, game))
+    session.count(moves=1)
+    MOVES.inc()
+
+
+def complete_game(session, game):
+    if session.dispatcher:
+        # Pipelined: start whichever next games this game's two players were waiting on
+        start_games(session, session.advance(game))
+        if session.dispatcher.is_done():
+            finish_tournament(session)
+        return
+    # O(1): the tracker returns True only for the game that finishes the round
+    if session.round_tracker.complete(game):
+        finish_round(session)
+
+def finish_round(session):
+    stats = session.round_tracker.stats()
+    print(f"Session {session.code}: round {stats['round']} completed with all games finished in {stats['duration_s']}s "
+          f"(tail {stats['tail_latency_s']}s past the median game).")
+    socketio.emit('round_stats', stats, room=session.commander_room, namespace='/')
+    session.count(rounds=1)
+    ROUNDS.inc()
+    ROUND_SECONDS.observe(stats['duration_s'])
+    session.current_round_index += 1
+    # Give clients a moment to process the end of the round; the delay runs as a timer
+    # so the last move of the round returns right away.
+    schedule_next_round(session, ROUND_DELAY)
+
+def schedule_next_round(session, delay):
+    socketio.start_background_task(target=_play_next_round_after, session=session, delay=delay)
+
+def _play_next_round_after(session, delay):
+    socketio.sleep(delay)
+    play_next_round(session)
+
+
+if CHECKPOINT_DIR:
+    restore_sessions()
 
 # --- Run App ---
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5001)
+    server_backend.run(socketio, app)
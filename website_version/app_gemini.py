@@ -1,110 +1,126 @@
+import server_backend  # First: selects the async backend (and monkey-patches for eventlet/gevent)
 from flask import Flask, render_template, request
 from flask_socketio import SocketIO, emit, join_room
-import random, os, datetime, time
-import threading
+import os, datetime, time
+import atexit
+from score_ledger import ScoreLedger
+from log_pipeline import LogPipeline
+from game_state import GameState
+from payoff import load_payoff_table
+from random_streams import RandomStreams
+from protocol import Protocol
+from commander_feed import CommanderFeed
+from matching import MatchingEngine
+from state_store import open_state_store
+import metrics
+import profiling
+
+# Horizontal scaling: run several workers behind a load balancer with sticky sessions,
+# sharing one state store (STATE_STORE=sqlite:/path/state.db) and one Socket.IO message
+# queue (SOCKETIO_MESSAGE_QUEUE, e.g. redis://localhost:6379 or sqla+sqlite:////tmp/mq.db)
+# so an emit from any worker reaches players connected to the others.
+STATE_STORE = os.environ.get('STATE_STORE', 'memory')
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+WORKER_ID = os.environ.get('WORKER_ID', '')  # Suffix for this worker's log files
 
 app = Flask(__name__) # Using __app_id for the Flask app name
-socketio = SocketIO(app)
+socketio = SocketIO(app, async_mode=server_backend.ASYNC_MODE, message_queue=SOCKETIO_MESSAGE_QUEUE)
+profiler = profiling.install(socketio)  # Times every handler and background task once enabled (PROFILE=1)
 
 # Session log setup
 log_dir = "logs"
 os.makedirs(log_dir, exist_ok=True)
-session_log_filename = f"session_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+log_suffix = f"_w{WORKER_ID}" if WORKER_ID else ''
+session_log_filename = f"session_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{log_suffix}.txt"
 session_log_path = os.path.join(log_dir, session_log_filename)
-name_log_filename = f"name_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+name_log_filename = f"name_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{log_suffix}.txt"
 name_log_path = os.path.join(log_dir, name_log_filename)
-score_log_filename = f"totalscore_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+score_log_filename = f"totalscore_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{log_suffix}.txt"
 score_log_path = os.path.join(log_dir, score_log_filename)
-
-
-# Data structures
+params_log_filename = f"params_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{log_suffix}.txt"
+params_log_path = os.path.join(log_dir, params_log_filename)
+
+# All log writes go through a background write-behind pipeline so handlers never block on disk
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '0.5'))  # seconds between batched writes
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))  # max queued lines before writers wait
+log_pipeline = LogPipeline(flush_interval=LOG_FLUSH_INTERVAL, max_queue=LOG_QUEUE_SIZE)
+atexit.register(log_pipeline.close)  # Durable flush on shutdown (runs after the ledger compacts)
+
+# Payoffs are precomputed once per session; PAYOFF_CONFIG points to a JSON schedule/array config
+PAYOFF_SCHEDULE = os.environ.get('PAYOFF_SCHEDULE', 'linear')
+payoff_table = load_payoff_table(os.environ.get('PAYOFF_CONFIG'), PAYOFF_SCHEDULE)
+
+# The matching shuffle and each game's '2' events draw from one seed, written to the params
+# log (see random_streams.py). Give every worker the same SEED so a game's events do not
+# depend on which worker handles its moves.
+random_streams = RandomStreams(os.environ.get('SEED') or None, os.environ.get('EVENT_PROBABILITY', '0.25'))
+log_pipeline.write(params_log_path, ''.join(f"{key}: {value}\n" for key, value in
+                                            dict(random_streams.describe(), payoff_schedule=PAYOFF_SCHEDULE).items()))
+print(f"Random seed {random_streams.seed} ({random_streams.backend}).")
+
+# Game frames use protocol v2 (one combined frame per player) unless SOCKET_PROTOCOL=1
+protocol = Protocol(socketio, version=int(os.environ.get('SOCKET_PROTOCOL', '2')))
+
+# Data structures (all session state lives in the state store so workers can share it)
+state_store = open_state_store(STATE_STORE)
 # players: sid -> {'name': str, 'opponent': sid, 'turn': bool, 'in_game': bool,
 #                   'ready_for_next_game': bool, 'total_score': int,
-#                   'played_with': set(sid), 'game_log': str, 'player_num': str}
-players = {}
-# ready_to_match: list of SIDs that are available for a new game and have not exhausted all possible unique opponents.
-ready_to_match = []
-# game_match_lock: A lock to prevent race conditions when multiple events try to modify ready_to_match
-# or initiate games simultaneously.
-game_match_lock = threading.Lock()
+#                   'game_key': GameState.key}
+# Assigning a field writes it back to the store.
+players = state_store.players
+# ready_pool: SIDs that are available for a new game; it has its own lightweight lock.
+ready_pool = state_store.ready
+# state_store.match_lock() serializes matching passes only. Moves lock their own game
+# (state_store.locked_game), so moves in different games never contend with each other or with matching.
+# matching_engine: integer player ids and played-with bitsets for perfect stranger matching;
+# each worker keeps its own copy, brought up to date from the store before every matching pass
+matching_engine = MatchingEngine()
+
+# Live health metrics (served at /metrics and in the commander panel); per worker
+JOINS = metrics.counter('joins_total', "Players who joined")
+MOVES = metrics.counter('moves_total', "Moves handled")
+MOVE_SECONDS = metrics.histogram('move_handler_seconds', "Time to handle one move")
+GAMES = metrics.counter('games_total', "Games finished")
+MATCHES = metrics.counter('matches_total', "Games started by matching")
+MATCH_SECONDS = metrics.histogram('match_pass_seconds', "Time for one matching pass over the ready pool")
+# From the shared store: a game can start on one worker and end on another
+metrics.gauge('active_games', "Games in progress across all workers", fn=state_store.game_count)
+metrics.gauge('ready_pool', "Players waiting to be matched", fn=lambda: len(ready_pool))
+
+# Commander roster updates are coalesced and sent every COMMANDER_TICK seconds
+commander_feed = CommanderFeed(socketio, tick=float(os.environ.get('COMMANDER_TICK', '0.25')),
+                               id_for=state_store.player_number if STATE_STORE != 'memory' else None)
 
 
 # --- Log Helpers ---
+score_ledger = ScoreLedger(score_log_path, pipeline=log_pipeline)
+atexit.register(score_ledger.close)  # Compact the score ledger on shutdown
+
+@profiler.timed
 def update_total_score_log(sid, total_score):
     """
-    Updates the total score for a player in the score log file.
-    It reads all lines, removes the old entry for the given SID,
-    and appends the new one, then writes back to the file.
+    Records the new total score for a player.
+    This is a single append to the score ledger; the latest totals are kept in memory
+    and the file is compacted on shutdown or via the 'commander_compact_scores' event.
     """
-    if not os.path.exists(score_log_path):
-        with open(score_log_path, 'w') as f:
-            pass  # Just create the file if it doesn't exist
-
-    with open(score_log_path, 'r') as f:
-        lines = f.readlines()
+    score_ledger.record(sid, total_score)
 
-    # Remove any previous entry for this sid
-    lines = [line for line in lines if not line.startswith(sid)]
-
-    # Add new score entry
-    lines.append(f"{sid}:{total_score}\n")
-
-    # Write back to file
-    with open(score_log_path, 'w') as f:
-        f.writelines(lines)
-
-def save_game_log(game_log, sid1, sid2, final_score_tuple):
+@profiler.timed
+def save_game_log(game, sid1, sid2, final_score_tuple):
     """
-    Appends the completed game's log to the session log file.
-    Converts the game log format for cleaner storage.
+    Queues the completed game's log for the session log file.
+    Converts the game's moves to the log format for cleaner storage.
     """
-    game_id, moves = game_log.split(':')
-    # Replace '|' with comma for better readability in logs, '0' and '2' with 'P', 'x' with 'T'
-    moves_for_log = moves.replace('|', ',').replace('0', 'P').replace('2', 'P').replace('x', 'T')
+    # Join moves with commas for readability in logs, '0' and '2' become 'P', 'x' becomes 'T'
+    moves_for_log = ','.join(game.moves_str()).replace('0', 'P').replace('2', 'P').replace('x', 'T')
     # Assuming final_score_tuple is (player1_score, player2_score) from their perspective
     p1_score, p2_score = final_score_tuple
-    with open(session_log_path, 'a') as f:
-        f.write(f"Game ID: {game_id}, P1_SID: {sid1}, P2_SID: {sid2}, Moves: [{moves_for_log}], "
-                f"P1_Final_Score: {p1_score}, P2_Final_Score: {p2_score}\n")
+    log_pipeline.write(session_log_path,
+                       f"Game ID: {game.game_id}, P1_SID: {sid1}, P2_SID: {sid2}, Moves: [{moves_for_log}], "
+                       f"P1_Final_Score: {p1_score}, P2_Final_Score: {p2_score}\n")
 
 
 # --- Game Logic Helpers ---
-def linear_payoff(turn_number, p1_start=2, p2_start=1, increment=2):
-    """
-    Calculates the linear payoff for Player 1 and Player 2 based on the turn number.
-    Turn number is the number of moves made in the game.
-    """
-    if turn_number < 1:
-        return p1_start, p2_start
-    p1 = p1_start + ((turn_number - 1) // 2) * increment
-    p2 = p2_start + ((turn_number) // 2) * increment
-    return p1, p2
-
-def exponential_payoff(turn_number, p1_base=2, p2_base=1, growth_rate=1.5):
-    """
-    Calculates the exponential payoff for Player 1 and Player 2 based on the turn number.
-    (Currently not used, but kept for potential future use or as an example).
-    """
-    if turn_number < 1:
-        return p1_base, p2_base
-    p1 = int(p1_base * (growth_rate ** ((turn_number - 1) // 2)))
-    p2 = int(p2_base * (growth_rate ** ((turn_number) // 2)))
-    return p1, p2
-
-def strip_game_log(game_log):
-    """
-    Parses the game_log string to return the number of moves made.
-    Game log format: "game_id:move1|move2|...|moveN"
-    """
-    try:
-        parts = game_log.split(':', 1) # Split only on the first colon
-        if len(parts) < 2: # No moves yet, just the game_id
-            return 0
-        moves_str = parts[1]
-        return len(moves_str.split('|')) if moves_str else 0
-    except ValueError:
-        return 0
-
 def get_player_name_display(sid):
     """
     Returns the first 4 characters of the player's name for display purposes.
@@ -120,6 +136,15 @@ def index():
     """
     return render_template('index.html')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+@app.route('/profile/stacks')
+def profile_stacks():
+    # Collapsed stacks for flamegraph.pl or speedscope
+    return profiler.collapsed_stacks(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
 @app.route('/commander')
 def commander():
     """
@@ -133,16 +158,15 @@ def commander():
 def commander_start():
     """
     Triggered by the commander to start the initial matching process.
-    This will attempt to match any players currently in the 'ready_to_match' pool.
+    This will attempt to match any players currently in the ready pool.
     Subsequent matches will occur automatically.
     """
     print("Commander initiated game matching.")
     # Ensure all players are marked as ready for the first round of matching
-    with game_match_lock:
-        for sid in list(players.keys()): # Iterate over a copy as dict may change
-            if not players[sid]['in_game'] and sid not in ready_to_match:
-                ready_to_match.append(sid)
-                players[sid]['ready_for_next_game'] = True # Explicitly mark as ready
+    for sid in list(players.keys()): # Iterate over a copy as dict may change
+        if not players[sid]['in_game']:
+            ready_pool.add(sid)
+            players[sid]['ready_for_next_game'] = True # Explicitly mark as ready
 
     socketio.start_background_task(target=attempt_matches)
 
@@ -151,52 +175,114 @@ def commander_start():
 def commander_join():
     """
     Handles a commander joining the 'commander' room.
-    Emits the current list of players to the commander.
+    Sends a full roster snapshot to this commander; after that it receives coalesced deltas.
     """
     join_room('commander')
-    # Use player names for the commander's display
-    player_names = [players[sid]['name'] for sid in players if 'name' in players[sid]]
-    socketio.emit('update_players', {'players': player_names}, room='commander', namespace='/')
+    commander_feed.start()
+    if STATE_STORE == 'memory':
+        commander_feed.snapshot(request.sid)
+    else:  # Other workers' players are only in the shared store
+        roster = [(sid, data['name'], data['total_score'], 'g' if data['in_game'] else 'w')
+                  for sid, data in players.items()]
+        commander_feed.snapshot(request.sid, roster)
     socketio.emit('message', {'msg': 'Commander joined and is monitoring.'}, room='commander', namespace='/')
 
 
+@socketio.on('commander_compact_scores')
+def commander_compact_scores():
+    """
+    Compacts the score ledger on demand so it holds one line per player.
+    """
+    score_ledger.compact()
+
+
+@socketio.on('commander_profile')
+def commander_profile(data=None):
+    """
+    Switches profiling on or off for this worker and sends back its report.
+    data: {'enable': bool, 'sample': bool, 'interval_ms': float, 'reset': bool}
+    """
+    data = data or {}
+    if data.get('reset'):
+        profiler.reset()
+    if data.get('enable'):
+        profiler.enable(sample=data.get('sample', False), interval_ms=data.get('interval_ms'))
+    elif 'enable' in data:
+        profiler.disable()
+    socketio.emit('profile_report', profiler.report(), room='commander', namespace='/')
+
+@socketio.on('commander_log_stats')
+def commander_log_stats():
+    """
+    Sends the log pipeline's queue depth and flush counters, and the metrics, to the commander.
+    """
+    socketio.emit('log_stats', log_pipeline.stats(), room='commander', namespace='/')
+    socketio.emit('metrics', metrics.REGISTRY.snapshot(), room='commander', namespace='/')
+    if profiler.enabled:
+        socketio.emit('profile_report', profiler.report(), room='commander', namespace='/')
+
+
 @socketio.on('join')
 def handle_join(data):
     """
     Handles a new player joining the game.
-    Initializes player data and adds them to the ready_to_match pool.
+    Initializes player data and adds them to the ready pool.
     """
     sid = request.sid
     name = data.get('name', f'Player_{sid[:4]}') # Default name if not provided
-    with open(name_log_path, 'a') as f:
-        f.write(f"{sid}: {name}\n") # Log name with SID
+    log_pipeline.write(name_log_path, f"{sid}: {name}\n") # Log name with SID
 
     # Initialize player data
     players[sid] = {
         'name': name, # Name is stored, but its usage is restricted for privacy in game logic
-        'game_log': '',
+        'game_key': None,
         'opponent': None,
         'turn': False,
         'in_game': False,
         'ready_for_next_game': True, # Ready to be matched initially
         'total_score': 0,
-        'played_with': set() # Keep track of opponents this player has already played against
     }
+    matching_engine.add_player(sid) # The engine tracks who has played whom
+    JOINS.inc()
 
-    # Add player to the ready_to_match pool if not already there and not in a game
-    with game_match_lock:
-        if not players[sid]['in_game'] and sid not in ready_to_match:
-            ready_to_match.append(sid)
-            print(f"Player {sid[:4]} joined and is ready to match. Ready count: {len(ready_to_match)}")
+    # Add player to the ready pool if not already there
+    if ready_pool.add(sid):
+        print(f"Player {sid[:4]} joined and is ready to match. Ready count: {len(ready_pool)}")
 
     # Updated message to reflect that only the initial games require commander start
     socketio.emit('message', {'msg': f'Welcome, {name}! Waiting for the first game to start...'}, room=sid, namespace='/')
-    # Update commander with current player list
-    player_names = [players[p_sid]['name'] for p_sid in players if 'name' in players[p_sid]]
-    socketio.emit('update_players', {'players': player_names}, room='commander', namespace='/')
+    # Queue a join delta for the commander (player names are used for the commander's display)
+    commander_feed.join(sid, name)
     # Games will only start via commander_start for the initial set.
 
 
+@socketio.on('disconnect')
+def handle_disconnect():
+    """
+    Removes a disconnected player. If they were in a game, the removal happens under
+    that game's lock so it cannot interleave with a move; their opponent is re-matched
+    on their next move attempt (which deletes the game), or the game is deleted now if
+    the opponent has gone too.
+    """
+    sid = request.sid
+    player_data = players.get(sid)
+    if player_data is None:
+        return
+    game_key = player_data.get('game_key')
+    if game_key is not None and player_data.get('in_game'):
+        with state_store.locked_game(game_key) as game:
+            players.pop(sid, None)
+            opponent = players.get(player_data.get('opponent'))
+            if game is not None and not (opponent and opponent.get('in_game') and opponent.get('game_key') == game_key):
+                # Nobody is left to end it with a move
+                state_store.delete_game(game_key)
+                random_streams.end_game(game)
+    else:
+        players.pop(sid, None)
+    ready_pool.discard(sid)
+    commander_feed.leave(sid)
+
+
 def _start_game(p1_sid, p2_sid):
     """
     Helper function to set up and start a new game between two players.
@@ -205,13 +291,13 @@ def _start_game(p1_sid, p2_sid):
     # Ensure players are still connected
     if p1_sid not in players or p2_sid not in players:
         print(f"Cannot start game: one or both SIDs {p1_sid[:4]}, {p2_sid[:4]} disconnected.")
-        # If one disconnected, the other should be put back into ready_to_match
-        if p1_sid in players and not players[p1_sid]['in_game']: # If p1 is not yet in a game, put them back
-             with game_match_lock:
-                 if p1_sid not in ready_to_match: ready_to_match.append(p1_sid)
-        if p2_sid in players and not players[p2_sid]['in_game']: # If p2 is not yet in a game, put them back
-             with game_match_lock:
-                 if p2_sid not in ready_to_match: ready_to_match.append(p2_sid)
+        # If one disconnected, the other should be put back into the ready pool
+        for sid in (p1_sid, p2_sid):
+            if sid in players:
+                players[sid]['in_game'] = False
+                ready_pool.add(sid)
+                commander_feed.status(sid, 'w')
+        socketio.start_background_task(target=attempt_matches)
         return
 
     # Assign opponents and mark as in-game
@@ -222,17 +308,16 @@ def _start_game(p1_sid, p2_sid):
     players[p1_sid]['ready_for_next_game'] = False # Not ready until game is over
     players[p2_sid]['ready_for_next_game'] = False # Not ready until game is over
 
-    # Assign player numbers and set up game log
-    players[p1_sid]['player_num'] = 'p1'
-    players[p2_sid]['player_num'] = 'p2'
+    # Set up the shared game state; p1_sid is player 1
     short_game_id = f"{p1_sid[:2]}{p2_sid[:2]}" # Unique ID for this specific game instance
-    game_log = f"{short_game_id}:"
-    players[p1_sid]['game_log'] = game_log
-    players[p2_sid]['game_log'] = game_log
+    game = GameState(short_game_id, p1_sid, p2_sid)
+    state_store.put_game(game)
+    players[p1_sid]['game_key'] = game.key
+    players[p2_sid]['game_key'] = game.key
 
     # Determine initial scores
-    current_score = linear_payoff(0) # Before any moves, turn_number is 0
-    expected_score_after_first_move = linear_payoff(1) # Score if the first player passes
+    current_score = payoff_table.lookup(0) # Before any moves, turn_number is 0
+    expected_score_after_first_move = payoff_table.lookup(1) # Score if the first player passes
 
     # Player 1 (p1_sid) always starts
     players[p1_sid]['turn'] = True
@@ -240,87 +325,68 @@ def _start_game(p1_sid, p2_sid):
 
     print(f"Starting game between {p1_sid[:4]} and {p2_sid[:4]}. Game ID: {short_game_id}")
 
-    # Emit 'start' event to both players with their respective scores and messages
-    socketio.emit('start', {
-        'game_log': game_log,
-        'your_score': expected_score_after_first_move[0], # P1 expects to pass for this score
-        'opponents_score': expected_score_after_first_move[1], # P2 expects this if P1 passes
-        'round': 1 # For dynamic matching, rounds aren't explicit, but can use 1 as a default
-    }, room=p1_sid, namespace='/')
-    socketio.emit('start', {
-        'game_log': game_log,
-        'your_score': expected_score_after_first_move[1], # P2 expects this if P1 passes
-        'opponents_score': expected_score_after_first_move[0], # P1 expects to pass for this score
-        'round': 1
-    }, room=p2_sid, namespace='/')
-
-    socketio.emit('message', {'msg': 'Your turn! Choose a move:'}, room=p1_sid, namespace='/')
-    socketio.emit('message', {'msg': 'Waiting for opponent...'}, room=p2_sid, namespace='/')
+    # Emit the start frame to both players with their respective scores and turn
+    # (for dynamic matching, rounds aren't explicit, so the game's round stays at 1)
+    protocol.start(p1_sid, game, expected_score_after_first_move[0], expected_score_after_first_move[1], your_turn=True)
+    protocol.start(p2_sid, game, expected_score_after_first_move[1], expected_score_after_first_move[0], your_turn=False)
 
 
 def attempt_matches():
     """
-    Attempts to find and start games for players in the 'ready_to_match' pool.
-    It prioritizes "perfect stranger matching" by looking for players who haven't
-    played against each other before.
+    Attempts to find and start games for players in the ready pool.
+    It enforces "perfect stranger matching": the matching engine pairs up as many
+    ready players as possible with opponents they have not played before.
     """
-    global ready_to_match
-
-    # Acquire lock to ensure atomic operations on ready_to_match and player states
-    with game_match_lock:
-        # Filter out disconnected players from ready_to_match
-        ready_to_match = [sid for sid in ready_to_match if sid in players and not players[sid]['in_game']]
+    # Only one matching pass runs at a time; joins, moves and game ends do not wait on it
+    with state_store.match_lock(), MATCH_SECONDS.time():
+        # Pick up games matched by other workers since this worker's last pass
+        state_store.sync_matching(matching_engine)
+
+        # Filter out disconnected, busy or not-yet-ready players from the ready pool
+        ready_to_match = []
+        stale_sids = []
+        for sid in ready_pool.snapshot():
+            player_data = players.get(sid)  # One read per player (each read hits the store)
+            if player_data and not player_data['in_game'] and player_data['ready_for_next_game']:
+                ready_to_match.append(sid)
+            elif not player_data or player_data['in_game']:
+                stale_sids.append(sid)
+        # Checked again under the pool's lock: a player whose game ended since the snapshot stays
+        ready_pool.remove_if(stale_sids, lambda sid: sid not in players or players[sid]['in_game'])
 
         # Shuffle the list to ensure fairness and reduce bias in matching order
-        random.shuffle(ready_to_match)
+        random_streams.shuffle(ready_to_match)
 
         matched_pairs_for_this_run = []
-        # Iterate through the shuffled list to find pairs
-        for i in range(len(ready_to_match)):
-            p1_sid = ready_to_match[i]
-            # Ensure p1_sid is still valid and ready to be matched
-            if p1_sid not in players or not players[p1_sid]['ready_for_next_game'] or players[p1_sid]['in_game']:
-                continue
-
-            found_match = False
-            for j in range(i + 1, len(ready_to_match)):
-                p2_sid = ready_to_match[j]
-                # Ensure p2_sid is still valid and ready to be matched
-                if p2_sid not in players or not players[p2_sid]['ready_for_next_game'] or players[p2_sid]['in_game']:
-                    continue
-
-                # Check if they haven't played before (perfect stranger matching)
-                if p2_sid not in players[p1_sid]['played_with'] and p1_sid not in players[p2_sid]['played_with']:
-                    matched_pairs_for_this_run.append((p1_sid, p2_sid))
-                    found_match = True
-                    # Mark players as "in-game" right away to prevent double matching in this loop
-                    players[p1_sid]['in_game'] = True
-                    players[p2_sid]['in_game'] = True
-                    break # Found a match for p1_sid, move to next p1_sid in outer loop
-
-            if found_match:
-                continue # Move to the next player to try and match
-
-        # Now, process the matched pairs outside the main iteration
-        for p1_sid, p2_sid in matched_pairs_for_this_run:
-            # Remove matched players from the ready_to_match list
-            ready_to_match = [sid for sid in ready_to_match if sid not in [p1_sid, p2_sid]]
-
-            # Add to played_with sets
-            players[p1_sid]['played_with'].add(p2_sid)
-            players[p2_sid]['played_with'].add(p1_sid)
+        matched_sids = set()
+        for p1_sid, p2_sid in matching_engine.match(ready_to_match):
+            # Take the pair out of the pool before its game can start (and end, and add them back)
+            if not ready_pool.take_pair(p1_sid, p2_sid):
+                continue  # One of them left the pool since the snapshot
+            matched_pairs_for_this_run.append((p1_sid, p2_sid))
+            # Mark players as "in-game" right away to prevent double matching
+            players[p1_sid]['in_game'] = True
+            players[p2_sid]['in_game'] = True
+            matching_engine.record_game(p1_sid, p2_sid)
+            state_store.record_played(p1_sid, p2_sid)
+            matched_sids.update((p1_sid, p2_sid))
+            MATCHES.inc()
+            commander_feed.status(p1_sid, 'g')
+            commander_feed.status(p2_sid, 'g')
 
             # Start the game (this part should be non-blocking, so put in background task)
             socketio.start_background_task(target=_start_game, p1_sid=p1_sid, p2_sid=p2_sid)
-            print(f"Attempting to start game between {p1_sid[:4]} and {p2_sid[:4]}. "
-                  f"Remaining ready players: {len(ready_to_match)}")
+
+        ready_to_match = [sid for sid in ready_to_match if sid not in matched_sids]
+        print(f"Matched {len(matched_pairs_for_this_run)} pairs in {matching_engine.last_ms:.2f} ms. "
+              f"Remaining ready players: {len(ready_to_match)}")
 
         # Logic for when no new matches were found in this attempt
         if not matched_pairs_for_this_run and ready_to_match: # Only message if there are players still waiting
             print("No new 'perfect stranger' matches found in this attempt.")
             
             # Get a snapshot of currently active and available players for matching
-            current_active_player_sids = {sid for sid in players if not players[sid]['in_game'] and players[sid]['ready_for_next_game']}
+            current_active_player_sids = {sid for sid, data in players.items() if not data['in_game'] and data['ready_for_next_game']}
             
             for p_sid in list(ready_to_match): # Iterate over a copy of ready_to_match
                 if p_sid not in players: # Skip if player disconnected while loop was running
@@ -331,7 +397,7 @@ def attempt_matches():
 
                 # Check if the player has played with all possible unique opponents
                 # This condition covers both having played everyone AND not being the only player remaining.
-                if len(all_possible_opponents_for_p_sid) > 0 and players[p_sid]['played_with'].issuperset(all_possible_opponents_for_p_sid):
+                if len(all_possible_opponents_for_p_sid) > 0 and matching_engine.has_played_all(p_sid, all_possible_opponents_for_p_sid):
                     # This player has played with every other active player at least once.
                     socketio.emit('message', {'msg': 'You have played all possible unique matches with current players. Waiting for new players or for other games to finish.'}, room=p_sid, namespace='/')
                     print(f"Player {p_sid[:4]} has exhausted all unique opponents among active players.")
@@ -341,10 +407,7 @@ def attempt_matches():
                 else:
                     # Generic waiting message if matches *could* still be made but weren't in this run
                     socketio.emit('message', {'msg': 'No new opponent found for you at this time. Please wait.'}, room=p_sid, namespace='/')
-            
-        # Inform commander about current waiting players
-        waiting_player_names = [players[sid]['name'] for sid in ready_to_match if sid in players]
-        socketio.emit('update_players', {'players': waiting_player_names}, room='commander', namespace='/')
+
 
 
 @socketio.on('move')
@@ -356,12 +419,40 @@ def handle_move(data):
     sid = request.sid
     move = data['move']
     player_data = players.get(sid)
+    game_key = player_data.get('game_key') if player_data else None
+
+    # A move only touches this game's two players, so it runs under the game's own lock
+    # and never contends with moves in other games.
+    with MOVE_SECONDS.time(), state_store.locked_game(game_key) as game:
+        if game is None:
+            print(f"Invalid move from {sid[:4]}: No game or player data missing.")
+            return
+        player_data = players.get(sid)  # Re-read under the lock; another worker may have changed it
+        if player_data is None:
+            return
+        ended = _apply_move(sid, player_data, game, move)
+        MOVES.inc()
+        if ended:
+            # Taken, or abandoned by a disconnected opponent: either way the game leaves the store
+            state_store.delete_game(game.key)
+            random_streams.end_game(game)
+            if game.is_over():
+                GAMES.inc()
+        else:
+            state_store.save_game(game)
+
+
+def _apply_move(sid, player_data, game, move):
+    """
+    Validates and applies a move to a game. Must be called inside state_store.locked_game().
+    Returns True if the game ended (the pot was taken, or the opponent is gone).
+    """
+    if not player_data.get('in_game') or game.is_over():
+        # Ignore move if player not in game, or the game already ended
+        print(f"Invalid move from {sid[:4]}: Not in game.")
+        return False
 
-    if not player_data or not player_data.get('in_game') or not player_data.get('turn'):
-        # Ignore move if player not found, not in game, or not their turn
-        print(f"Invalid move from {sid[:4]}: Not in game, or not their turn, or player data missing.")
-        return
-
+    # Checked before the turn, so a player whose opponent left on their own turn is not stuck
     opponent_sid = player_data.get('opponent')
     if not opponent_sid or opponent_sid not in players or not players[opponent_sid].get('in_game'):
         # Opponent disconnected or no longer in game. End current player's game.
@@ -370,43 +461,32 @@ def handle_move(data):
         player_data['in_game'] = False
         player_data['ready_for_next_game'] = True # Ready for next match
         # If the opponent disconnected, we should make this player available for a new match immediately.
-        with game_match_lock:
-            if sid not in ready_to_match:
-                ready_to_match.append(sid)
+        ready_pool.add(sid)
+        commander_feed.status(sid, 'w')
         socketio.start_background_task(target=attempt_matches) # Attempt new match automatically
-        return
+        return True
+
+    if not player_data.get('turn'):
+        print(f"Invalid move from {sid[:4]}: Not their turn.")
+        return False
 
-    game_log = player_data['game_log']
-    base_game_id, moves_so_far = game_log.split(':', 1) # Ensure we only split on the first colon
-    
     # Determine the move symbol: 'x' for take, '0' or '2' for pass (random chance for '2')
-    move_symbol = 'x' if move == 'take' else ('2' if random.random() < 0.25 else '0')
-    
-    # Append new move to the game log
-    updated_moves_str = moves_so_far + '|' + move_symbol if moves_so_far else move_symbol
-    updated_log = f"{base_game_id}:{updated_moves_str}"
-
-    # Update game logs for both players
-    players[sid]['game_log'] = updated_log
-    players[opponent_sid]['game_log'] = updated_log
-
-    # Calculate turn number based on the updated log
-    turn_number = strip_game_log(updated_log)
-    
+    # The game's stream is named by the players' join numbers, not their random sids
+    move_symbol = 'x' if move == 'take' else ('2' if random_streams.event(game, lambda: (
+        state_store.player_number(game.p1_sid), state_store.player_number(game.p2_sid))) else '0')
+
+    # Record the move in the shared game state; the turn number is the number of moves made
+    turn_number = game.add_move(move_symbol)
+
     # Calculate current scores (what they receive if someone takes the pot now)
-    current_payoff_tuple = linear_payoff(turn_number)
+    current_payoff_tuple = payoff_table.lookup(turn_number)
+    game.current_payoff = current_payoff_tuple
     # Calculate next expected scores (what they'd get if the game continues)
-    expected_payoff_tuple = linear_payoff(turn_number + 1)
-
-    # Prepare UI log: replace internal symbols with emojis for display
-    ui_log_display = updated_moves_str.replace('|', '')
-    ui_log_display = ui_log_display.replace('0', '🟩')
-    ui_log_display = ui_log_display.replace('2', '🟩')
-    ui_log_display = ui_log_display.replace('x', '🟥')
+    expected_payoff_tuple = payoff_table.lookup(turn_number + 1)
 
     # Helper to get scores from the perspective of a specific player (p1 vs p2)
     def get_player_perspective_scores(player_sid, p_payoff_tuple):
-        return (p_payoff_tuple[0], p_payoff_tuple[1]) if players[player_sid]['player_num'] == 'p1' else \
+        return (p_payoff_tuple[0], p_payoff_tuple[1]) if game.player_num(player_sid) == 'p1' else \
                (p_payoff_tuple[1], p_payoff_tuple[0])
 
     # Scores for the current player's perspective
@@ -419,10 +499,10 @@ def handle_move(data):
 
 
     if move_symbol == 'x': # Player chose to 'take' the pot
-        print(f"Game {base_game_id}: {sid[:4]} took the pot. Moves: {updated_moves_str}")
+        print(f"Game {game.game_id}: {sid[:4]} took the pot. Moves: {game.moves_str()}")
 
         # Save game log to file
-        save_game_log(updated_log, sid, opponent_sid, current_payoff_tuple)
+        save_game_log(game, sid, opponent_sid, current_payoff_tuple)
 
         # Mark players as no longer in game and ready for next match
         players[sid]['turn'] = False
@@ -437,69 +517,43 @@ def handle_move(data):
         players[opponent_sid]['total_score'] += your_opponent_current_score
         update_total_score_log(sid, players[sid]['total_score'])
         update_total_score_log(opponent_sid, players[opponent_sid]['total_score'])
+        for player_sid in (sid, opponent_sid):
+            commander_feed.score(player_sid, players[player_sid]['total_score'])
+            commander_feed.status(player_sid, 'w')
 
         print(f"Total scores: {sid[:4]}: {players[sid]['total_score']}, "
               f"{opponent_sid[:4]}: {players[opponent_sid]['total_score']}")
 
-        # Emit game over messages to both players
-        socketio.emit('game_over', {
-            'msg': 'Game Over, you took the pot!',
-            'winner': 'true', # From their perspective
-            'your_score': your_current_score,
-            'opponents_score': your_opponent_current_score,
-            'final_log': ui_log_display,
-            'total_score': players[sid]['total_score'] # Send total score to client
-        }, room=sid, namespace='/')
-
-        socketio.emit('game_over', {
-            'msg': 'Game Over, your opponent took the pot!',
-            'winner': 'false', # From their perspective
-            'your_score': opp_current_score,
-            'opponents_score': opp_opponent_current_score,
-            'final_log': ui_log_display,
-            'total_score': players[opponent_sid]['total_score'] # Send total score to client
-        }, room=opponent_sid, namespace='/')
-
-        # Updated message to reflect automatic re-matching
-        socketio.emit('message', {'msg': 'Game over. Searching for a new match...'}, room=sid, namespace='/')
-        socketio.emit('message', {'msg': 'Game over. Searching for a new match...'}, room=opponent_sid, namespace='/')
-
-        # Add players back to the ready_to_match pool for dynamic matching
-        with game_match_lock:
-            if sid not in ready_to_match:
-                ready_to_match.append(sid)
-            if opponent_sid not in ready_to_match:
-                ready_to_match.append(opponent_sid)
+        # Emit game over to both players (winner from their perspective); 'm' = searching for a new match
+        final_log = game.ui_log() if protocol.version == 1 else None
+        protocol.game_over(sid, game, True, your_current_score, your_opponent_current_score,
+                           final_log, after='m', total_score=players[sid]['total_score'])
+        protocol.game_over(opponent_sid, game, False, opp_current_score, opp_opponent_current_score,
+                           final_log, after='m', total_score=players[opponent_sid]['total_score'])
+
+        # Add players back to the ready pool for dynamic matching
+        ready_pool.add(sid)
+        ready_pool.add(opponent_sid)
         
         # Now, automatically attempt to match new games
         socketio.start_background_task(target=attempt_matches)
+        return True
 
     else: # Player chose to 'pass'
-        print(f"Game {base_game_id}: {sid[:4]} passed. Moves: {updated_moves_str}")
-
-        # Emit update to both players with new scores and log
-        socketio.emit('update', {
-            'your_score': your_expected_score,
-            'opponents_score': your_opponent_expected_score,
-            'log': ui_log_display,
-        }, room=sid, namespace='/')
-
-        socketio.emit('update', {
-            'your_score': opp_expected_score,
-            'opponents_score': opp_opponent_expected_score,
-            'log': ui_log_display,
-        }, room=opponent_sid, namespace='/')
+        print(f"Game {game.game_id}: {sid[:4]} passed. Turn: {turn_number}")
 
         # Switch turns
         players[sid]['turn'] = False
         players[opponent_sid]['turn'] = True
-        socketio.emit('message', {'msg': 'Waiting for opponent...'}, room=sid, namespace='/')
-        socketio.emit('message', {'msg': 'Your turn! Choose a move:'}, room=opponent_sid, namespace='/')
+
+        # Emit update to both players with new scores, log and turn
+        protocol.update(sid, game, your_expected_score, your_opponent_expected_score, your_turn=False)
+        protocol.update(opponent_sid, game, opp_expected_score, opp_opponent_expected_score, your_turn=True)
+        return False
 
 # --- Run App ---
 if __name__ == '__main__':
     # When running locally without a Canvas environment, __app_id might not be defined.
     # We can use a default Flask app name in that case.
     app.config['SECRET_KEY'] = 'a_secret_key_for_flask_sessions' # Necessary for SocketIO
-    print("Starting Flask SocketIO server...")
-    socketio.run(app, host='0.0.0.0', port=5001, debug=True, allow_unsafe_werkzeug=True) # debug=True for local development
+    server_backend.run(socketio, app) # SERVER_DEBUG=1 for local development
@@ -0,0 +1,50 @@
+"""
+Compares the async backends (ASYNC_MODE) of the matchmaking server end to end.
+For each mode it starts app_gemini.py in a subprocess and runs the load test
+(load_test.py) against it: --players bots join, the commander starts matching, and
+each bot passes on its turn or takes the pot with probability --take.
+
+Reports connections per second, moves per second, move round-trip p95 and server CPU.
+
+    python bench_backends.py --modes threading eventlet gevent --players 50 --seconds 10
+
+Modes whose packages are not installed are reported and skipped.
+"""
+import argparse, importlib.util
+
+from load_test import run_load_test, start_server
+
+MODE_PACKAGES = {'threading': None, 'eventlet': 'eventlet', 'gevent': 'gevent'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare connections/s and moves/s across async backends.")
+    parser.add_argument('--modes', nargs='+', default=list(MODE_PACKAGES))
+    parser.add_argument('--players', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--take', type=float, default=0.05, help="probability a bot takes the pot on its turn")
+    parser.add_argument('--port', type=int, default=5101)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'connections/s':>14} {'moves/s':>10} {'move p95 ms':>12} {'server CPU %':>13}")
+    for i, mode in enumerate(args.modes):
+        package = MODE_PACKAGES.get(mode)
+        if mode not in MODE_PACKAGES or (package and importlib.util.find_spec(package) is None):
+            print(f"{mode:>10} {'(not available)':>25}")
+            continue
+        port = args.port + i
+        server = start_server('app_gemini.py', port, {'ASYNC_MODE': mode})
+        if server is None:
+            print(f"{mode:>10} {'(server did not start)':>25}")
+            continue
+        try:
+            report = run_load_test(f"http://127.0.0.1:{port}", args.players, args.take, args.seconds, pid=server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{mode:>10} {report['connections_per_s']:>14.1f} {report['moves_per_s']:>10.1f} "
+              f"{report['move']['p95_ms']:>12.2f} {report['server']['cpu_percent']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
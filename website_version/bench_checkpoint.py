@@ -0,0 +1,126 @@
+"""
+Checkpoint benchmark: plays a tournament through Session (the app.py state path, without
+Socket.IO) with and without a checkpoint directory, then restores the session from disk.
+
+    python bench_checkpoint.py --players 300 --rounds 20 --take 0.1
+
+Reports the per-move cost of the WAL append (move path with checkpoints minus without,
+plus the Checkpointer's own append timings), snapshot time and size, and restore time
+(load the snapshot, replay the WAL). It also checks that the restored session matches
+the one that was played: same totals, round and game states.
+"""
+import argparse, random, shutil, statistics, tempfile, threading, time
+
+from log_pipeline import LogPipeline
+from session import Session
+
+
+class BackgroundTasks:
+    """
+    The part of the Socket.IO server Session uses: background tasks (snapshots) run in threads.
+    """
+
+    def __init__(self):
+        self.threads = []
+
+    def start_background_task(self, target, *args, **kwargs):
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return thread
+
+    def emit(self, *args, **kwargs):
+        pass
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+def play(session, rounds, take_probability, rng):
+    """
+    Plays up to rounds rounds. Returns the time spent in each play_move call.
+    """
+    move_seconds = []
+    session.start_tournament()
+    while session.current_round_index < min(rounds, len(session.tournament_schedule)):
+        _, games, _ = session.setup_round()
+        active = list(games)
+        while active:
+            still_active = []
+            for game in active:
+                player = game.p1_sid if session.players[game.p1_sid]['turn'] else game.p2_sid
+                symbol = 'x' if rng.random() < take_probability else '0'
+                start = time.perf_counter()
+                session.play_move(game, player, symbol)
+                move_seconds.append(time.perf_counter() - start)
+                if game.is_over():
+                    session.round_tracker.complete(game)
+                else:
+                    still_active.append(game)
+            active = still_active
+        session.current_round_index += 1
+    return move_seconds
+
+
+def fingerprint(session):
+    return ({token: data['total_score'] for token, data in session.players.items()},
+            session.current_round_index,
+            sorted((key, game.moves_str()) for key, game in session.games.items()))
+
+
+def run(args, checkpoint_dir, log_dir, tasks, pipeline):
+    session = Session('bench', tasks, pipeline, log_dir=log_dir, checkpoint_dir=checkpoint_dir,
+                      checkpoint_every=args.every, checkpoint_interval=args.interval)
+    for i in range(args.players):
+        session.add_player(f"p{i}", token=f"{i:032x}")
+    move_seconds = play(session, args.rounds, args.take, random.Random(args.seed))
+    tasks.join()
+    return session, move_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure checkpoint overhead and restore time.")
+    parser.add_argument('--players', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--take', type=float, default=0.1, help="probability a move takes the pot")
+    parser.add_argument('--every', type=int, default=500, help="records between snapshots")
+    parser.add_argument('--interval', type=float, default=30.0, help="seconds between snapshots")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    tasks = BackgroundTasks()
+    pipeline = LogPipeline()
+    try:
+        _, plain = run(args, None, tmp, tasks, pipeline)
+        session, checkpointed = run(args, f"{tmp}/checkpoints", tmp, tasks, pipeline)
+        stats = session.checkpointer.stats()
+        expected = fingerprint(session)
+        session.close()
+
+        start = time.perf_counter()
+        restored, _ = Session.restore('bench', tasks, pipeline, f"{tmp}/checkpoints", log_dir=tmp)
+        restore_ms = (time.perf_counter() - start) * 1000
+        restored.close()
+
+        plain_us = statistics.mean(plain) * 1e6
+        checkpointed_us = statistics.mean(checkpointed) * 1e6
+        print(f"{args.players} players, {len(checkpointed)} moves, snapshot every {args.every} records")
+        print(f"  move without checkpoints: {plain_us:.1f} us mean")
+        print(f"  move with checkpoints:    {checkpointed_us:.1f} us mean "
+              f"(+{checkpointed_us - plain_us:.1f} us; WAL append {stats['append_us_mean']} us mean, "
+              f"{stats['append_us_max']} us max)")
+        print(f"  snapshots: {stats['snapshots']}, last {stats['last_snapshot_ms']} ms, "
+              f"{stats['last_snapshot_bytes'] / 1024:.1f} KiB")
+        print(f"  restore: {restore_ms:.1f} ms, state {'matches' if fingerprint(restored) == expected else 'DIFFERS'}")
+    finally:
+        pipeline.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Microbenchmarks for the session hot paths: round-robin scheduling, the old PSM
+generator (old/PSM.py), perfect-stranger matching, the payoff schedules and
+legacy game-log parsing, each at several sizes (players, or moves for long games).
+
+    python bench_micro.py run --out baseline.json
+    python bench_micro.py run --out current.json --sizes 10 30 100 1000
+    python bench_micro.py compare baseline.json current.json --threshold 0.2
+
+run writes {case: {size: {'median_ms', 'min_ms', 'repeats'}}} as JSON. compare prints
+the ratio for every case present in both files, flags cases that got slower by more
+than --threshold, and exits with status 1 if any did.
+"""
+import argparse, json, os, platform, random, statistics, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'old'))
+
+from PSM import generate_PSM
+from game_state import strip_game_log
+from matching import MatchingEngine
+from payoff import PayoffTable, exponential_payoff, linear_payoff
+from scheduling import RoundRobinSchedule, round_robin
+
+DEFAULT_SIZES = [10, 30, 100, 1000]
+
+
+def setup_round_robin(n):
+    players = [f"p{i}" for i in range(n)]
+    return lambda: round_robin(players)
+
+
+def setup_round_robin_round(n):
+    """
+    One round from the middle of the schedule, as play_next_round computes it.
+    """
+    schedule = RoundRobinSchedule([f"p{i}" for i in range(n)])
+    return lambda: schedule.round(len(schedule) // 2)
+
+
+def setup_generate_psm(n):
+    players = [f"p{i}" for i in range(n)]
+    return lambda: generate_PSM(players, seed=n)
+
+
+def setup_generate_psm_no_contagion(n):
+    players = [f"p{i}" for i in range(n)]
+    return lambda: generate_PSM(players, seed=n, no_contagion=True)
+
+
+def setup_match(n):
+    """
+    A pool of n ready players, a quarter of the way through a perfect-stranger session.
+    """
+    rng = random.Random(n)
+    engine = MatchingEngine()
+    sids = [f"p{i}" for i in range(n)]
+    for _ in range(max(1, n // 4)):
+        rng.shuffle(sids)
+        for pair in engine.match(sids):
+            engine.record_game(*pair)
+    rng.shuffle(sids)
+    return lambda: engine.match(sids)
+
+
+def setup_linear_payoff(n):
+    return lambda: [linear_payoff(turn) for turn in range(n)]
+
+
+def setup_exponential_payoff(n):
+    return lambda: [exponential_payoff(turn) for turn in range(n)]
+
+
+def setup_payoff_table(n):
+    table = PayoffTable.from_schedule('linear')
+    return lambda: [table.lookup(turn) for turn in range(n)]
+
+
+def setup_strip_game_log(n):
+    game_log = 'abcd:' + '|'.join('0' for _ in range(n))
+    return lambda: strip_game_log(game_log)
+
+
+# Case name -> setup(size) returning the function to time
+CASES = {
+    'round_robin': setup_round_robin,
+    'round_robin_round': setup_round_robin_round,
+    'generate_PSM': setup_generate_psm,
+    'generate_PSM_no_contagion': setup_generate_psm_no_contagion,
+    'match': setup_match,
+    'linear_payoff': setup_linear_payoff,
+    'exponential_payoff': setup_exponential_payoff,
+    'payoff_table': setup_payoff_table,
+    'strip_game_log': setup_strip_game_log,
+}
+
+
+def time_call(fn, min_time=0.2, max_repeats=1000):
+    """
+    Calls fn until min_time has passed (at least 3 times). Returns per-call times in ms.
+    """
+    times = []
+    start = time.perf_counter()
+    while len(times) < 3 or (time.perf_counter() - start < min_time and len(times) < max_repeats):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return times
+
+
+def run(args):
+    results = {'_meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                         'time': time.strftime('%Y-%m-%dT%H:%M:%S')}}
+    for name, setup in CASES.items():
+        if args.cases and name not in args.cases:
+            continue
+        results[name] = {}
+        for size in args.sizes:
+            times = time_call(setup(size), args.min_time)
+            results[name][str(size)] = {'median_ms': round(statistics.median(times), 4),
+                                        'min_ms': round(min(times), 4), 'repeats': len(times)}
+            print(f"{name:>26} {size:>6} {statistics.median(times):>12.4f} ms")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = 0
+    print(f"{'case':>26} {'size':>6} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for name, sizes in current.items():
+        if name.startswith('_') or name not in baseline:
+            continue
+        for size, result in sizes.items():
+            before = baseline[name].get(size)
+            if before is None:
+                continue
+            ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else 1.0
+            flag = ''
+            if ratio > 1 + args.threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            elif ratio < 1 - args.threshold:
+                flag = '  faster'
+            print(f"{name:>26} {size:>6} {before['median_ms']:>12.4f} {result['median_ms']:>12.4f} {ratio:>7.2f}{flag}")
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for scheduling, matching, payoffs and log parsing.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmarks")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    run_parser.add_argument('--cases', nargs='+', choices=list(CASES), help="only run these cases")
+    run_parser.add_argument('--min-time', type=float, default=0.2, help="seconds to spend per case and size")
+    run_parser.add_argument('--out', help="write results as JSON")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help="compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown, e.g. 0.2 = 20%%")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
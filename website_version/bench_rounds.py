@@ -0,0 +1,169 @@
+"""
+Round progression benchmark: simulates a round robin under barrier rounds (a round starts
+when its slowest game ends) and pipelined rounds (PipelinedDispatcher: a player's next
+game starts once both players of that pair are free), with the same game durations.
+
+    python bench_rounds.py --players 40 --spread 0.5
+    python bench_rounds.py --players 41 --rounds 10 --session
+
+A game's duration is base * (the slower player's speed factor) * noise, with per-player
+speed factors and per-game noise both lognormal, so some players are consistently slow.
+Reports the makespan and players' idle time (free but not in a game, byes included) in
+each mode, and checks that every pair is played exactly once. --session also plays the
+pipelined tournament through Session, in a random finish order, and checks that a
+restore from the checkpoint reproduces it.
+"""
+import argparse, heapq, random, shutil, statistics, tempfile
+
+from bench_checkpoint import BackgroundTasks
+from log_pipeline import LogPipeline
+from scheduling import PipelinedDispatcher, RoundRobinSchedule
+from session import Session
+
+
+def durations(schedule, args, rng):
+    """
+    Returns {(p1, p2): seconds} for every game in the schedule, keyed in round(k) orientation.
+    """
+    speed = {player: rng.lognormvariate(0, args.spread) for player in schedule.players if player is not None}
+    games = {}
+    for k in range(len(schedule)):
+        for p1, p2 in schedule.round(k):
+            if p1 is not None and p2 is not None:
+                games[(p1, p2)] = args.base * max(speed[p1], speed[p2]) * rng.lognormvariate(0, args.noise)
+    return games
+
+
+def barrier(schedule, games):
+    """
+    Returns (makespan, {player: idle seconds}, pairs played) with a barrier after every round.
+    """
+    players = [player for player in schedule.players if player is not None]
+    idle = dict.fromkeys(players, 0.0)
+    played = []
+    makespan = 0.0
+    for k in range(len(schedule)):
+        busy = {}
+        for p1, p2 in schedule.round(k):
+            if p1 is not None and p2 is not None:
+                busy[p1] = busy[p2] = games[(p1, p2)]
+                played.append((p1, p2))
+        length = max(busy.values(), default=0.0)
+        for player in players:
+            idle[player] += length - busy.get(player, 0.0)
+        makespan += length
+    return makespan, idle, played
+
+
+def pipelined(schedule, games):
+    """
+    Returns (makespan, {player: idle seconds}, pairs played) with PipelinedDispatcher.
+    """
+    players = [player for player in schedule.players if player is not None]
+    idle = dict.fromkeys(players, 0.0)
+    free_since = dict.fromkeys(players, 0.0)
+    dispatcher = PipelinedDispatcher(schedule)
+    events = []  # (finish time, p1, p2)
+    played = []
+    now = 0.0
+
+    def start(started):
+        for p1, p2, _ in started:
+            for player in (p1, p2):
+                idle[player] += now - free_since.pop(player)
+            heapq.heappush(events, (now + games[(p1, p2)], p1, p2))
+            played.append((p1, p2))
+
+    start(dispatcher.start())
+    while events:
+        now, p1, p2 = heapq.heappop(events)
+        free_since[p1] = free_since[p2] = now
+        start(dispatcher.finish(p1, p2))
+    for player, since in free_since.items():
+        idle[player] += now - since
+    return now, idle, played
+
+
+def check_pairs(schedule, played):
+    pairs = [frozenset(pair) for pair in played]
+    expected = {frozenset(pair) for k in range(len(schedule)) for pair in schedule.round(k) if None not in pair}
+    return len(pairs) == len(set(pairs)) and set(pairs) == expected
+
+
+def play_session(args, rng):
+    """
+    Plays a pipelined tournament through Session, finishing games in a random order, then
+    restores it from its checkpoint. Returns (pairs played, restored state matches).
+    """
+    tmp = tempfile.mkdtemp()
+    tasks = BackgroundTasks()
+    pipeline = LogPipeline()
+    try:
+        session = Session('bench', tasks, pipeline, log_dir=tmp, checkpoint_dir=f"{tmp}/checkpoints",
+                          max_rounds=args.rounds, round_mode='pipelined', checkpoint_every=200)
+        for i in range(args.players):
+            session.add_player(f"p{i}", token=f"{i:032x}")
+        session.start_tournament()
+        active = session.start_pipelined()
+        played = [(game.p1_sid, game.p2_sid) for game in active]
+        while active:
+            game = active.pop(rng.randrange(len(active)))
+            while not game.is_over():
+                player = game.p1_sid if session.players[game.p1_sid]['turn'] else game.p2_sid
+                session.play_move(game, player, 'x' if rng.random() < args.take else '0')
+            started = session.advance(game)
+            played.extend((started_game.p1_sid, started_game.p2_sid) for started_game in started)
+            active.extend(started)
+        tasks.join()
+        expected = ({token: data['total_score'] for token, data in session.players.items()},
+                    session.dispatcher.next_round, session.dispatcher.is_done())
+        session.close()
+        restored, _ = Session.restore('bench', tasks, pipeline, f"{tmp}/checkpoints", log_dir=tmp)
+        matches = expected == ({token: data['total_score'] for token, data in restored.players.items()},
+                               restored.dispatcher.next_round, restored.dispatcher.is_done())
+        restored.close()
+        return session.tournament_schedule, played, matches
+    finally:
+        pipeline.close()
+        shutil.rmtree(tmp)
+
+
+def report(name, makespan, idle):
+    values = list(idle.values())
+    print(f"  {name:<10} makespan {makespan:8.1f}s, idle mean {statistics.mean(values):7.1f}s, "
+          f"max {max(values):7.1f}s ({sum(values) / (len(values) * makespan):.1%} of player time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare barrier and pipelined round progression.")
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--rounds', type=int, default=0, help="play only this many rounds (0 = all)")
+    parser.add_argument('--base', type=float, default=30.0, help="median game length in seconds")
+    parser.add_argument('--spread', type=float, default=0.5, help="sigma of the players' lognormal speed factors")
+    parser.add_argument('--noise', type=float, default=0.3, help="sigma of the per-game lognormal noise")
+    parser.add_argument('--take', type=float, default=0.2, help="probability a move takes the pot (--session)")
+    parser.add_argument('--session', action='store_true', help="also play the pipelined mode through Session")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    schedule = RoundRobinSchedule([f"p{i}" for i in range(args.players)], max_rounds=args.rounds)
+    games = durations(schedule, args, rng)
+    print(f"{args.players} players, {len(schedule)} rounds, {len(games)} games")
+    barrier_makespan, barrier_idle, barrier_played = barrier(schedule, games)
+    pipelined_makespan, pipelined_idle, pipelined_played = pipelined(schedule, games)
+    report('barrier', barrier_makespan, barrier_idle)
+    report('pipelined', pipelined_makespan, pipelined_idle)
+    print(f"  pipelined makespan is {pipelined_makespan / barrier_makespan:.1%} of barrier")
+    ok = check_pairs(schedule, barrier_played) and check_pairs(schedule, pipelined_played)
+    print(f"  every pair played exactly once: {'yes' if ok else 'NO'}")
+
+    if args.session:
+        session_schedule, played, matches = play_session(args, rng)
+        print(f"  Session: {len(played)} games, every pair once: "
+              f"{'yes' if check_pairs(session_schedule, played) else 'NO'}, "
+              f"restore {'matches' if matches else 'DIFFERS'}")
+
+
+if __name__ == '__main__':
+    main()
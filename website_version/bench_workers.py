@@ -0,0 +1,120 @@
+"""
+Multi-worker benchmark for the shared state store: runs the move path of app_gemini.py
+(lock the game, read the player, apply the move, write players and game back) in
+1..K worker processes against one SQLiteStateStore, and compares it with the
+single-process in-memory store. Each move also burns --cpu-us of CPU for the
+per-move Socket.IO work (packet encoding, emits to both players), which is what
+pins one process to one core.
+
+Concurrent players per machine are estimated from moves/s and how long a player
+thinks before moving (--think-s): each game makes one move per think time and has two players.
+
+    python bench_workers.py --workers 1 2 4 --games 64 --moves 50 --cpu-us 300
+
+A real deployment also needs sticky sessions at the load balancer (each Socket.IO
+connection must stay on one worker) and SOCKETIO_MESSAGE_QUEUE so emits cross workers.
+"""
+import argparse, multiprocessing, os, tempfile, time
+
+from game_state import GameState
+from payoff import PayoffTable
+from state_store import open_state_store
+
+
+def burn(cpu_s):
+    end = time.perf_counter() + cpu_s
+    while time.perf_counter() < end:
+        pass
+
+
+def setup_games(store, n_games):
+    keys = []
+    for i in range(n_games):
+        p1, p2 = f"a{i}", f"b{i}"
+        for sid, opponent, turn in ((p1, p2, True), (p2, p1, False)):
+            store.players[sid] = {'name': sid, 'opponent': opponent, 'turn': turn, 'in_game': True,
+                                  'ready_for_next_game': False, 'total_score': 0, 'game_key': None}
+        game = GameState(f"g{i}", p1, p2)
+        store.put_game(game)
+        store.players[p1]['game_key'] = game.key
+        store.players[p2]['game_key'] = game.key
+        keys.append(game.key)
+    return keys
+
+
+def play(store, keys, moves_per_game, cpu_s):
+    """
+    Plays moves round-robin across this worker's games, as handle_move would.
+    """
+    table = PayoffTable.from_schedule('linear')
+    for _ in range(moves_per_game):
+        for key in keys:
+            with store.locked_game(key) as game:
+                sid = game.p1_sid if game.turn_number % 2 == 0 else game.p2_sid
+                player_data = store.players[sid]
+                if not player_data['turn']:
+                    continue
+                turn_number = game.add_move('0')
+                game.current_payoff = table.lookup(turn_number)
+                table.lookup(turn_number + 1)
+                burn(cpu_s)
+                player_data['turn'] = False
+                store.players[game.opponent_of(sid)]['turn'] = True
+                store.save_game(game)
+
+
+def _worker(url, keys, moves_per_game, cpu_s, start_event):
+    store = open_state_store(url)
+    start_event.wait()
+    play(store, keys, moves_per_game, cpu_s)
+
+
+def run_workers(n_workers, n_games, moves_per_game, cpu_s, directory):
+    """
+    Splits n_games across n_workers processes sharing one SQLite store. Returns moves per second.
+    """
+    url = f"sqlite:{os.path.join(directory, f'bench_{n_workers}.db')}"
+    keys = setup_games(open_state_store(url), n_games)
+    start_event = multiprocessing.Event()
+    procs = [multiprocessing.Process(target=_worker, args=(url, keys[w::n_workers], moves_per_game, cpu_s, start_event))
+             for w in range(n_workers)]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)  # Let every worker open its connection
+    start = time.perf_counter()
+    start_event.set()
+    for p in procs:
+        p.join()
+    return n_games * moves_per_game / (time.perf_counter() - start)
+
+
+def run_memory(n_games, moves_per_game, cpu_s):
+    store = open_state_store('memory')
+    keys = setup_games(store, n_games)
+    start = time.perf_counter()
+    play(store, keys, moves_per_game, cpu_s)
+    return n_games * moves_per_game / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare move throughput of one process vs several workers on a shared store.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--games', type=int, default=64)
+    parser.add_argument('--moves', type=int, default=50, help="moves per game")
+    parser.add_argument('--cpu-us', type=float, default=300, help="simulated per-move Socket.IO CPU time")
+    parser.add_argument('--think-s', type=float, default=2.0, help="seconds a player thinks before each move")
+    args = parser.parse_args()
+
+    cpu_s = args.cpu_us / 1e6
+    print(f"{os.cpu_count()} CPUs, {args.games} games x {args.moves} moves, {args.cpu_us:.0f} us CPU per move")
+    print(f"{'setup':>22} {'moves/s':>10} {'est. players':>13}")
+    rate = run_memory(args.games, args.moves, cpu_s)
+    print(f"{'1 process, memory':>22} {rate:>10.0f} {2 * rate * args.think_s:>13.0f}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n in args.workers:
+            rate = run_workers(n, args.games, args.moves, cpu_s, directory)
+            print(f"{f'{n} workers, sqlite':>22} {rate:>10.0f} {2 * rate * args.think_s:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import random
+
+# Every bot draws from rng_for(game). Session makes that a stream named by the session
+# seed, the bot and the move (see random_streams.py), so a bot's draws come out the same
+# on a re-run or after a restore; by default it is the module-level generator.
+def _module_random(game):
+    return random
+
+
+class FixedTurnBot:
+    """
+    Passes until the game reaches turn `turn`, then takes the pot on its first move from there.
+    """
+
+    def __init__(self, turn=6):
+        self.turn = int(turn)
+
+    def decide(self, session, game):
+        return 'take' if game.turn_number + 1 >= self.turn else 'pass'
+
+
+class ProbabilisticBot:
+    """
+    Takes the pot with probability p on each of its turns.
+    """
+
+    rng_for = staticmethod(_module_random)
+
+    def __init__(self, p=0.2):
+        self.p = float(p)
+
+    def decide(self, session, game):
+        return 'take' if self.rng_for(game).random() < self.p else 'pass'
+
+
+class MimicBot:
+    """
+    Plays like the people in its session: at the start of each game it draws a take turn
+    from the turns at which human games in the session ended, and takes on its first
+    move from there. Until enough human games have finished, it falls back to `fallback`.
+    The drawn target depends on when it was drawn, so Session keeps state() in its
+    snapshots and WAL and hands it back to load_state() on a restore.
+    """
+
+    rng_for = staticmethod(_module_random)
+
+    def __init__(self, fallback=6, min_games=5):
+        self.fallback = int(fallback)
+        self.min_games = int(min_games)
+        self.game_key = None  # A bot plays one game at a time
+        self.target = self.fallback
+
+    def decide(self, session, game):
+        if game.key != self.game_key:
+            self.game_key = game.key
+            turns = session.take_turns
+            if sum(turns.values()) >= self.min_games:
+                self.target = self.rng_for(game).choices(list(turns), weights=list(turns.values()))[0]
+            else:
+                self.target = self.fallback
+        return 'take' if game.turn_number + 1 >= self.target else 'pass'
+
+    def state(self):
+        return {'g': self.game_key, 'target': self.target}
+
+    def load_state(self, state):
+        self.game_key = state['g']
+        self.target = state['target']
+
+
+# Strategy name -> bot class; the class's constructor takes the spec's parameters
+STRATEGIES = {
+    'fixed': FixedTurnBot,
+    'random': ProbabilisticBot,
+    'mimic': MimicBot,
+}
+
+
+def make_bot(spec):
+    """
+    Builds a bot from a spec such as 'mimic', 'fixed:6' or 'random:0.2'
+    (the strategy name, then its parameters separated by colons).
+    """
+    name, *params = spec.split(':')
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown bot strategy '{name}'. Known: {', '.join(STRATEGIES)}")
+    return STRATEGIES[name](*params)
@@ -0,0 +1,203 @@
+import glob, json, os, threading, time
+
+
+def _write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Checkpointer:
+    """
+    Crash-safe persistence for one session: periodic snapshots plus a write-ahead log.
+
+    Every state change (join, tournament start, round start, move) is appended to the
+    WAL as one JSON line and flushed to the OS, so a crashed process loses nothing.
+    Every `every` records or `interval` seconds the session writes a full snapshot
+    (atomically: tmp file, fsync, rename) and starts a new WAL generation; once the
+    snapshot is on disk, the older generations are deleted. A restore loads the snapshot
+    and replays every generation from the snapshot's on, in order. That is normally just
+    the one, but a crash between starting a generation and renaming its snapshot into
+    place leaves the old snapshot with records in the new generation too.
+
+    When the tournament ends, archive() writes a final snapshot and moves the files to
+    <dir>/archive/, so finished sessions are kept but not restored at the next startup.
+
+    Files: <dir>/<code>.snap.json and <dir>/<code>.wal.<generation>
+    """
+
+    def __init__(self, directory, code, every=500, interval=30.0, generation=0, seq=0):
+        self.directory = directory
+        self.code = code
+        self.every = every
+        self.interval = interval
+        self.lock = threading.RLock()  # Session holds it across a change and its record (see session._atomic)
+        self.snapshot_lock = threading.Lock()  # One snapshot (or the archive) at a time
+        self.archived = False
+        self.generation = generation
+        self.seq = seq  # Number of the last record written
+        self.since_snapshot = 0
+        self.last_snapshot_at = time.monotonic()
+        self.snapshot_pending = False
+        os.makedirs(directory, exist_ok=True)
+        self._wal = open(self.wal_path(generation), 'a')
+
+        self.records = 0
+        self.append_seconds = 0.0
+        self.max_append_seconds = 0.0
+        self.snapshots = 0
+        self.last_snapshot_ms = 0.0
+        self.last_snapshot_bytes = 0
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, f"{self.code}.snap.json")
+
+    def wal_path(self, generation):
+        return os.path.join(self.directory, f"{self.code}.wal.{generation}")
+
+    def log(self, record):
+        """
+        Appends one record to the WAL. Returns True when a snapshot is due.
+        """
+        start = time.perf_counter()
+        with self.lock:
+            if self.archived:
+                return False
+            self.seq += 1
+            record['q'] = self.seq
+            self._wal.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._wal.flush()
+            self.since_snapshot += 1
+            due = not self.snapshot_pending and (
+                self.since_snapshot >= self.every or time.monotonic() - self.last_snapshot_at >= self.interval)
+            if due:
+                self.snapshot_pending = True  # Only one snapshot is scheduled at a time
+        elapsed = time.perf_counter() - start
+        self.records += 1
+        self.append_seconds += elapsed
+        self.max_append_seconds = max(self.max_append_seconds, elapsed)
+        return due
+
+    def write_snapshot(self, capture):
+        """
+        Writes a snapshot of capture() and rotates the WAL. capture() is called with the
+        WAL lock held, so no record can fall between the snapshot and the new generation;
+        it must only copy state (the file is written after the lock is released).
+        """
+        with self.snapshot_lock:
+            if not self.archived:
+                self._write_snapshot(capture)
+
+    def _write_snapshot(self, capture):
+        start = time.perf_counter()
+        with self.lock:
+            state = capture()
+            self.generation += 1
+            state['checkpoint'] = {'seq': self.seq, 'generation': self.generation}
+            self._wal.close()
+            self._wal = open(self.wal_path(self.generation), 'a')
+            self.since_snapshot = 0
+            self.last_snapshot_at = time.monotonic()
+        text = json.dumps(state, separators=(',', ':'))
+        _write_atomic(self.snapshot_path, text)
+        # The snapshot covers everything in older generations
+        for generation, path in wal_generations(self.directory, self.code):
+            if generation < self.generation:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        self.snapshots += 1
+        self.last_snapshot_bytes = len(text)
+        self.last_snapshot_ms = (time.perf_counter() - start) * 1000
+        self.snapshot_pending = False
+
+    def archive(self, capture):
+        """
+        Writes a final snapshot of capture() and moves the session's snapshot and WAL to
+        <dir>/archive/<code>_<time stamp>.*. Records logged after this are dropped.
+        """
+        with self.snapshot_lock:
+            if self.archived:
+                return
+            self._write_snapshot(capture)
+            with self.lock:
+                self.archived = True
+                self._wal.close()
+            archive_dir = os.path.join(self.directory, 'archive')
+            os.makedirs(archive_dir, exist_ok=True)
+            prefix = os.path.join(archive_dir, f"{self.code}_{time.strftime('%Y%m%d_%H%M%S')}")
+            os.replace(self.snapshot_path, prefix + '.snap.json')
+            for path in glob.glob(os.path.join(self.directory, f"{glob.escape(self.code)}.wal.*")):
+                os.replace(path, prefix + path[len(os.path.join(self.directory, self.code)):])
+
+    def close(self):
+        with self.lock:
+            self._wal.close()
+
+    def stats(self):
+        return {
+            'wal_records': self.records,
+            'append_us_mean': round(self.append_seconds / self.records * 1e6, 1) if self.records else 0.0,
+            'append_us_max': round(self.max_append_seconds * 1e6, 1),
+            'snapshots': self.snapshots,
+            'last_snapshot_ms': round(self.last_snapshot_ms, 2),
+            'last_snapshot_bytes': self.last_snapshot_bytes,
+        }
+
+    @classmethod
+    def load(cls, directory, code):
+        """
+        Returns (snapshot or None, WAL records after it, latest generation, last seq) for a
+        session. A torn final line in a WAL file (crash mid-write) is ignored.
+        """
+        snapshot, generation, seq = None, 0, 0
+        path = os.path.join(directory, f"{code}.snap.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                snapshot = json.load(f)
+            generation = snapshot['checkpoint']['generation']
+            seq = snapshot['checkpoint']['seq']
+        records = []
+        for wal_generation, wal in wal_generations(directory, code):
+            if wal_generation < generation:
+                continue  # Covered by the snapshot
+            generation = wal_generation  # Appends continue in the latest generation
+            with open(wal) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record['q'] > seq:
+                        records.append(record)
+                        seq = record['q']
+        return snapshot, records, generation, seq
+
+
+def wal_generations(directory, code):
+    """
+    (generation, path) of each of a session's WAL files in directory, oldest first.
+    """
+    found = []
+    for path in glob.glob(os.path.join(directory, f"{glob.escape(code)}.wal.*")):
+        suffix = path.rsplit('.wal.', 1)[1]
+        if suffix.isdigit():
+            found.append((int(suffix), path))
+    return sorted(found)
+
+
+def saved_sessions(directory):
+    """
+    Codes of the sessions that have a snapshot or WAL in directory.
+    """
+    codes = set()
+    for path in glob.glob(os.path.join(directory, '*.snap.json')):
+        codes.add(os.path.basename(path)[:-len('.snap.json')])
+    for path in glob.glob(os.path.join(directory, '*.wal.*')):
+        codes.add(os.path.basename(path).rsplit('.wal.', 1)[0])
+    return sorted(codes)
@@ -0,0 +1,150 @@
+import threading
+
+from protocol import EMITS
+
+
+class CommanderFeed:
+    """
+    Coalesced roster updates for the commander dashboard.
+    Joins, leaves, score changes and status changes are buffered and sent as one
+    'players_delta' frame per tick; a full 'players_snapshot' is only sent when a
+    commander joins. Players are addressed by small integer ids to keep frames short.
+
+    Delta frame:    {'j': [[id, label], ...], 'l': [id, ...], 's': [[id, score], ...], 'st': [[id, status], ...]}
+    Snapshot frame: {'p': [[id, label, score, status], ...]}
+    Status is 'w' (waiting) or 'g' (in a game).
+
+    With several worker processes, pass id_for (e.g. the state store's player_number) so
+    every worker uses the same id for a player; score and status changes are then sent
+    even for players connected to another worker.
+    """
+
+    def __init__(self, socketio, room='commander', tick=0.25, namespace='/', id_for=None):
+        self.socketio = socketio
+        self.room = room
+        self.tick = tick
+        self.namespace = namespace
+        self.id_for = id_for
+        self.lock = threading.Lock()
+        self.ids = {}  # sid -> small integer id
+        self.roster = {}  # id -> [label, score, status] for connected players
+        self.seen = set()  # ids whose join has already been sent
+        self.joined = {}  # id -> label, pending
+        self.left = set()  # pending
+        self.scores = {}  # id -> score, pending
+        self.statuses = {}  # id -> status, pending
+        self.started = False
+
+    def _id(self, sid):
+        pid = self.ids.get(sid)
+        if pid is None:
+            pid = self.ids[sid] = self.id_for(sid) if self.id_for else len(self.ids)
+        return pid
+
+    def id_of(self, sid):
+        """
+        The id a player is addressed by in the frames (None if they never joined the feed).
+        """
+        with self.lock:
+            return self._id(sid) if self.id_for else self.ids.get(sid)
+
+    def _tracked(self, sid):
+        """
+        Returns the id to report changes under, or None if sid is not on the roster.
+        """
+        if self.id_for:
+            return self._id(sid)
+        pid = self.ids.get(sid)
+        return pid if pid in self.roster else None
+
+    def start(self):
+        """
+        Starts the tick loop (once).
+        """
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        self.socketio.start_background_task(self._run)
+
+    def join(self, sid, label, score=0, status='w'):
+        with self.lock:
+            pid = self._id(sid)
+            self.roster[pid] = [label, score, status]
+            self.left.discard(pid)
+            self.joined[pid] = label
+            self.scores[pid] = score
+            self.statuses[pid] = status
+
+    def leave(self, sid):
+        with self.lock:
+            pid = self.ids.get(sid)
+            if pid is None or pid not in self.roster:
+                return
+            del self.roster[pid]
+            self.joined.pop(pid, None)
+            self.scores.pop(pid, None)
+            self.statuses.pop(pid, None)
+            if pid in self.seen:
+                self.left.add(pid)  # Only report leaves for joins the commander has been sent
+
+    def score(self, sid, total_score):
+        with self.lock:
+            pid = self._tracked(sid)
+            if pid is None:
+                return
+            if pid in self.roster:
+                self.roster[pid][1] = total_score
+            self.scores[pid] = total_score
+
+    def status(self, sid, status):
+        with self.lock:
+            pid = self._tracked(sid)
+            if pid is None:
+                return
+            if pid in self.roster:
+                if self.roster[pid][2] == status:
+                    return
+                self.roster[pid][2] = status
+            self.statuses[pid] = status
+
+    def snapshot(self, to, roster=None):
+        """
+        Sends the full roster to one commander (usually request.sid).
+        roster, if given, is a list of (sid, label, score, status) for every player in the
+        session (from the shared state store); otherwise this process's roster is sent.
+        """
+        with self.lock:
+            if roster is not None:
+                frame = {'p': [[self._id(sid), label, score, status] for sid, label, score, status in roster]}
+            else:
+                frame = {'p': [[pid, label, score, status] for pid, (label, score, status) in self.roster.items()]}
+        EMITS.inc()
+        self.socketio.emit('players_snapshot', frame, room=to, namespace=self.namespace)
+
+    def flush(self):
+        """
+        Emits everything that changed since the last flush as one delta frame.
+        """
+        with self.lock:
+            if not (self.joined or self.left or self.scores or self.statuses):
+                return
+            frame = {}
+            if self.joined:
+                frame['j'] = [[pid, label] for pid, label in self.joined.items()]
+            if self.left:
+                frame['l'] = list(self.left)
+            if self.scores:
+                frame['s'] = [[pid, score] for pid, score in self.scores.items()]
+            if self.statuses:
+                frame['st'] = [[pid, status] for pid, status in self.statuses.items()]
+            self.seen.update(self.joined)
+            self.seen.difference_update(self.left)
+            self.joined, self.left, self.scores, self.statuses = {}, set(), {}, {}
+        EMITS.inc()
+        self.socketio.emit('players_delta', frame, room=self.room, namespace=self.namespace)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.tick)
+            self.flush()
@@ -0,0 +1,268 @@
+"""
+Compact binary game-record archive (.cgr) and a converter for the old text session logs.
+
+Layout (all integers little-endian):
+  file header   32 bytes  magic 'CGRB', version, record count, index offset, tables offset
+  records       8-byte header (p1 id, p2 id, session id, move count) + moves packed 2 bits each
+  index         one uint32 file offset per record, so any record can be read with one seek
+  tables        player sids and source session names, addressed by the integer ids above
+"""
+import argparse, mmap, os, re, struct
+from array import array
+
+MAGIC = b'CGRB'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sHHIQQ4x')
+RECORD_HEADER = struct.Struct('<HHHH')
+MAX_ID = 0xFFFF
+
+# 2-bit move codes
+PASS, PASS_EVENT, TAKE, PASS_UNKNOWN = 0, 1, 2, 3
+SYMBOL_TO_CODE = {'0': PASS, '2': PASS_EVENT, 'x': TAKE, 'P': PASS_UNKNOWN, 'T': TAKE}
+CODE_TO_SYMBOL = '02xP'
+
+# byte -> the four move codes packed in it, lowest bits first
+_UNPACK = [bytes(((b >> shift) & 3) for shift in (0, 2, 4, 6)) for b in range(256)]
+
+
+def pack_moves(codes):
+    """
+    Packs a sequence of 2-bit move codes into bytes, four moves per byte.
+    """
+    packed = bytearray((len(codes) + 3) // 4)
+    for i, code in enumerate(codes):
+        packed[i >> 2] |= code << ((i & 3) * 2)
+    return bytes(packed)
+
+
+def unpack_moves(packed, n_moves):
+    """
+    Returns the move codes stored in packed as a bytes object of length n_moves.
+    """
+    return b''.join(_UNPACK[b] for b in packed)[:n_moves]
+
+
+def encode_moves(moves):
+    """
+    Converts a move string such as '002x' (or 'P,P,T') into move codes.
+    """
+    return bytes(SYMBOL_TO_CODE[c] for c in moves if c in SYMBOL_TO_CODE)
+
+
+def decode_moves(codes):
+    """
+    Converts move codes back into the session-log move string.
+    """
+    return ''.join(CODE_TO_SYMBOL[c] for c in codes)
+
+
+def _write_string_table(f, strings):
+    f.write(struct.pack('<I', len(strings)))
+    for s in strings:
+        data = s.encode('utf-8')
+        f.write(struct.pack('<H', len(data)))
+        f.write(data)
+
+
+def _read_string_table(buf, offset):
+    (count,) = struct.unpack_from('<I', buf, offset)
+    offset += 4
+    strings = []
+    for _ in range(count):
+        (length,) = struct.unpack_from('<H', buf, offset)
+        offset += 2
+        strings.append(bytes(buf[offset:offset + length]).decode('utf-8'))
+        offset += length
+    return strings, offset
+
+
+class GameRecordWriter:
+    """
+    Writes games to a .cgr archive. Player sids and session names are interned
+    to integer ids; the index and tables are written on close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'wb')
+        self.f.write(FILE_HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+        self.offsets = array('I')
+        self.player_ids = {}  # sid -> int id
+        self.session_ids = {}  # session name -> int id
+
+    def player_id(self, sid):
+        if sid not in self.player_ids:
+            if len(self.player_ids) >= MAX_ID:
+                raise ValueError("Too many players for one archive")
+            self.player_ids[sid] = len(self.player_ids)
+        return self.player_ids[sid]
+
+    def session_id(self, name):
+        if name not in self.session_ids:
+            if len(self.session_ids) >= MAX_ID:
+                raise ValueError("Too many sessions for one archive")
+            self.session_ids[name] = len(self.session_ids)
+        return self.session_ids[name]
+
+    def add(self, p1_sid, p2_sid, moves, session=''):
+        """
+        Appends one game. moves is a move string ('00x') or a bytes object of move codes.
+        """
+        codes = moves if isinstance(moves, (bytes, bytearray)) else encode_moves(moves)
+        if len(codes) > MAX_ID:
+            raise ValueError("Game has too many moves for the record format")
+        offset = self.f.tell()
+        if offset > 0xFFFFFFFF:
+            raise ValueError("Archive is full; start a new one")
+        self.offsets.append(offset)
+        self.f.write(RECORD_HEADER.pack(self.player_id(p1_sid), self.player_id(p2_sid),
+                                        self.session_id(session), len(codes)))
+        self.f.write(pack_moves(codes))
+
+    def close(self):
+        if self.f.closed:
+            return
+        index_offset = self.f.tell()
+        self.f.write(self.offsets.tobytes())
+        tables_offset = self.f.tell()
+        _write_string_table(self.f, sorted(self.player_ids, key=self.player_ids.get))
+        _write_string_table(self.f, sorted(self.session_ids, key=self.session_ids.get))
+        self.f.seek(0)
+        self.f.write(FILE_HEADER.pack(MAGIC, VERSION, 0, len(self.offsets), index_offset, tables_offset))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GameRecordReader:
+    """
+    Memory-maps a .cgr archive for random access to games by index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, index_offset, tables_offset = FILE_HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a game record archive")
+        if version != VERSION:
+            raise ValueError(f"Unsupported game record version {version}")
+        self.offsets = array('I')
+        self.offsets.frombytes(self.buf[index_offset:index_offset + count * self.offsets.itemsize])
+        self.players, offset = _read_string_table(self.buf, tables_offset)
+        self.sessions, _ = _read_string_table(self.buf, offset)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def record(self, i):
+        """
+        Returns (p1_id, p2_id, session_id, move_codes) for game i.
+        """
+        offset = self.offsets[i]
+        p1, p2, session, n_moves = RECORD_HEADER.unpack_from(self.buf, offset)
+        start = offset + RECORD_HEADER.size
+        return p1, p2, session, unpack_moves(self.buf[start:start + (n_moves + 3) // 4], n_moves)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def columns(self):
+        """
+        Loads the whole archive as parallel integer arrays:
+        p1, p2, session, n_moves, take_turn (1-based, 0 if nobody took) and events ('2' passes).
+        """
+        cols = {name: array('I') for name in ('p1', 'p2', 'session', 'n_moves', 'take_turn', 'events')}
+        for p1, p2, session, codes in self:
+            cols['p1'].append(p1)
+            cols['p2'].append(p2)
+            cols['session'].append(session)
+            cols['n_moves'].append(len(codes))
+            cols['take_turn'].append(codes.find(TAKE) + 1)
+            cols['events'].append(codes.count(PASS_EVENT))
+        return cols
+
+    def close(self):
+        self.buf.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Text log conversion ---
+
+# app_gemini.py format: "Game ID: ab12, P1_SID: ..., P2_SID: ..., Moves: [P,P,T], ..."
+_GEMINI_LINE = re.compile(r'P1_SID: ([^,]+), P2_SID: ([^,]+), Moves: \[([^\]]*)\]')
+
+
+def parse_session_line(line):
+    """
+    Parses one session log line from either server into (p1_sid, p2_sid, moves).
+    Returns None for lines that are not game records.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    match = _GEMINI_LINE.search(line)
+    if match:
+        return match.group(1), match.group(2), match.group(3)
+    # app.py format: "sid1:sid2|00x"
+    players_part, sep, moves = line.partition('|')
+    sid1, colon, sid2 = players_part.partition(':')
+    if not sep or not colon:
+        return None
+    return sid1, sid2, moves
+
+
+def convert_text_logs(paths, out_path):
+    """
+    Converts one or more text session logs into a single .cgr archive.
+    Returns the number of games written.
+    """
+    count = 0
+    with GameRecordWriter(out_path) as writer:
+        for path in paths:
+            session = os.path.basename(path)
+            with open(path, 'r') as f:
+                for line in f:
+                    parsed = parse_session_line(line)
+                    if parsed is None:
+                        continue
+                    writer.add(*parsed, session=session)
+                    count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and inspect binary game-record archives.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('convert', help="convert text session logs to a .cgr archive")
+    convert.add_argument('output')
+    convert.add_argument('logs', nargs='+')
+    info = sub.add_parser('info', help="summarize a .cgr archive")
+    info.add_argument('archive')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        count = convert_text_logs(args.logs, args.output)
+        text_size = sum(os.path.getsize(p) for p in args.logs)
+        binary_size = os.path.getsize(args.output)
+        print(f"Converted {count} games: {text_size} bytes -> {binary_size} bytes "
+              f"({binary_size / max(text_size, 1):.1%})")
+    else:
+        with GameRecordReader(args.archive) as reader:
+            print(f"{len(reader)} games, {len(reader.players)} players, {len(reader.sessions)} sessions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import threading
+
+UI_SYMBOLS = str.maketrans({'0': '🟩', '2': '🟩', 'x': '🟥'})
+
+
+def strip_game_log(game_log):
+    """
+    Parses the game_log string to return the number of moves made.
+    Game log format: "game_id:move1|move2|...|moveN"
+    """
+    try:
+        parts = game_log.split(':', 1) # Split only on the first colon
+        if len(parts) < 2: # No moves yet, just the game_id
+            return 0
+        moves_str = parts[1]
+        return len(moves_str.split('|')) if moves_str else 0
+    except ValueError:
+        return 0
+
+
+class GameState:
+    """
+    State of one game shared by both players.
+    Moves are kept as a compact byte array of move symbols ('0', '2' or 'x');
+    the legacy "game_id:m1|m2|..." log string is only built when it is needed.
+    Each game has its own lock, so moves in different games never contend.
+    """
+    __slots__ = ('game_id', 'p1_sid', 'p2_sid', 'round', 'turn_number', 'moves', 'current_payoff', 'lock')
+
+    def __init__(self, game_id, p1_sid, p2_sid, round=1, current_payoff=None):
+        self.game_id = game_id
+        self.p1_sid = p1_sid
+        self.p2_sid = p2_sid
+        self.round = round
+        self.turn_number = 0  # Number of moves made so far
+        self.moves = bytearray()
+        self.current_payoff = current_payoff  # (p1, p2) payoff if the pot is taken now
+        self.lock = threading.Lock()
+
+    def add_move(self, symbol):
+        """
+        Records a move symbol and returns the new turn number.
+        """
+        self.moves.append(ord(symbol))
+        self.turn_number += 1
+        return self.turn_number
+
+    def is_over(self):
+        return bool(self.moves) and self.moves[-1] == ord('x')
+
+    def player_num(self, sid):
+        return 'p1' if sid == self.p1_sid else 'p2'
+
+    def opponent_of(self, sid):
+        return self.p2_sid if sid == self.p1_sid else self.p1_sid
+
+    def moves_str(self):
+        """
+        Returns the moves as a plain string, e.g. '002x'.
+        """
+        return self.moves.decode('ascii')
+
+    def ui_log(self):
+        """
+        Returns the moves rendered with emojis for the player UI.
+        """
+        return self.moves_str().translate(UI_SYMBOLS)
+
+    def legacy_log(self):
+        """
+        Returns the old "game_id:m1|m2|...|mN" game log string.
+        """
+        return f"{self.game_id}:{'|'.join(self.moves_str())}"
+
+    @property
+    def key(self):
+        """
+        Store key for this game. Perfect stranger matching never pairs the same two
+        players twice, so the full sid pair is unique within a session.
+        """
+        return f"{self.p1_sid}:{self.p2_sid}"
+
+    def to_dict(self):
+        return {
+            'game_id': self.game_id,
+            'p1_sid': self.p1_sid,
+            'p2_sid': self.p2_sid,
+            'round': self.round,
+            'moves': self.moves_str(),
+            'current_payoff': list(self.current_payoff) if self.current_payoff else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        game = cls(data['game_id'], data['p1_sid'], data['p2_sid'], round=data['round'],
+                   current_payoff=tuple(data['current_payoff']) if data['current_payoff'] else None)
+        game.moves = bytearray(data['moves'], 'ascii')
+        game.turn_number = len(game.moves)
+        return game
@@ -0,0 +1,272 @@
+"""
+Headless load test: N Socket.IO bot players run the full flow against a local server.
+Each bot joins, waits for its game to start, and on its turn takes the pot with
+probability --take (otherwise passes). A commander client starts the session as soon
+as every bot has joined and collects the server's round_stats.
+
+    python load_test.py --server app.py --players 100 --take 0.2
+    python load_test.py --server app_gemini.py --players 200 --duration 30
+    python load_test.py --url http://127.0.0.1:5001 --pid 12345 --players 50
+
+Reports join latency (join -> welcome message), move round trip (move -> the mover's
+next state frame) as p50/p95/p99, round durations (app.py), and the server process's
+CPU and peak memory. Bots speak protocol v2 (the default SOCKET_PROTOCOL).
+"""
+import argparse, os, random, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio
+
+try:
+    import psutil
+except ImportError:  # Falls back to /proc on Linux
+    psutil = None
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+class Bot:
+    """
+    One simulated player. Latencies are appended to the shared results under results.lock.
+    """
+
+    def __init__(self, name, url, take_probability, results, session=None):
+        self.name = name
+        self.session = session
+        self.url = url
+        self.take_probability = take_probability
+        self.results = results
+        self.join_sent = None
+        self.move_sent = None
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('message', self.on_message)
+        self.client.on('state', self.on_state)
+
+    def connect_and_join(self):
+        self.client.connect(self.url, transports=['websocket'])
+        self.join_sent = time.perf_counter()
+        self.client.emit('join', {'name': self.name, 'session': self.session} if self.session else {'name': self.name})
+
+    def on_message(self, data):
+        now = time.perf_counter()
+        if self.join_sent is not None:
+            self.results.add('join', now - self.join_sent)
+            self.join_sent = None
+        if 'All rounds complete' in data.get('msg', ''):
+            self.results.done.set()
+
+    def on_state(self, frame):
+        now = time.perf_counter()
+        if self.move_sent is not None:
+            self.results.add('move', now - self.move_sent)
+            self.move_sent = None
+        if frame['k'] in 'su' and frame['t']:
+            move = 'take' if random.random() < self.take_probability else 'pass'
+            self.move_sent = time.perf_counter()
+            self.client.emit('move', {'move': move})
+
+    def close(self):
+        self.client.disconnect()
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {'join': [], 'move': []}
+        self.rounds = []  # round_stats frames from the server
+        self.done = threading.Event()
+
+    def add(self, kind, seconds):
+        with self.lock:
+            self.samples[kind].append(seconds)
+
+    def summary(self, kind):
+        with self.lock:
+            values = sorted(self.samples[kind])
+        return {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+        }
+
+
+class ProcessSampler:
+    """
+    Samples a process's CPU time and resident memory once per interval in a thread.
+    """
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.cpu_start = None
+        self.cpu_end = None
+        self.wall_start = None
+        self.wall_end = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read(self):
+        if psutil is not None:
+            process = psutil.Process(self.pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss / 2**20
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        rss = int(fields[21]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+        return cpu, rss
+
+    def start(self):
+        self.cpu_start, _ = self._read()
+        self.wall_start = time.perf_counter()
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.cpu_end, rss = self._read()
+            except (OSError, ValueError):
+                return  # Process exited
+            self.wall_end = time.perf_counter()
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        if self.cpu_end is None:
+            return {'cpu_percent': 0.0, 'peak_rss_mb': 0.0}
+        return {
+            'cpu_percent': round(100 * (self.cpu_end - self.cpu_start) / (self.wall_end - self.wall_start), 1),
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+        }
+
+
+def start_server(script, port, extra_env=None, timeout=15):
+    """
+    Starts script (app.py or app_gemini.py) on port and waits until it accepts connections.
+    Returns the Popen, or None if it did not come up.
+    """
+    # CHECKPOINT_DIR='': load-test sessions must not land in (or be restored from) the real checkpoints
+    env = dict(os.environ, SERVER_PORT=str(port), ALLOW_UNSAFE_WERKZEUG='1', CHECKPOINT_DIR='')
+    env.update(extra_env or {})
+    server = subprocess.Popen([sys.executable, script], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        client = socketio.Client(reconnection=False)
+        try:
+            client.connect(f"http://127.0.0.1:{port}", wait_timeout=1)
+            client.disconnect()
+            return server
+        except socketio.exceptions.ConnectionError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.terminate()
+    server.wait()
+    return None
+
+
+def run_load_test(url, n_players, take_probability, duration, pid=None, connect_workers=20, session=None):
+    """
+    Runs one load test and returns a dict of results.
+    Stops when the tournament finishes (app.py) or after duration seconds, whichever is first.
+    session is an app.py session code; the commander creates it if needed.
+    """
+    results = Results()
+    sampler = ProcessSampler(pid) if pid else None
+    if sampler:
+        sampler.start()
+
+    commander = socketio.Client(reconnection=False)
+    commander.on('round_stats', lambda stats: results.rounds.append(stats))
+    commander.connect(url, transports=['websocket'])
+    if session:
+        commander.call('commander_join', {'session': session})  # Creates the session before bots join it
+    else:
+        commander.emit('commander_join')
+
+    bots = [Bot(f"bot{i}", url, take_probability, results, session) for i in range(n_players)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(connect_workers) as pool:
+        list(pool.map(Bot.connect_and_join, bots))
+    deadline = time.monotonic() + 30
+    while results.summary('join')['count'] < n_players and time.monotonic() < deadline:
+        time.sleep(0.05)
+    connect_seconds = time.perf_counter() - start
+
+    commander.emit('commander_start')
+    play_start = time.perf_counter()
+    results.done.wait(duration)
+    play_seconds = time.perf_counter() - play_start
+
+    report = {
+        'players': n_players,
+        'connections_per_s': round(n_players / connect_seconds, 1),
+        'join': results.summary('join'),
+        'move': results.summary('move'),
+        'moves_per_s': round(results.summary('move')['count'] / play_seconds, 1),
+        'rounds': [{'round': r['round'], 'duration_s': r['duration_s'], 'tail_latency_s': r['tail_latency_s']}
+                   for r in results.rounds],
+        'play_s': round(play_seconds, 2),
+    }
+    if sampler:
+        report['server'] = sampler.stop()
+    for bot in bots:
+        bot.close()
+    commander.disconnect()
+    return report
+
+
+def print_report(report):
+    print(f"{report['players']} players, {report['connections_per_s']} connections/s, "
+          f"{report['moves_per_s']} moves/s over {report['play_s']}s")
+    for kind in ('join', 'move'):
+        s = report[kind]
+        label = 'join latency' if kind == 'join' else 'move round trip'
+        print(f"  {label:>16}: n={s['count']} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms")
+    for r in report['rounds']:
+        print(f"  round {r['round']}: {r['duration_s']}s (tail +{r['tail_latency_s']}s)")
+    if 'server' in report:
+        print(f"  server: {report['server']['cpu_percent']}% CPU, peak RSS {report['server']['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a local game server with simulated Socket.IO players.")
+    parser.add_argument('--server', default='app.py', help="server script to start (ignored with --url)")
+    parser.add_argument('--url', help="use an already running server instead of starting one")
+    parser.add_argument('--pid', type=int, help="server process id to sample with --url")
+    parser.add_argument('--port', type=int, default=5101)
+    parser.add_argument('--players', type=int, default=50)
+    parser.add_argument('--take', type=float, default=0.2, help="probability a bot takes the pot on its turn")
+    parser.add_argument('--duration', type=float, default=60, help="max seconds of play")
+    parser.add_argument('--seed', type=int, help="seed for the bots' choices")
+    parser.add_argument('--session', help="app.py session code to join (default: the server's default session)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    server = None
+    url, pid = args.url, args.pid
+    if url is None:
+        server = start_server(args.server, args.port)
+        if server is None:
+            sys.exit(f"{args.server} did not start on port {args.port}")
+        url, pid = f"http://127.0.0.1:{args.port}", server.pid
+    try:
+        print_report(run_load_test(url, args.players, args.take, args.duration, pid=pid, session=args.session))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import os, queue, threading, time
+
+import metrics
+
+LOG_WRITE_SECONDS = metrics.histogram('log_write_seconds', "Time to write one batch of log lines to disk")
+LOG_LINES = metrics.counter('log_lines_total', "Log lines written to disk")
+LOG_WRITE_ERRORS = metrics.counter('log_write_errors_total', "Log lines dropped because their file could not be written")
+
+
+class LogPipeline:
+    """
+    Write-behind logging for the session, name and score logs.
+    Handlers only enqueue lines; a background flusher batches them per file and
+    writes them every flush_interval seconds (or sooner once batch_size lines are queued).
+    The queue is bounded: if the flusher falls behind, writers wait instead of
+    growing memory without limit, and every such wait is counted in stats().
+    A file that cannot be written (full disk, permissions) loses that batch's lines,
+    which are counted as write errors; the flusher keeps running, so flush() and
+    close() still return.
+    """
+
+    def __init__(self, flush_interval=0.5, max_queue=10000, batch_size=500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.files = {}  # path -> open append handle, owned by the flusher
+        self.files_lock = threading.Lock()
+        self.closed = False
+
+        self.lines_written = 0
+        self.batches_written = 0
+        self.max_depth = 0
+        self.full_waits = 0
+        self.write_errors = 0
+        self.last_flush_ms = 0.0
+
+        metrics.gauge('log_queue_depth', "Log lines queued but not yet written", fn=self.queue.qsize)
+        metrics.gauge('log_full_waits', "Writes that waited because the log queue was full", fn=lambda: self.full_waits)
+
+        self.thread = threading.Thread(target=self._run, name='log-pipeline', daemon=True)
+        self.thread.start()
+
+    def write(self, path, text):
+        """
+        Queues text to be appended to the file at path.
+        """
+        if self.closed:
+            raise RuntimeError("LogPipeline is closed")
+        try:
+            self.queue.put_nowait((path, text))
+        except queue.Full:
+            self.full_waits += 1
+            self.queue.put((path, text))  # Backpressure: wait for the flusher to catch up
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def flush(self):
+        """
+        Blocks until every line queued so far has been written to disk.
+        """
+        self.queue.join()
+
+    def release(self, path):
+        """
+        Closes the flusher's handle for path so the file can be replaced on disk.
+        The next write to path reopens it.
+        """
+        with self.files_lock:
+            f = self.files.pop(path, None)
+            if f is not None:
+                f.close()
+
+    def close(self):
+        """
+        Durably flushes everything still queued (write + fsync) and stops the flusher.
+        """
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.queue.put(None)  # Wake the flusher so it can exit
+        self.thread.join()
+        with self.files_lock:
+            for f in self.files.values():
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+            self.files.clear()
+
+    def stats(self):
+        """
+        Returns queue-depth and throughput counters for monitoring.
+        """
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'max_queue': self.queue.maxsize,
+            'full_waits': self.full_waits,
+            'write_errors': self.write_errors,
+            'lines_written': self.lines_written,
+            'batches_written': self.batches_written,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+        }
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is None:
+                self.queue.task_done()
+                return
+
+            batch = [item]
+            # Give the batch a chance to fill up before touching the disk
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write_batch(batch)
+                    self.queue.task_done()
+                    return
+                batch.append(item)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        try:
+            start = time.perf_counter()
+            by_path = {}
+            for path, text in batch:
+                by_path.setdefault(path, []).append(text)
+            written = 0
+            with self.files_lock:
+                for path, texts in by_path.items():
+                    try:
+                        f = self.files.get(path)
+                        if f is None:
+                            f = self.files[path] = open(path, 'a')
+                        f.write(''.join(texts))
+                        f.flush()
+                        written += len(texts)
+                    except Exception as e:  # e.g. OSError (full disk, permissions) or an encoding error
+                        self.write_errors += len(texts)
+                        LOG_WRITE_ERRORS.inc(len(texts))
+                        print(f"Log write to {path} failed, {len(texts)} lines lost: {e!r}")
+                        f = self.files.pop(path, None)  # Reopen on the next write
+                        if f is not None:
+                            try:
+                                f.close()
+                            except OSError:
+                                pass
+            self.lines_written += written
+            self.batches_written += 1
+            elapsed = time.perf_counter() - start
+            self.last_flush_ms = elapsed * 1000
+            LOG_WRITE_SECONDS.observe(elapsed)
+            LOG_LINES.inc(written)
+        finally:
+            # Always: flush(), close() and ScoreLedger.compact() wait on queue.join()
+            for _ in batch:
+                self.queue.task_done()
@@ -0,0 +1,244 @@
+import threading, time
+
+
+def _bits(mask):
+    """
+    Yields the indices of the set bits in mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class MatchingEngine:
+    """
+    Perfect-stranger matchmaking over integer player ids.
+    Each player has a bitset of the opponents they have already played, so
+    "can these two meet?" is a single bit test. match() finds a maximum-cardinality
+    matching of the ready pool on the graph of pairs that have not played yet:
+    a greedy pass followed by Edmonds' blossom augmenting paths for whoever is left.
+    """
+
+    def __init__(self):
+        self.ids = {}  # sid -> player id
+        self.sids = []  # player id -> sid
+        self.played = []  # player id -> bitset of player ids already played
+
+        self.calls = 0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.total_ms = 0.0
+
+    def add_player(self, sid):
+        """
+        Registers a player (if new) and returns their integer id.
+        """
+        pid = self.ids.get(sid)
+        if pid is None:
+            pid = self.ids[sid] = len(self.sids)
+            self.sids.append(sid)
+            self.played.append(0)
+        return pid
+
+    def record_game(self, sid_a, sid_b):
+        """
+        Marks two players as having played each other.
+        """
+        a, b = self.add_player(sid_a), self.add_player(sid_b)
+        self.played[a] |= 1 << b
+        self.played[b] |= 1 << a
+
+    def has_played(self, sid_a, sid_b):
+        a, b = self.ids.get(sid_a), self.ids.get(sid_b)
+        if a is None or b is None:
+            return False
+        return bool(self.played[a] >> b & 1)
+
+    def has_played_all(self, sid, candidate_sids):
+        """
+        True if sid has already played every player in candidate_sids.
+        """
+        pid = self.add_player(sid)
+        mask = 0
+        for other in candidate_sids:
+            mask |= 1 << self.add_player(other)
+        mask &= ~(1 << pid)
+        return mask & ~self.played[pid] == 0
+
+    def match(self, ready_sids):
+        """
+        Pairs up as many of ready_sids as possible with opponents they have not played.
+        The order of ready_sids decides who is tried first, so callers shuffle it for fairness.
+        Returns a list of (sid, sid) pairs; nothing is recorded until record_game() is called.
+        """
+        start = time.perf_counter()
+        ready = [self.add_player(sid) for sid in ready_sids]
+        ready_mask = 0
+        for pid in ready:
+            ready_mask |= 1 << pid
+        adjacency = {pid: ready_mask & ~self.played[pid] & ~(1 << pid) for pid in ready}
+
+        mate = {pid: -1 for pid in ready}
+        # Greedy pass: most of the matching in one sweep
+        unmatched = ready_mask
+        for v in ready:
+            if mate[v] != -1:
+                continue
+            candidates = adjacency[v] & unmatched
+            if candidates:
+                u = (candidates & -candidates).bit_length() - 1
+                mate[v], mate[u] = u, v
+                unmatched &= ~((1 << v) | (1 << u))
+
+        # Augmenting paths for whoever the greedy pass left out
+        for v in ready:
+            if mate[v] == -1:
+                self._augment(v, ready, adjacency, mate)
+
+        pairs = []
+        for v in ready:
+            u = mate[v]
+            if u != -1 and v < u:
+                pairs.append((self.sids[v], self.sids[u]))
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.calls += 1
+        self.last_ms = elapsed_ms
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        return pairs
+
+    def _augment(self, root, ready, adjacency, mate):
+        """
+        Edmonds' blossom search for an augmenting path from root; flips it if found.
+        """
+        parent = {v: -1 for v in ready}
+        base = {v: v for v in ready}
+        used = {root}
+        queue = [root]
+
+        def lca(a, b):
+            seen = set()
+            while True:
+                a = base[a]
+                seen.add(a)
+                if mate[a] == -1:
+                    break
+                a = parent[mate[a]]
+            while True:
+                b = base[b]
+                if b in seen:
+                    return b
+                b = parent[mate[b]]
+
+        def mark_path(v, b, child, blossom):
+            while base[v] != b:
+                blossom.add(base[v])
+                blossom.add(base[mate[v]])
+                parent[v] = child
+                child = mate[v]
+                v = parent[mate[v]]
+
+        head = 0
+        while head < len(queue):
+            v = queue[head]
+            head += 1
+            for to in _bits(adjacency[v]):
+                if base[v] == base[to] or mate[v] == to:
+                    continue
+                if to == root or (mate[to] != -1 and parent[mate[to]] != -1):
+                    # Odd cycle: contract the blossom onto its base
+                    current_base = lca(v, to)
+                    blossom = set()
+                    mark_path(v, current_base, to, blossom)
+                    mark_path(to, current_base, v, blossom)
+                    for i in ready:
+                        if base[i] in blossom:
+                            base[i] = current_base
+                            if i not in used:
+                                used.add(i)
+                                queue.append(i)
+                elif parent[to] == -1:
+                    parent[to] = v
+                    if mate[to] == -1:
+                        # Found an augmenting path ending at 'to': flip it
+                        while to != -1:
+                            pv = parent[to]
+                            next_to = mate[pv]
+                            mate[to], mate[pv] = pv, to
+                            to = next_to
+                        return True
+                    used.add(mate[to])
+                    queue.append(mate[to])
+        return False
+
+    def stats(self):
+        """
+        Returns per-call matching latency in milliseconds.
+        """
+        return {
+            'calls': self.calls,
+            'last_ms': round(self.last_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+            'mean_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'players': len(self.sids),
+        }
+
+
+class ReadyPool:
+    """
+    Players waiting for a match, in arrival order, behind its own small lock.
+    Adding or removing a player never waits on a matching pass or on a game.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sids = {}  # Insertion-ordered set of sids
+
+    def add(self, sid):
+        """
+        Adds sid to the pool; returns False if it was already there.
+        """
+        with self.lock:
+            if sid in self.sids:
+                return False
+            self.sids[sid] = None
+            return True
+
+    def discard(self, sid):
+        with self.lock:
+            self.sids.pop(sid, None)
+
+    def take_pair(self, sid_a, sid_b):
+        """
+        Removes both players if both are still waiting; returns False (removing neither) if not.
+        """
+        with self.lock:
+            if sid_a not in self.sids or sid_b not in self.sids:
+                return False
+            del self.sids[sid_a], self.sids[sid_b]
+            return True
+
+    def remove_if(self, sids, is_stale):
+        """
+        Removes each of sids that is still waiting and for which is_stale(sid) is true when
+        checked under the pool's lock, so a player added back after the check is kept.
+        """
+        with self.lock:
+            for sid in sids:
+                if sid in self.sids and is_stale(sid):
+                    del self.sids[sid]
+
+    def snapshot(self):
+        """
+        Returns the waiting sids as a list.
+        """
+        with self.lock:
+            return list(self.sids)
+
+    def __contains__(self, sid):
+        return sid in self.sids
+
+    def __len__(self):
+        return len(self.sids)
@@ -0,0 +1,205 @@
+"""
+In-process metrics: counters, gauges and fixed-bucket histograms, rendered in the
+Prometheus text format for /metrics and as a compact dict for the commander panel.
+
+Updating a metric is one lock and an add (a histogram adds a bisect over its buckets),
+so the move path pays well under a microsecond per update. Values computed from
+existing state (pool sizes, active games) are gauges with a callback, so they cost
+nothing until they are scraped.
+
+    MOVES = metrics.counter('moves_total', "Moves handled")
+    MOVES.inc()
+    with MOVE_SECONDS.time():
+        ...
+"""
+import bisect, threading, time
+
+# Seconds; fine-grained below a millisecond for handlers, up to minutes for rounds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, '', self.value)]
+
+    def summary(self):
+        return self.value
+
+
+class Gauge:
+    """
+    A value that goes up and down. With fn, the value is fn() at scrape time.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def get(self):
+        return self.fn() if self.fn else self.value
+
+    def samples(self):
+        return [(self.name, '', self.get())]
+
+    def summary(self):
+        return self.get()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram:
+    """
+    Counts observations into fixed buckets (upper bounds, plus +Inf) and keeps their sum.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """
+        Context manager that observes the time spent in its block.
+        """
+        return _Timer(self)
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-th quantile (None if it is past the last bucket).
+        """
+        with self.lock:
+            counts, total = list(self.counts), self.count
+        target = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if total and seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else None
+        return 0.0
+
+    def samples(self):
+        with self.lock:
+            counts, total, sum_ = list(self.counts), self.count, self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            samples.append((f"{self.name}_bucket", f'{{le="{le}"}}', cumulative))
+        samples.append((f"{self.name}_sum", '', sum_))
+        samples.append((f"{self.name}_count", '', total))
+        return samples
+
+    def summary(self):
+        return {'n': self.count, 'mean': self.sum / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99)}
+
+
+class Registry:
+    """
+    Named metrics for one process. Asking for an existing name returns the same metric,
+    so modules can declare the metrics they update at import time.
+    """
+
+    def __init__(self, prefix='game_'):
+        self.prefix = prefix
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kwargs):
+        name = self.prefix + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help, fn=None):
+        gauge = self._get(Gauge, name, help)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Returns {name without prefix: value} (histograms as n/mean/p50/p95/p99) for the commander panel.
+        """
+        return {name[len(self.prefix):]: metric.summary() for name, metric in list(self.metrics.items())}
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,125 @@
+import json, threading
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the batch scoring API
+    np = None
+
+DEFAULT_MAX_TURNS = 64  # Tables grow on demand past this, so it only sizes the first build
+
+
+def linear_payoff(turn_number, p1_start=2, p2_start=1, increment=2):
+    """
+    Calculates the linear payoff for Player 1 and Player 2 based on the turn number.
+    Turn number is the number of moves made in the game.
+    """
+    if turn_number < 1:
+        return p1_start, p2_start
+    p1 = p1_start + ((turn_number - 1) // 2) * increment
+    p2 = p2_start + ((turn_number) // 2) * increment
+    return p1, p2
+
+def exponential_payoff(turn_number, p1_base=2, p2_base=1, growth_rate=1.5):
+    """
+    Calculates the exponential payoff for Player 1 and Player 2 based on the turn number.
+    """
+    if turn_number < 1:
+        return p1_base, p2_base
+    p1 = int(p1_base * (growth_rate ** ((turn_number - 1) // 2)))
+    p2 = int(p2_base * (growth_rate ** ((turn_number) // 2)))
+    return p1, p2
+
+# Schedule name -> payoff function(turn_number, **params)
+SCHEDULES = {
+    'linear': linear_payoff,
+    'exponential': exponential_payoff,
+}
+
+
+class PayoffTable:
+    """
+    Precomputed (p1, p2) payoffs indexed by turn number, so a move is an O(1) lookup.
+    Tables built from a schedule function extend themselves if a game runs past the
+    precomputed length; tables built from fixed arrays repeat their last entry.
+    One table is shared by every game thread: lookups inside the table take no lock,
+    growing it does.
+    """
+
+    def __init__(self, p1_payoffs, p2_payoffs, schedule=None, params=None):
+        if len(p1_payoffs) != len(p2_payoffs) or not p1_payoffs:
+            raise ValueError("Payoff arrays must be non-empty and the same length")
+        self.payoffs = [(int(a), int(b)) for a, b in zip(p1_payoffs, p2_payoffs)]
+        self.schedule = schedule
+        self.params = params or {}
+        self._arrays = None  # Cached NumPy copies for batch scoring
+        self._extend_lock = threading.Lock()
+
+    @classmethod
+    def from_schedule(cls, name='linear', max_turns=DEFAULT_MAX_TURNS, **params):
+        if name not in SCHEDULES:
+            raise ValueError(f"Unknown payoff schedule '{name}'. Known: {', '.join(SCHEDULES)}")
+        schedule = SCHEDULES[name]
+        pairs = [schedule(turn, **params) for turn in range(max_turns + 1)]
+        return cls([p[0] for p in pairs], [p[1] for p in pairs], schedule=schedule, params=params)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a table from a config dict such as
+        {"schedule": "exponential", "params": {"growth_rate": 2}, "max_turns": 40} or
+        {"schedule": "custom", "p1": [2, 2, 6, ...], "p2": [1, 3, 3, ...]}.
+        """
+        name = config.get('schedule', 'linear')
+        if name == 'custom':
+            return cls(config['p1'], config['p2'])
+        return cls.from_schedule(name, config.get('max_turns', DEFAULT_MAX_TURNS), **config.get('params', {}))
+
+    def _extend(self, turn_number):
+        with self._extend_lock:
+            # Checked again under the lock: another game may have grown the table meanwhile
+            while len(self.payoffs) <= turn_number:
+                self.payoffs.append(self.schedule(len(self.payoffs), **self.params))
+            self._arrays = None
+
+    def lookup(self, turn_number):
+        """
+        Returns the (p1, p2) payoff after turn_number moves.
+        """
+        if turn_number < 0:
+            turn_number = 0
+        if turn_number >= len(self.payoffs):
+            if self.schedule is None:
+                return self.payoffs[-1]
+            self._extend(turn_number)
+        return self.payoffs[turn_number]
+
+    __call__ = lookup
+
+    def score_games(self, turn_numbers):
+        """
+        Scores many games at once. turn_numbers is any array-like of final turn numbers
+        (e.g. the take turn of each logged game); returns (p1_scores, p2_scores) NumPy arrays.
+        """
+        if np is None:
+            raise ImportError("NumPy is required for batch scoring")
+        turns = np.asarray(turn_numbers, dtype=np.int64)
+        if turns.size and self.schedule is not None:
+            highest = int(turns.max())
+            if highest >= len(self.payoffs):
+                self._extend(highest)
+        if self._arrays is None:
+            table = np.array(self.payoffs, dtype=np.int64)
+            self._arrays = (table[:, 0], table[:, 1])
+        index = np.clip(turns, 0, len(self.payoffs) - 1)
+        return self._arrays[0][index], self._arrays[1][index]
+
+
+def load_payoff_table(config_path=None, schedule='linear'):
+    """
+    Loads the session's payoff table from a JSON config file if given,
+    otherwise builds it from the named schedule with default parameters.
+    """
+    if config_path:
+        with open(config_path, 'r') as f:
+            return PayoffTable.from_config(json.load(f))
+    return PayoffTable.from_schedule(schedule)
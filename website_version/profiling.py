@@ -0,0 +1,179 @@
+"""
+Runtime-toggleable profiling for the Socket.IO servers.
+
+install(socketio) wraps every @socketio.on handler and every start_background_task
+target with a timer. While profiling is off the wrapper is one attribute check and a
+call, so it can stay installed in production; the commander switches it on for a
+while when a session feels sluggish.
+
+With sampling on, a thread also samples every thread's stack every interval and
+counts them as collapsed stacks ("frame;frame;frame count" lines), which flamegraph.pl,
+speedscope and similar tools read directly. Under eventlet/gevent the sampler only
+sees the hub's OS thread, so use the handler timings (or ASYNC_MODE=threading) there.
+"""
+import functools, heapq, os, sys, threading, time
+
+SLOWEST_KEPT = 20  # Individual slowest calls kept for the report
+
+
+class Profiler:
+    """
+    Per-handler call counts, total and worst times, the slowest individual calls, and
+    (while sampling) collapsed stack samples.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+        self.sample_interval = 0.005
+        self.sampler = None
+        self.sampling = threading.Event()
+
+    def reset(self):
+        with self.lock:
+            self.handlers = {}  # name -> [calls, total seconds, max seconds]
+            self.slowest = []  # min-heap of (seconds, name, wall time) for the slowest calls
+            self.stacks = {}  # collapsed stack -> samples
+            self.started_at = time.time()
+
+    def wrap(self, name, fn):
+        """
+        Returns fn wrapped with a timer that only runs while profiling is enabled.
+        """
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return wrapper
+
+    def timed(self, fn):
+        """
+        Decorator form of wrap() for helpers, named after the function.
+        """
+        return self.wrap(fn.__name__, fn)
+
+    def record(self, name, seconds):
+        with self.lock:
+            stats = self.handlers.get(name)
+            if stats is None:
+                stats = self.handlers[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+            entry = (seconds, name, time.time())
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, entry)
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    # --- Control ---
+
+    def enable(self, sample=False, interval_ms=None):
+        if interval_ms:
+            self.sample_interval = max(float(interval_ms), 1.0) / 1000
+        self.enabled = True
+        if sample:
+            self.start_sampling()
+
+    def disable(self):
+        self.enabled = False
+        self.stop_sampling()
+
+    def start_sampling(self):
+        if self.sampling.is_set():
+            return
+        if self.sampler:
+            self.sampler.join()  # A sampler that was just stopped finishes its last sleep
+        self.sampling.set()
+        self.sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self.sampler.start()
+
+    def stop_sampling(self):
+        self.sampling.clear()
+
+    # --- Stack sampler ---
+
+    def _sample(self):
+        own = threading.get_ident()
+        while self.sampling.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                collapsed = ';'.join(reversed(stack))
+                with self.lock:
+                    self.stacks[collapsed] = self.stacks.get(collapsed, 0) + 1
+            time.sleep(self.sample_interval)
+
+    # --- Reports ---
+
+    def collapsed_stacks(self):
+        """
+        Returns the sampled stacks in the collapsed format, one "stack count" per line.
+        """
+        with self.lock:
+            items = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def report(self, top=10):
+        """
+        Returns the top handlers by total time and the slowest individual calls.
+        """
+        with self.lock:
+            handlers = [(name, calls, total, worst) for name, (calls, total, worst) in self.handlers.items()]
+            slowest = sorted(self.slowest, reverse=True)
+            samples = sum(self.stacks.values())
+        handlers.sort(key=lambda h: -h[2])
+        return {
+            'enabled': self.enabled,
+            'sampling': self.sampling.is_set(),
+            'since_s': round(time.time() - self.started_at, 1),
+            'samples': samples,
+            'handlers': [{'name': name, 'calls': calls, 'total_ms': round(total * 1000, 2),
+                          'mean_us': round(total / calls * 1e6, 1), 'max_ms': round(worst * 1000, 3)}
+                         for name, calls, total, worst in handlers[:top]],
+            'slowest': [{'name': name, 'ms': round(seconds * 1000, 3),
+                         'at': time.strftime('%H:%M:%S', time.localtime(at))}
+                        for seconds, name, at in slowest[:top]],
+        }
+
+
+profiler = Profiler()
+
+
+def install(socketio, profiler=profiler):
+    """
+    Makes socketio.on and socketio.start_background_task wrap what they are given.
+    Call it right after creating the SocketIO object, before any handler is registered.
+    """
+    register_handler = socketio.on
+    start_task = socketio.start_background_task
+
+    def on(message, namespace=None):
+        register = register_handler(message, namespace)
+
+        def decorator(handler):
+            register(profiler.wrap(f"on:{message}", handler))
+            return handler
+        return decorator
+
+    def start_background_task(target, *args, **kwargs):
+        name = getattr(target, '__name__', type(target).__name__)
+        return start_task(profiler.wrap(f"task:{name}", target), *args, **kwargs)
+
+    socketio.on = on
+    socketio.start_background_task = start_background_task
+    if os.environ.get('PROFILE') in ('1', 'sample'):
+        profiler.enable(sample=os.environ['PROFILE'] == 'sample')
+    return profiler
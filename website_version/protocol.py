@@ -0,0 +1,83 @@
+"""
+Socket.IO game protocol.
+
+v1 (legacy): separate 'start' / 'update' / 'game_over' frames plus a 'message' frame
+with the status text, and the move log pre-rendered as emojis.
+
+v2: one 'state' frame per player per state change, with short keys:
+  v   protocol version (2)
+  k   kind: 's' game start, 'u' move update, 'o' game over
+  ys  your (expected) score          os  opponent's (expected) score
+  m   raw moves so far, e.g. '02x'   t   1 if it is your turn
+  r   round number (start)           w   1 if you took the pot (game over)
+  ts  your total score (game over, optional)
+  a   what happens next after game over: 'r' next round, 'm' new match
+The client derives all status text and the emoji log from these fields.
+"""
+
+import metrics
+
+FRAME_EVENT = 'state'
+EMITS = metrics.counter('emits_total', "Socket.IO frames emitted (game frames and commander updates)")
+
+TURN_MSG = 'Your turn! Choose a move:'
+WAIT_MSG = 'Waiting for opponent...'
+AFTER_MSGS = {'r': 'Waiting for next round...', 'm': 'Game over. Searching for a new match...'}
+
+
+class Protocol:
+    """
+    Emits game frames to players in either protocol version.
+    """
+
+    def __init__(self, socketio, version=2, namespace='/'):
+        if version not in (1, 2):
+            raise ValueError(f"Unknown protocol version {version}")
+        self.socketio = socketio
+        self.version = version
+        self.namespace = namespace
+
+    def _emit(self, event, payload, sid):
+        EMITS.inc()
+        self.socketio.emit(event, payload, room=sid, namespace=self.namespace)
+
+    def start(self, sid, game, your_score, opponents_score, your_turn):
+        if self.version == 2:
+            self._emit(FRAME_EVENT, {'v': 2, 'k': 's', 'ys': your_score, 'os': opponents_score,
+                                     't': int(your_turn), 'r': game.round}, sid)
+            return
+        self._emit('start', {'game_log': game.legacy_log(), 'your_score': your_score,
+                             'opponents_score': opponents_score, 'round': game.round}, sid)
+        self._emit('message', {'msg': TURN_MSG if your_turn else WAIT_MSG}, sid)
+
+    def update(self, sid, game, your_score, opponents_score, your_turn):
+        if self.version == 2:
+            self._emit(FRAME_EVENT, {'v': 2, 'k': 'u', 'ys': your_score, 'os': opponents_score,
+                                     'm': game.moves_str(), 't': int(your_turn)}, sid)
+            return
+        self._emit('update', {'your_score': your_score, 'opponents_score': opponents_score,
+                              'log': game.ui_log()}, sid)
+        self._emit('message', {'msg': TURN_MSG if your_turn else WAIT_MSG}, sid)
+
+    def game_over(self, sid, game, winner, your_score, opponents_score, final_log, after, total_score=None):
+        """
+        final_log is only sent in v1, where each server sends its own log format.
+        """
+        if self.version == 2:
+            frame = {'v': 2, 'k': 'o', 'ys': your_score, 'os': opponents_score,
+                     'm': game.moves_str(), 'w': int(winner), 'a': after}
+            if total_score is not None:
+                frame['ts'] = total_score
+            self._emit(FRAME_EVENT, frame, sid)
+            return
+        payload = {
+            'msg': 'Game Over, you took the pot!' if winner else 'Game Over, your opponent took the pot!',
+            'winner': 'true' if winner else 'false',
+            'your_score': your_score,
+            'opponents_score': opponents_score,
+            'final_log': final_log,
+        }
+        if total_score is not None:
+            payload['total_score'] = total_score
+        self._emit('game_over', payload, sid)
+        self._emit('message', {'msg': AFTER_MSGS[after]}, sid)
@@ -0,0 +1,96 @@
+"""
+Seeded random streams, one set per session.
+
+Each session has one seed. The tournament shuffle draws from the session's own stream.
+Each game gets its own stream for its random '2' events, derived from the seed and a
+name for the game. The name is the players' schedule positions and the round in app.py,
+and their join numbers in app_gemini.py; it falls back to the game key, which holds the
+players' random tokens. So a game's events do not depend on which other games ran, in
+what order, or on which worker. A re-run with the same seed, with players joining in the
+same order and making the same moves, plays out exactly the same, tokens aside. The seed
+is written to the session's params log to allow that.
+
+Game streams are drawn BLOCK events at a time with NumPy's Generator (PCG64). Each
+block is one vectorized call instead of a Python-level draw per move. Draws are
+consecutive, so the block size does not change which events come out. Without NumPy
+the streams fall back to random.Random. That is just as reproducible but gives
+different draws, so the backend is logged next to the seed.
+"""
+import hashlib, random, secrets
+
+try:
+    import numpy as np
+except ImportError:  # random.Random streams instead
+    np = None
+
+BLOCK = 64  # Events drawn per block; most games end well before this
+
+
+def _name_hash(name):
+    return int.from_bytes(hashlib.blake2b(str(name).encode(), digest_size=16).digest(), 'big')
+
+
+class RandomStreams:
+    """
+    The seed, the session stream, and a block-drawn event stream per game in progress.
+    """
+
+    def __init__(self, seed=None, event_probability=0.25, block=BLOCK):
+        event_probability = float(event_probability)
+        if not 0 <= event_probability <= 1:
+            raise ValueError(f"Event probability must be between 0 and 1, not {event_probability}")
+        self.seed = secrets.randbits(63) if seed is None or seed == '' else int(seed)
+        self.event_probability = event_probability
+        self.block = block
+        self.backend = 'numpy' if np is not None else 'random'
+        self.session_stream = self.generator('session')
+        self.games = {}  # (game key, round) -> [generator, events drawn so far]
+
+    def generator(self, *names):
+        """
+        An independent generator for the stream called names (e.g. ('game', key, round)).
+        """
+        if np is not None:
+            return np.random.default_rng(np.random.SeedSequence([self.seed] + [_name_hash(name) for name in names]))
+        return random.Random(':'.join(str(part) for part in (self.seed,) + names))
+
+    def python_random(self, *names):
+        """
+        A random.Random for the stream called names, whatever the backend (for bots,
+        which use random.Random's API).
+        """
+        return random.Random(':'.join(str(part) for part in (self.seed,) + names))
+
+    def shuffle(self, items):
+        """
+        Shuffles a list in place with the session stream.
+        """
+        if np is not None:
+            items[:] = [items[i] for i in self.session_stream.permutation(len(items))]
+        else:
+            self.session_stream.shuffle(items)
+
+    def event(self, game, names=None):
+        """
+        Whether the move about to be played in game (turn game.turn_number + 1) has the random
+        event. The game's stream is named names(), called once when the stream is created;
+        without it, the game key and round (which only repeat if the tokens do).
+        """
+        stream = self.games.get((game.key, game.round))
+        if stream is None:
+            name = names() if names else (game.key, game.round)
+            stream = self.games[(game.key, game.round)] = [self.generator('game', *name), []]
+        generator, events = stream
+        while len(events) <= game.turn_number:
+            if np is not None:
+                events.extend((generator.random(self.block) < self.event_probability).tolist())
+            else:
+                events.extend(generator.random() < self.event_probability for _ in range(self.block))
+        return events[game.turn_number]
+
+    def end_game(self, game):
+        self.games.pop((game.key, game.round), None)
+
+    def describe(self):
+        return {'seed': self.seed, 'event_probability': self.event_probability, 'backend': self.backend,
+                'block': self.block}
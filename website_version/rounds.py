@@ -0,0 +1,59 @@
+import threading, time
+
+
+class RoundTracker:
+    """
+    Tracks the games still outstanding in the current round.
+    Completing a game is O(1), and complete() returns True exactly once:
+    for the game that finishes the round. Completion times are kept so the
+    round's duration and tail latency can be reported.
+    """
+
+    def __init__(self):
+        self.round_number = 0
+        self.outstanding = set()  # Games (GameState objects) not finished yet
+        self.game_count = 0
+        self.started_at = None
+        self.finish_times = []  # Seconds from round start to each game's end, in order
+        self.lock = threading.Lock()
+
+    def start_round(self, round_number, games):
+        with self.lock:
+            self.round_number = round_number
+            self.outstanding = set(games)
+            self.game_count = len(self.outstanding)
+            self.started_at = time.monotonic()
+            self.finish_times = []
+
+    def complete(self, game):
+        """
+        Marks a game finished. Returns True if this was the last outstanding game.
+        Games from earlier rounds or already completed games are ignored.
+        """
+        with self.lock:
+            if game not in self.outstanding:
+                return False
+            self.outstanding.discard(game)
+            self.finish_times.append(time.monotonic() - self.started_at)
+            return not self.outstanding
+
+    def is_complete(self):
+        return not self.outstanding
+
+    def stats(self):
+        """
+        Round duration plus tail latency: how long the last game ran past the median game.
+        """
+        times = self.finish_times
+        if not times:
+            return {'round': self.round_number, 'games': self.game_count, 'duration_s': 0.0,
+                    'median_game_s': 0.0, 'tail_latency_s': 0.0}
+        median = times[(len(times) - 1) // 2]  # finish_times is already in completion order
+        duration = times[-1]
+        return {
+            'round': self.round_number,
+            'games': self.game_count,
+            'duration_s': round(duration, 3),
+            'median_game_s': round(median, 3),
+            'tail_latency_s': round(duration - median, 3),
+        }
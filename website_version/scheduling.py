@@ -0,0 +1,131 @@
+"""
+Round-robin tournament scheduling.
+"""
+
+
+class RoundRobinSchedule:
+    """
+    Circle-method round robin computed one round at a time.
+    Position 0 stays fixed and the other n - 1 positions rotate one step per round, so
+    round k is read straight off the rotation offset in O(n): no earlier round has to be
+    built, which lets a session play only the first max_rounds rounds or resume at round k.
+    Rounds are 0-based here; the server numbers them from 1.
+    """
+
+    def __init__(self, players_list, max_rounds=None):
+        self.players = list(players_list)
+        if len(self.players) % 2 == 1:
+            self.players.append(None)  # Bye round for odd player
+        full_rounds = max(len(self.players) - 1, 0)
+        self.total_rounds = full_rounds if not max_rounds else min(max_rounds, full_rounds)
+        self.index = {player: i for i, player in enumerate(self.players) if player is not None}
+
+    def __len__(self):
+        return self.total_rounds
+
+    def round(self, k):
+        """
+        Returns the pairs of round k (0-based) as a list of (p1, p2); None marks a bye.
+        """
+        if not 0 <= k < self.total_rounds:
+            raise IndexError(f"Round {k} is outside this {self.total_rounds}-round schedule")
+        # After k rotations (each moves the last player to position 1) the rotating part
+        # is shifted right by k
+        rest = self.players[1:]
+        shift = k % len(rest)
+        order = [self.players[0]] + rest[len(rest) - shift:] + rest[:len(rest) - shift]
+        half = len(order) // 2
+        return list(zip(order[:half], order[:half - 1:-1]))
+
+    def pairing(self, player, k):
+        """
+        Returns player's pair in round k, as round(k) lists it, in O(1).
+        """
+        if not 0 <= k < self.total_rounds:
+            raise IndexError(f"Round {k} is outside this {self.total_rounds}-round schedule")
+        n = len(self.players)
+        m = n - 1
+        shift = k % m
+        i = self.index[player]
+        position = 0 if i == 0 else (i - 1 + shift) % m + 1  # Where the rotation has put player
+        other = n - 1 - position
+        partner = self.players[0] if other == 0 else self.players[1 + (other - 1 - shift) % m]
+        return (player, partner) if position < other else (partner, player)
+
+    def rounds(self, start=0):
+        """
+        Yields rounds start, start + 1, ... lazily.
+        """
+        for k in range(start, self.total_rounds):
+            yield self.round(k)
+
+    def __iter__(self):
+        return self.rounds()
+
+
+class PipelinedDispatcher:
+    """
+    Plays a round-robin schedule without a barrier between rounds: a player's round-k
+    game starts as soon as both players of that precomputed pair are free, instead of
+    when every round k - 1 game has finished. Every pair is still the schedule's pair,
+    so each pair meets exactly once, in the schedule's round order for each player.
+
+    It cannot deadlock: the players furthest behind are all waiting for partners at the
+    same round (a partner further ahead would have played that round's game with them
+    already), so they can always start.
+
+    next_round: player -> index of the next round they have to play.
+    busy: players in a game.
+    """
+
+    def __init__(self, schedule, next_round=None, busy=()):
+        self.schedule = schedule
+        players = [p for p in schedule.players if p is not None]
+        self.next_round = dict(next_round) if next_round else {p: 0 for p in players}
+        self.busy = set(busy)
+
+    def start(self):
+        """
+        Returns the games that can start now, as (p1, p2, k), for every free player.
+        """
+        return self._dispatch(list(self.next_round))
+
+    def finish(self, p1, p2):
+        """
+        Marks the game between p1 and p2 finished and returns the games that can start now.
+        """
+        for player in (p1, p2):
+            self.busy.discard(player)
+            self.next_round[player] += 1
+        return self._dispatch((p1, p2))
+
+    def _dispatch(self, players):
+        started = []
+        total = len(self.schedule)
+        for player in players:
+            while player not in self.busy and self.next_round[player] < total:
+                k = self.next_round[player]
+                pair = self.schedule.pairing(player, k)
+                partner = pair[1] if pair[0] == player else pair[0]
+                if partner is None:  # Bye: nothing to wait for
+                    self.next_round[player] += 1
+                    continue
+                if partner not in self.busy and self.next_round[partner] == k:
+                    self.busy.update(pair)
+                    started.append((pair[0], pair[1], k))
+                break
+        return started
+
+    def lowest_round(self):
+        return min(self.next_round.values(), default=0)
+
+    def is_done(self):
+        return not self.busy and self.lowest_round() >= len(self.schedule)
+
+
+def round_robin(players_list, max_rounds=None):
+    """
+    Circle-method round robin: n - 1 rounds of pairs for even n, n rounds for odd n
+    (None pairs with the player who has a bye). Every player meets every other player once.
+    """
+    return list(RoundRobinSchedule(players_list, max_rounds))
@@ -0,0 +1,99 @@
+import os, threading
+
+
+def replay_score_log(path):
+    """
+    Rebuilds the latest total score for every player by replaying a score ledger.
+    Each line is "sid:total_score"; later lines override earlier ones, so the
+    last entry seen for a sid is its current total.
+    """
+    totals = {}
+    if not os.path.exists(path):
+        return totals
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            sid, _, score = line.rpartition(':')
+            if not sid:
+                continue
+            try:
+                totals[sid] = int(score)
+            except ValueError:
+                continue  # Skip a torn final line from a crash mid-write
+    return totals
+
+
+class ScoreLedger:
+    """
+    Append-only total score log with an in-memory index of the latest totals.
+    Recording a score is a single append, no matter how many players there are.
+    The file can be compacted (one line per player) on shutdown or on demand.
+    If a LogPipeline is given, appends go through it instead of a private file handle.
+    """
+
+    def __init__(self, path, pipeline=None):
+        self.path = path
+        self.pipeline = pipeline
+        self.lock = threading.Lock()
+        self.totals = replay_score_log(path)  # sid -> latest total score
+        self.appended_since_compact = 0
+        self._file = None if pipeline else open(path, 'a')
+
+    def record(self, sid, total_score):
+        """
+        Appends a new total for a player and updates the in-memory index.
+        """
+        with self.lock:
+            self.totals[sid] = total_score
+            if self.pipeline:
+                self.pipeline.write(self.path, f"{sid}:{total_score}\n")
+            else:
+                self._file.write(f"{sid}:{total_score}\n")
+                self._file.flush()
+            self.appended_since_compact += 1
+
+    def get(self, sid, default=0):
+        return self.totals.get(sid, default)
+
+    def snapshot(self):
+        """
+        Returns a copy of the latest totals for every player.
+        """
+        with self.lock:
+            return dict(self.totals)
+
+    def compact(self):
+        """
+        Rewrites the ledger with only the latest entry per player.
+        The new file is written next to the old one and swapped in atomically,
+        so a crash during compaction never loses scores.
+        """
+        with self.lock:
+            if self.appended_since_compact == 0:
+                return
+            if self.pipeline:
+                # Make sure queued appends hit the old file before it is replaced
+                self.pipeline.flush()
+                self.pipeline.release(self.path)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.writelines(f"{sid}:{score}\n" for sid, score in self.totals.items())
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file:
+                self._file.close()
+            os.replace(tmp_path, self.path)
+            if not self.pipeline:
+                self._file = open(self.path, 'a')
+            self.appended_since_compact = 0
+
+    def close(self):
+        """
+        Compacts the ledger and closes the underlying file.
+        """
+        self.compact()
+        with self.lock:
+            if self._file and not self._file.closed:
+                self._file.close()
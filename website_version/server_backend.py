@@ -0,0 +1,53 @@
+"""
+Async backend selection for the Socket.IO servers.
+
+ASYNC_MODE chooses how Flask-SocketIO serves connections:
+  threading  one OS thread per connection (Werkzeug dev server / simple-websocket); the default
+  eventlet   green threads on the eventlet hub (pip install eventlet)
+  gevent     green threads on the gevent loop (pip install gevent gevent-websocket)
+
+For eventlet and gevent the standard library is monkey-patched when this module is
+imported, so the apps import it before anything else. Every threading.Lock and
+threading.Thread created after that (GameState.lock, ReadyPool, RoundTracker, the log
+pipeline thread, ...) is then cooperative, and a handler waiting on a game lock yields
+to the loop instead of blocking it. socketio.start_background_task and socketio.sleep
+already follow the selected mode.
+
+There is no asyncio/ASGI mode: Flask-SocketIO is a WSGI extension and cannot run its
+handlers on an asyncio loop. eventlet and gevent give the same single-threaded event
+loop model without rewriting the handlers as coroutines.
+"""
+import os
+
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'threading')
+SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.environ.get('SERVER_PORT', '5001'))
+# Debug mode and the Werkzeug development server are opt-in (SERVER_DEBUG=1 enables both)
+SERVER_DEBUG = os.environ.get('SERVER_DEBUG', '0') == '1'
+ALLOW_UNSAFE_WERKZEUG = SERVER_DEBUG or os.environ.get('ALLOW_UNSAFE_WERKZEUG', '0') == '1'
+
+if ASYNC_MODE in ('asyncio', 'asgi'):
+    raise ValueError(f"ASYNC_MODE={ASYNC_MODE} is not supported: Flask-SocketIO only runs on WSGI. "
+                     f"Use eventlet or gevent for an event-loop server.")
+if ASYNC_MODE not in ASYNC_MODES:
+    raise ValueError(f"Unknown ASYNC_MODE '{ASYNC_MODE}' (use one of {', '.join(ASYNC_MODES)})")
+
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def run(socketio, app):
+    """
+    Runs the server on SERVER_HOST:SERVER_PORT with the selected backend.
+    """
+    print(f"Starting Flask SocketIO server ({ASYNC_MODE}) on {SERVER_HOST}:{SERVER_PORT}...")
+    kwargs = {}
+    if ASYNC_MODE == 'threading':
+        # Werkzeug is a development server: outside a terminal it only runs when explicitly allowed
+        kwargs['allow_unsafe_werkzeug'] = ALLOW_UNSAFE_WERKZEUG
+    socketio.run(app, host=SERVER_HOST, port=SERVER_PORT, debug=SERVER_DEBUG, **kwargs)
@@ -0,0 +1,616 @@
+import collections, datetime, functools, os, threading, time, uuid
+
+from bots import make_bot
+from checkpoint import Checkpointer
+from commander_feed import CommanderFeed
+from game_state import GameState
+from payoff import load_payoff_table
+from random_streams import RandomStreams
+from rounds import RoundTracker
+from scheduling import PipelinedDispatcher, RoundRobinSchedule
+from score_ledger import ScoreLedger
+
+
+def new_player_token():
+    """
+    A stable, unguessable player id. Clients keep it and send it again when they
+    reconnect, so a player survives a dropped connection or a server restart.
+    """
+    return uuid.uuid4().hex
+
+
+def _atomic(method):
+    """
+    Runs a state change under the session's state lock, so concurrent game ends cannot
+    interleave (e.g. both start the same pair), and with its WAL record under the
+    checkpoint lock inside it. Snapshots capture under the checkpoint lock, so one never
+    holds a change without its record, or half of a change (a take credited to one
+    player but not yet the other).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.state_lock:
+            checkpointer = self.checkpointer
+            if checkpointer is None:
+                return method(self, *args, **kwargs)
+            with checkpointer.lock:
+                return method(self, *args, **kwargs)
+    return wrapper
+
+
+class Session:
+    """
+    One experiment session (e.g. one lab section): its own player pool, round-robin
+    schedule, payoff table, commander room and log files. Many sessions can run in one
+    server process; players pick theirs with a session code when they join.
+    Players are keyed by their stable token, which is also the Socket.IO room their
+    connections join, so emits reach a player on whichever connection they have now.
+
+    The state-changing methods below (add_player, start_tournament, setup_round,
+    play_move) only change state and record it; the server does the emitting.
+    With a checkpoint directory, every change is written to a WAL and the session is
+    snapshotted periodically (see checkpoint.py), and restore() rebuilds it after a crash.
+
+    With a bot strategy (see bots.py), an odd player pool gets one bot player when the
+    tournament starts, so no one sits out a round with a bye. The bot plays through the
+    same game engine; its token starts with 'bot_' and its name with 'bot:' in the logs.
+
+    Rounds run in one of two modes. 'barrier': round k + 1 starts when every round k game
+    has finished (setup_round). 'pipelined': each player's next game starts as soon as
+    both players of that scheduled pair are free (start_pipelined/advance, see
+    PipelinedDispatcher). Either way, tournament_stats() reports the makespan and each
+    player's idle time (free but not in a game) so the two modes can be compared.
+
+    Randomness comes from the session's seed (see random_streams.py): the tournament
+    shuffle, every game's '2' events (event()) and the bots each have their own stream,
+    so the seed in the params log reproduces the session.
+
+    Resource accounting (stats()) counts what each session costs the process: players,
+    moves, games, rounds, log lines and the time spent handling its moves.
+    """
+
+    def __init__(self, code, socketio, log_pipeline, log_dir='logs', payoff_schedule='linear',
+                 payoff_config=None, max_rounds=0, commander_tick=0.25, checkpoint_dir=None,
+                 checkpoint_every=500, checkpoint_interval=30.0, bot_strategy='', round_mode='barrier',
+                 seed=None, event_probability=0.25):
+        self.code = code
+        self.socketio = socketio
+        self.room = f"session:{code}"  # Every player in this session
+        self.commander_room = f"commander:{code}"
+        self.created_at = time.time()
+
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.session_log_path = os.path.join(log_dir, f"session_{code}_{stamp}.txt")
+        self.name_log_path = os.path.join(log_dir, f"name_log_{code}_{stamp}.txt")
+        self.score_log_path = os.path.join(log_dir, f"totalscore_log_{code}_{stamp}.txt")
+        self.timeout_log_path = os.path.join(log_dir, f"timeout_log_{code}_{stamp}.txt")
+        self.params_log_path = os.path.join(log_dir, f"params_log_{code}_{stamp}.txt")
+        self.log_pipeline = log_pipeline
+        self.score_ledger = ScoreLedger(self.score_log_path, pipeline=log_pipeline)
+
+        self.payoff_schedule = payoff_schedule
+        self.payoff_config = payoff_config
+        self.payoff_table = load_payoff_table(payoff_config, payoff_schedule)
+        self.commander_feed = CommanderFeed(socketio, room=self.commander_room, tick=commander_tick)
+
+        # players: token -> {'name': str, 'game': GameState, 'opponent': token, 'turn': bool,
+        #                    'ready_for_next_game': bool, 'total_score': int, 'bot': spec or None}
+        self.players = {}
+        self.waiting_players = []
+        self.current_round_index = -1  # Tracks the current round being played (-1 means not started)
+        self.max_rounds = max_rounds  # Play only this many rounds (0 = the full round robin)
+        self.tournament_schedule = RoundRobinSchedule([])  # Each round's pairings are computed when it starts
+        self.round_tracker = RoundTracker()  # Games still outstanding in the current round
+        self.games = {}  # game key -> GameState for the current round (pipelined: the games in progress)
+        if round_mode not in ('barrier', 'pipelined'):
+            raise ValueError(f"Unknown round mode '{round_mode}'. Known: barrier, pipelined")
+        self.round_mode = round_mode
+        self.dispatcher = None  # PipelinedDispatcher once a pipelined tournament starts
+        self.free_since = {}  # token -> when they last became free (for idle time)
+        self.idle_seconds = collections.defaultdict(float)
+        self.tournament_started_at = None
+        self.tournament_finished_at = None
+        self.bot_strategy = bot_strategy  # Bot spec for odd pools, '' for byes instead
+        if bot_strategy:
+            make_bot(bot_strategy)  # Raises ValueError for an unknown strategy
+        self.bots = {}  # bot token -> bot
+        self.take_turns = collections.Counter()  # Turn -> human games ended by a take on that turn
+        self.turn_strikes = collections.Counter()  # (game key, token) -> turns timed out this round
+        self.random = RandomStreams(seed, event_probability)
+
+        # Held by every state change, checkpointing or not (see _atomic); taken before any checkpoint lock
+        self.state_lock = threading.RLock()
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpointer = None
+        if checkpoint_dir:
+            self.checkpointer = Checkpointer(checkpoint_dir, code, every=checkpoint_every,
+                                             interval=checkpoint_interval)
+
+        self.lock = threading.Lock()  # Guards the counters below
+        self.joins = 0
+        self.moves = 0
+        self.games_played = 0
+        self.rounds = 0
+        self.timeouts = 0
+        self.log_lines = 0
+        self.handler_seconds = 0.0
+
+        self._record({'t': 'c', 'seed': self.random.seed, 'e': self.random.event_probability})
+        self.log_params()
+
+    # --- State changes (each one is recorded in the WAL) ---
+
+    @_atomic
+    def add_player(self, name, token=None, bot=None):
+        """
+        Adds a new player (a bot if bot is a strategy spec) and returns their token.
+        """
+        token = token or new_player_token()
+        self.players[token] = {'name': name, 'game': None, 'opponent': None, 'turn': False,
+                               'ready_for_next_game': False, 'total_score': 0, 'bot': bot}
+        if bot:
+            self._add_bot_player(token, bot)
+        if token not in self.waiting_players: # Prevent duplicate entries if player refreshes
+            self.waiting_players.append(token)
+        record = {'t': 'j', 'p': token, 'n': name}
+        if bot:
+            record['b'] = bot
+        self._record(record)
+        return token
+
+    def add_bot(self):
+        """
+        Adds a bot player with the session's strategy and returns its token.
+        """
+        token = f"bot_{self.random.python_random('bot token', len(self.players)).getrandbits(128):032x}"  # Reproducible too
+        return self.add_player(f"bot:{self.bot_strategy}", token=token, bot=self.bot_strategy)
+
+    def _add_bot_player(self, token, spec):
+        # A bot's draws depend only on the seed, the bot (its token comes from the seed too)
+        # and the move, so they are the same on a re-run and after a restore
+        bot = self.bots[token] = make_bot(spec)
+        streams = self.random
+        bot.rng_for = lambda game: streams.python_random('bot', token, game.round, game.turn_number)
+
+    @_atomic
+    def remove_player(self, token):
+        """
+        Drops a player before the tournament starts.
+        """
+        self.players.pop(token, None)
+        if token in self.waiting_players:
+            self.waiting_players.remove(token)
+        self._record({'t': 'l', 'p': token})
+
+    def start_tournament(self, present=None):
+        """
+        Starts a tournament with the player pool. present is the set of tokens with a live
+        connection: anyone else (e.g. long gone from a restored or reused session) is
+        dropped from the pool first, so no one is scheduled against an empty seat.
+        """
+        with self.state_lock:
+            if self.checkpoint_dir and self.checkpointer is None:
+                # The last tournament's checkpoint was archived: start a new one from here
+                self.checkpointer = Checkpointer(self.checkpoint_dir, self.code, every=self.checkpoint_every,
+                                                 interval=self.checkpoint_interval)
+                self.checkpoint_now()
+            self._start_tournament(present)
+
+    @_atomic
+    def _start_tournament(self, present):
+        dropped = {token for token in self.waiting_players
+                   if token not in self.bots and present is not None and token not in present}
+        bots = [token for token in self.waiting_players if token in self.bots]
+        humans = len(self.waiting_players) - len(dropped) - len(bots)
+        keep = bots[:1] if self.bot_strategy and humans % 2 else []  # At most one bot, from a past tournament
+        dropped.update(token for token in bots if token not in keep)
+        if dropped:
+            self.waiting_players = [token for token in self.waiting_players if token not in dropped]
+            self._record({'t': 'w', 'p': sorted(dropped)})
+        if self.bot_strategy and humans % 2 and not keep:
+            self.add_bot()  # Fills the bye every round would otherwise have
+        self.random.shuffle(self.waiting_players) # Shuffle once at the beginning of the tournament
+        self._begin_tournament(self.waiting_players, self.max_rounds)
+        self._record({'t': 's', 'o': self.tournament_schedule.players, 'm': self.max_rounds})
+
+    def _begin_tournament(self, order, max_rounds):
+        self.waiting_players = [token for token in order if token is not None]
+        self.tournament_schedule = RoundRobinSchedule(self.waiting_players, max_rounds=max_rounds)
+        self.current_round_index = 0
+        self.round_tracker = RoundTracker()  # A reused session starts again from round 1
+        self.games = {}
+        self.dispatcher = None
+        self.turn_strikes.clear()
+        self.idle_seconds.clear()
+        self.tournament_finished_at = None
+        self._start_clock()
+
+    def _start_clock(self):
+        now = time.monotonic()
+        self.tournament_started_at = now
+        self.free_since = {token: now for token in self.tournament_schedule.players if token is not None}
+
+    @_atomic
+    def setup_round(self):
+        """
+        Pairs up the players for the current round and starts tracking its games.
+        Returns (pairings, games, bye tokens).
+        """
+        players = self.players
+        current_round_index = self.current_round_index
+        pairings = self.tournament_schedule.round(current_round_index)
+        round_games = []
+        byes = []
+        for p1, p2 in pairings:
+            if p1 is None or p2 is None: # Handle bye player
+                bye_player = p1 if p1 is not None else p2
+                if bye_player and bye_player in players:
+                    players[bye_player]['opponent'] = None
+                    players[bye_player]['turn'] = False
+                    players[bye_player]['game'] = None # Clear any previous game
+                    players[bye_player]['ready_for_next_game'] = True # Mark as ready for next round
+                    byes.append(bye_player)
+                continue # Skip to next pairing
+            round_games.append(self._start_game(p1, p2, current_round_index))
+
+        self.games = {game.key: game for game in round_games}
+        self.turn_strikes.clear()
+        # Start tracking before any start frame goes out, so even an instant first move is counted
+        self.round_tracker.start_round(current_round_index + 1, round_games)
+        self._record({'t': 'r', 'k': current_round_index})
+        return pairings, round_games, byes
+
+    def _start_game(self, p1, p2, round_index):
+        players = self.players
+        players[p1]['opponent'] = p2
+        players[p2]['opponent'] = p1
+        game = GameState(f"{p1[:2]}{p2[:2]}", p1, p2, round=round_index + 1)
+        players[p1]['game'] = game
+        players[p2]['game'] = game
+        players[p1]['turn'] = True
+        players[p2]['turn'] = False
+        players[p1]['ready_for_next_game'] = False # Not ready until game is over
+        players[p2]['ready_for_next_game'] = False # Not ready until game is over
+        now = time.monotonic()
+        for player in (p1, p2):
+            self.idle_seconds[player] += now - self.free_since.pop(player, now)
+        return game
+
+    @_atomic
+    def start_pipelined(self):
+        """
+        Starts every game that can start at the beginning of a pipelined tournament.
+        """
+        self.dispatcher = PipelinedDispatcher(self.tournament_schedule)
+        games = [self._start_game(p1, p2, k) for p1, p2, k in self.dispatcher.start()]
+        self.games = {game.key: game for game in games}
+        self._record({'t': 'p'})
+        return games
+
+    @_atomic
+    def advance(self, game):
+        """
+        Pipelined mode: frees the players of a finished game and returns the games that start now.
+        """
+        if self.dispatcher.next_round[game.p1_sid] != game.round - 1:
+            return []  # Already advanced (WAL replay)
+        self.games.pop(game.key, None)
+        games = [self._start_game(p1, p2, k) for p1, p2, k in self.dispatcher.finish(game.p1_sid, game.p2_sid)]
+        for started in games:
+            self.games[started.key] = started
+            self.turn_strikes.pop((started.key, started.p1_sid), None)
+            self.turn_strikes.pop((started.key, started.p2_sid), None)
+        self.current_round_index = self.dispatcher.lowest_round()  # The slowest player's round
+        self._record({'t': 'a', 'g': game.key})
+        return games
+
+    def finish_tournament(self):
+        """
+        Stops the clock: players still free are idle until now. Returns True only for the
+        call that finished the tournament (two last games can end at once).
+        """
+        # Not _atomic: archiving takes the snapshot lock, which must come before the checkpoint lock
+        with self.state_lock:
+            if self.tournament_finished_at is not None or self.tournament_started_at is None:
+                return False
+            now = self.tournament_finished_at = time.monotonic()
+            for player, since in self.free_since.items():
+                self.idle_seconds[player] += now - since
+            self.free_since.clear()
+            self.archive_checkpoint()
+            return True
+
+    def archive_checkpoint(self):
+        """
+        Moves a finished session's checkpoint to the archive, so a restart does not restore it.
+        """
+        if self.checkpointer:
+            self.checkpointer.archive(self.capture)
+            self.checkpointer = None
+
+    def tournament_stats(self):
+        """
+        Makespan and per-player idle time (seconds free but not in a game) so far.
+        """
+        if self.tournament_started_at is None:
+            return {'mode': self.round_mode, 'makespan_s': 0.0, 'idle_mean_s': 0.0, 'idle_max_s': 0.0,
+                    'idle_share': 0.0, 'idle_s': {}}
+        now = self.tournament_finished_at or time.monotonic()
+        idle = {player: self.idle_seconds[player] + (now - self.free_since[player] if player in self.free_since else 0.0)
+                for player in self.tournament_schedule.players if player is not None}
+        makespan = now - self.tournament_started_at
+        total = sum(idle.values())
+        return {
+            'mode': self.round_mode,
+            'makespan_s': round(makespan, 3),
+            'idle_mean_s': round(total / len(idle), 3) if idle else 0.0,
+            'idle_max_s': round(max(idle.values(), default=0.0), 3),
+            'idle_share': round(total / (len(idle) * makespan), 4) if idle and makespan else 0.0,
+            'idle_s': {player: round(seconds, 3) for player, seconds in idle.items()},
+        }
+
+    @_atomic
+    def play_move(self, game, player, symbol):
+        """
+        Applies a move symbol ('0', '2' or 'x') by player and returns the new turn number.
+        Taking the pot ends the game and adds the payoffs to both players' totals.
+        """
+        opponent = game.opponent_of(player)
+        turn_number = game.add_move(symbol)
+        game.current_payoff = self.payoff_table.lookup(turn_number)
+        players = self.players
+        players[player]['turn'] = False
+        if symbol == 'x':
+            if player not in self.bots and opponent not in self.bots:
+                self.take_turns[turn_number] += 1
+            players[opponent]['turn'] = False
+            players[player]['ready_for_next_game'] = True
+            players[opponent]['ready_for_next_game'] = True
+            self.random.end_game(game)
+            self.free_since[player] = self.free_since[opponent] = time.monotonic()
+            p1_score, p2_score = game.current_payoff
+            players[game.p1_sid]['total_score'] += p1_score
+            players[game.p2_sid]['total_score'] += p2_score
+        else:
+            players[opponent]['turn'] = True
+        record = {'t': 'm', 'g': game.key, 'p': player, 'i': turn_number, 's': symbol}
+        bot = self.bots.get(player)
+        if hasattr(bot, 'state'):
+            record['b'] = bot.state()  # The state the bot decided this move with
+        if symbol == 'x':
+            # Totals are absolute, so replaying a game over twice cannot double-count
+            record['ts'] = [players[game.p1_sid]['total_score'], players[game.p2_sid]['total_score']]
+        self._record(record)
+        return turn_number
+
+    def _record(self, record):
+        if self.checkpointer and self.checkpointer.log(record):
+            # Snapshots are written off the move path
+            self.socketio.start_background_task(self.checkpoint_now)
+
+    # --- Checkpoints ---
+
+    def checkpoint_now(self):
+        if self.checkpointer:
+            self.checkpointer.write_snapshot(self.capture)
+
+    def capture(self):
+        """
+        Copies the session state into a JSON-ready dict.
+        """
+        players = {}
+        for token, data in list(self.players.items()):
+            game = data['game']
+            players[token] = {'name': data['name'], 'game': game.key if game else None,
+                              'opponent': data['opponent'], 'turn': data['turn'],
+                              'ready_for_next_game': data['ready_for_next_game'],
+                              'total_score': data['total_score'], 'bot': data['bot']}
+        return {
+            'code': self.code,
+            'payoff_schedule': self.payoff_schedule,
+            'payoff_config': self.payoff_config,
+            'max_rounds': self.max_rounds,
+            'bot_strategy': self.bot_strategy,
+            'round_mode': self.round_mode,
+            'seed': self.random.seed,
+            'event_probability': self.random.event_probability,
+            'next_round': dict(self.dispatcher.next_round) if self.dispatcher else None,
+            'busy': list(self.dispatcher.busy) if self.dispatcher else [],
+            'take_turns': dict(self.take_turns),
+            'players': players,
+            'bot_state': {token: bot.state() for token, bot in list(self.bots.items()) if hasattr(bot, 'state')},
+            'waiting_players': list(self.waiting_players),
+            'current_round_index': self.current_round_index,
+            'schedule': self.tournament_schedule.players,
+            'round': self.round_tracker.round_number,
+            'games': [game.to_dict() for game in list(self.games.values())],
+            'outstanding': [game.key for game in list(self.round_tracker.outstanding)],
+        }
+
+    @classmethod
+    def restore(cls, code, socketio, log_pipeline, checkpoint_dir, **settings):
+        """
+        Rebuilds a session from its snapshot and WAL. Returns (session, next_round_pending):
+        next_round_pending is True if the last round had finished but the next one had not
+        started when the server stopped.
+        """
+        snapshot, records, generation, seq = Checkpointer.load(checkpoint_dir, code)
+        if snapshot:
+            settings.update(payoff_schedule=snapshot['payoff_schedule'], payoff_config=snapshot['payoff_config'],
+                            max_rounds=snapshot['max_rounds'], bot_strategy=snapshot.get('bot_strategy', ''),
+                            round_mode=snapshot.get('round_mode', 'barrier'), seed=snapshot.get('seed'),
+                            event_probability=snapshot.get('event_probability', 0.25))
+        elif records and records[0]['t'] == 'c':  # No snapshot yet: the WAL starts with the seed
+            settings.update(seed=records[0]['seed'], event_probability=records[0]['e'])
+        session = cls(code, socketio, log_pipeline, checkpoint_dir=None, **settings)
+        if snapshot:
+            session._load_snapshot(snapshot)
+        for record in records:
+            session._replay(record)
+
+        if session.dispatcher:
+            # A game can end just before its players were advanced
+            for game in list(session.games.values()):
+                if game.is_over():
+                    session.advance(game)
+            session.checkpoint_dir = checkpoint_dir
+            session.checkpointer = Checkpointer(checkpoint_dir, code, every=settings.get('checkpoint_every', 500),
+                                                interval=settings.get('checkpoint_interval', 30.0),
+                                                generation=generation, seq=seq)
+            return session, False
+
+        # A move can be in the snapshot before its game was marked complete
+        tracker = session.round_tracker
+        for game in list(tracker.outstanding):
+            if game.is_over():
+                tracker.complete(game)
+        next_round_pending = False
+        if tracker.round_number and tracker.is_complete():
+            session.current_round_index = tracker.round_number  # Round k (1-based) done: next index is k
+            next_round_pending = session.current_round_index < len(session.tournament_schedule)
+
+        session.checkpoint_dir = checkpoint_dir
+        session.checkpointer = Checkpointer(checkpoint_dir, code, every=settings.get('checkpoint_every', 500),
+                                            interval=settings.get('checkpoint_interval', 30.0),
+                                            generation=generation, seq=seq)
+        return session, next_round_pending
+
+    def _load_snapshot(self, snapshot):
+        self.games = {}
+        for data in snapshot['games']:
+            game = GameState.from_dict(data)
+            self.games[game.key] = game
+        for token, data in snapshot['players'].items():
+            player = dict(data)
+            player['game'] = self.games.get(data['game'])
+            player.setdefault('bot', None)
+            self.players[token] = player
+            if player['bot']:
+                self._add_bot_player(token, player['bot'])
+        for token, state in snapshot.get('bot_state', {}).items():
+            self.bots[token].load_state(state)
+        self.take_turns = collections.Counter({int(turn): n for turn, n in snapshot.get('take_turns', {}).items()})
+        self.waiting_players = snapshot['waiting_players']
+        self.current_round_index = snapshot['current_round_index']
+        self.tournament_schedule = RoundRobinSchedule(snapshot['schedule'], max_rounds=self.max_rounds)
+        if snapshot.get('next_round') is not None:
+            self.dispatcher = PipelinedDispatcher(self.tournament_schedule, snapshot['next_round'], snapshot['busy'])
+        if self.current_round_index >= 0:
+            self._start_clock()  # Idle times and makespan restart from the restore
+            for game in self.games.values():
+                if not game.is_over():
+                    self.free_since.pop(game.p1_sid, None)
+                    self.free_since.pop(game.p2_sid, None)
+        outstanding = set(snapshot['outstanding'])
+        self.round_tracker.start_round(snapshot['round'],
+                                       [game for key, game in self.games.items() if key in outstanding])
+
+    def _replay(self, record):
+        """
+        Applies one WAL record. Records can overlap the snapshot, so each one is skipped
+        if its effect is already there.
+        """
+        kind = record['t']
+        if kind == 'j':
+            if record['p'] not in self.players:
+                self.add_player(record['n'], record['p'], bot=record.get('b'))
+        elif kind == 'l':
+            if record['p'] in self.players and self.current_round_index == -1:
+                self.remove_player(record['p'])
+        elif kind == 'w':
+            dropped = set(record['p'])
+            self.waiting_players = [token for token in self.waiting_players if token not in dropped]
+        elif kind == 's':
+            if not self.is_running():
+                self._begin_tournament(record['o'], record['m'])
+        elif kind == 'p':
+            if self.dispatcher is None:
+                self.start_pipelined()
+        elif kind == 'a':
+            game = self.games.get(record['g'])
+            if game is not None and self.dispatcher is not None:
+                self.advance(game)
+        elif kind == 'r':
+            if self.round_tracker.round_number < record['k'] + 1:
+                self.current_round_index = record['k']
+                self.setup_round()
+        elif kind == 'm':
+            game = self.games.get(record['g'])
+            if game is not None and game.turn_number < record['i']:
+                if 'b' in record:
+                    self.bots[record['p']].load_state(record['b'])
+                self.play_move(game, record['p'], record['s'])
+                if 'ts' in record:
+                    self.players[game.p1_sid]['total_score'], self.players[game.p2_sid]['total_score'] = record['ts']
+                if game.is_over():
+                    self.round_tracker.complete(game)
+
+    def event(self, game):
+        """
+        Whether the pass about to be played in game is a '2' (random event) pass.
+        """
+        index = self.tournament_schedule.index
+        # Named by schedule positions, not tokens: the same seed and join order give the same events
+        return self.random.event(game, lambda: (index[game.p1_sid], index[game.p2_sid], game.round))
+
+    # --- Accounting ---
+
+    def log_params(self):
+        """
+        Writes what it takes to reproduce the session (seed, event probability, RNG backend, settings).
+        """
+        params = dict(self.random.describe(), payoff_schedule=self.payoff_schedule, max_rounds=self.max_rounds,
+                      bot_strategy=self.bot_strategy, round_mode=self.round_mode)
+        self.write_log(self.params_log_path, ''.join(f"{key}: {value}\n" for key, value in params.items()))
+
+    def write_log(self, path, text):
+        self.log_pipeline.write(path, text)
+        with self.lock:
+            self.log_lines += 1
+
+    def count(self, joins=0, moves=0, games=0, rounds=0, handler_seconds=0.0, timeouts=0):
+        with self.lock:
+            self.joins += joins
+            self.moves += moves
+            self.games_played += games
+            self.rounds += rounds
+            self.handler_seconds += handler_seconds
+            self.timeouts += timeouts
+
+    def is_running(self):
+        return 0 <= self.current_round_index < len(self.tournament_schedule)
+
+    def is_finished(self):
+        return self.current_round_index >= 0 and not self.is_running()
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                'session': self.code,
+                'players': len(self.players),
+                'bots': len(self.bots),
+                'joins': self.joins,
+                'round': self.current_round_index + 1,
+                'rounds_total': len(self.tournament_schedule),
+                'rounds_played': self.rounds,
+                'games': self.games_played,
+                'moves': self.moves,
+                'timeouts': self.timeouts,
+                'log_lines': self.log_lines,
+                'handler_ms': round(self.handler_seconds * 1000, 1),
+                'payoff_schedule': self.payoff_schedule,
+                'round_mode': self.round_mode,
+                'seed': self.random.seed,
+                'event_probability': self.random.event_probability,
+                'uptime_s': round(time.time() - self.created_at, 1),
+            }
+        if self.checkpointer:
+            stats['checkpoint'] = self.checkpointer.stats()
+        return stats
+
+    def close(self):
+        self.score_ledger.close()
+        if self.checkpointer:
+            self.checkpointer.close()
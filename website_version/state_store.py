@@ -0,0 +1,272 @@
+"""
+State stores for the matchmaking server.
+
+MemoryStateStore keeps everything in process (the default, single worker).
+SQLiteStateStore keeps players, games, the ready pool and the played-with history
+in a SQLite file so several worker processes can serve one session. Combined with
+Socket.IO's message queue (SOCKETIO_MESSAGE_QUEUE), an emit from any worker reaches
+the player's socket on whichever worker holds it.
+
+Both stores expose the same interface:
+  players                 mapping sid -> player record (records write through on assignment)
+  ready                   ready pool (add / discard / take_pair / remove_if / snapshot / len / in)
+  put_game, locked_game   games by key; locked_game() yields the latest state under the game's lock
+  save_game, delete_game
+  game_count()            games in the store (in progress), across all workers
+  match_lock()            serializes matching passes across all workers
+  record_played, sync_matching
+  player_number(sid)      stable small integer for a player, shared by all workers
+"""
+import json, os, sqlite3, threading, zlib
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Cross-process locks need POSIX file locking
+    fcntl = None
+
+from game_state import GameState
+from matching import ReadyPool
+
+
+class MemoryStateStore:
+    """
+    Single-process store: plain dicts and objects, nothing is serialized.
+    """
+
+    def __init__(self):
+        self.players = {}
+        self.games = {}  # game key -> GameState
+        self.ready = ReadyPool()
+        self._match_lock = threading.Lock()
+        self._numbers = {}
+
+    def player_number(self, sid):
+        return self._numbers.setdefault(sid, len(self._numbers))
+
+    def put_game(self, game):
+        self.games[game.key] = game
+
+    @contextmanager
+    def locked_game(self, key):
+        game = self.games.get(key) if key else None
+        if game is None:
+            yield None
+            return
+        with game.lock:
+            yield game
+
+    def save_game(self, game):
+        pass  # The object is the state
+
+    def delete_game(self, key):
+        self.games.pop(key, None)
+
+    def game_count(self):
+        return len(self.games)
+
+    def match_lock(self):
+        return self._match_lock
+
+    def record_played(self, sid_a, sid_b):
+        pass  # The local matching engine is the only copy
+
+    def sync_matching(self, engine):
+        pass
+
+
+class _PlayerRecord(dict):
+    """
+    A player dict that writes itself back to the store whenever a field is assigned.
+    """
+    __slots__ = ('_store', '_sid')
+
+    def __init__(self, store, sid, data):
+        super().__init__(data)
+        self._store = store
+        self._sid = sid
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._store._write_player(self._sid, self)
+
+
+class _SQLitePlayers(MutableMapping):
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, sid):
+        row = self.store._db().execute("SELECT data FROM players WHERE sid = ?", (sid,)).fetchone()
+        if row is None:
+            raise KeyError(sid)
+        return _PlayerRecord(self.store, sid, json.loads(row[0]))
+
+    def __setitem__(self, sid, value):
+        self.store._write_player(sid, value)
+
+    def __delitem__(self, sid):
+        if self.store._db().execute("DELETE FROM players WHERE sid = ?", (sid,)).rowcount == 0:
+            raise KeyError(sid)
+
+    def __contains__(self, sid):
+        return self.store._db().execute("SELECT 1 FROM players WHERE sid = ?", (sid,)).fetchone() is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self.store._db().execute("SELECT sid FROM players ORDER BY id")])
+
+    def __len__(self):
+        return self.store._db().execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+
+class _SQLiteReadyPool:
+    def __init__(self, store):
+        self.store = store
+
+    def add(self, sid):
+        return self.store._db().execute("INSERT OR IGNORE INTO ready (sid) VALUES (?)", (sid,)).rowcount == 1
+
+    def discard(self, sid):
+        self.store._db().execute("DELETE FROM ready WHERE sid = ?", (sid,))
+
+    def take_pair(self, sid_a, sid_b):
+        with self.store._transaction() as db:
+            if db.execute("SELECT COUNT(*) FROM ready WHERE sid IN (?, ?)", (sid_a, sid_b)).fetchone()[0] != 2:
+                return False
+            db.execute("DELETE FROM ready WHERE sid IN (?, ?)", (sid_a, sid_b))
+            return True
+
+    def remove_if(self, sids, is_stale):
+        with self.store._transaction() as db:
+            for sid in sids:
+                if db.execute("SELECT 1 FROM ready WHERE sid = ?", (sid,)).fetchone() and is_stale(sid):
+                    db.execute("DELETE FROM ready WHERE sid = ?", (sid,))
+
+    def snapshot(self):
+        return [row[0] for row in self.store._db().execute("SELECT sid FROM ready ORDER BY seq")]
+
+    def __contains__(self, sid):
+        return self.store._db().execute("SELECT 1 FROM ready WHERE sid = ?", (sid,)).fetchone() is not None
+
+    def __len__(self):
+        return self.store._db().execute("SELECT COUNT(*) FROM ready").fetchone()[0]
+
+
+class SQLiteStateStore:
+    """
+    Shared store in a SQLite file (WAL mode) for several worker processes on one machine.
+    Game locks are striped byte-range file locks, so moves in different games still run
+    in parallel across workers; a separate byte is the matching lock.
+    """
+    LOCK_STRIPES = 4096
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise RuntimeError("SQLiteStateStore needs POSIX file locking (fcntl)")
+        self.path = path
+        self._local = threading.local()
+        self.players = _SQLitePlayers(self)
+        self.ready = _SQLiteReadyPool(self)
+        self._lock_file = open(path + '.locks', 'a+b')
+        self._stripe_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES + 1)]
+        self._played_cursor = 0  # Last played-with row merged into the local matching engine
+
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        with self._file_lock(self.LOCK_STRIPES):  # Only one worker creates the schema
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS players (id INTEGER PRIMARY KEY AUTOINCREMENT, sid TEXT UNIQUE, data TEXT);
+                CREATE TABLE IF NOT EXISTS games (key TEXT PRIMARY KEY, data TEXT);
+                CREATE TABLE IF NOT EXISTS ready (seq INTEGER PRIMARY KEY AUTOINCREMENT, sid TEXT UNIQUE);
+                CREATE TABLE IF NOT EXISTS played (id INTEGER PRIMARY KEY AUTOINCREMENT, a TEXT, b TEXT);
+            """)
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so reads inside see no other writer
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @contextmanager
+    def _file_lock(self, stripe):
+        # fcntl locks are per process, so threads in this process also need a thread lock
+        with self._stripe_locks[stripe]:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, stripe)
+
+    def _write_player(self, sid, data):
+        self._db().execute(
+            "INSERT INTO players (sid, data) VALUES (?, ?) ON CONFLICT(sid) DO UPDATE SET data = excluded.data",
+            (sid, json.dumps(data)))
+
+    def player_number(self, sid):
+        row = self._db().execute("SELECT id FROM players WHERE sid = ?", (sid,)).fetchone()
+        return row[0] if row else -1
+
+    def put_game(self, game):
+        self.save_game(game)
+
+    @contextmanager
+    def locked_game(self, key):
+        if not key:
+            yield None
+            return
+        with self._file_lock(zlib.crc32(key.encode()) % self.LOCK_STRIPES):
+            row = self._db().execute("SELECT data FROM games WHERE key = ?", (key,)).fetchone()
+            yield GameState.from_dict(json.loads(row[0])) if row else None
+
+    def save_game(self, game):
+        self._db().execute("INSERT OR REPLACE INTO games (key, data) VALUES (?, ?)",
+                           (game.key, json.dumps(game.to_dict())))
+
+    def delete_game(self, key):
+        self._db().execute("DELETE FROM games WHERE key = ?", (key,))
+
+    def game_count(self):
+        return self._db().execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def match_lock(self):
+        return self._file_lock(self.LOCK_STRIPES)
+
+    def record_played(self, sid_a, sid_b):
+        self._db().execute("INSERT INTO played (a, b) VALUES (?, ?)", (sid_a, sid_b))
+
+    def sync_matching(self, engine):
+        """
+        Merges played-with pairs recorded by any worker since the last sync into engine.
+        Call with match_lock() held.
+        """
+        rows = self._db().execute("SELECT id, a, b FROM played WHERE id > ? ORDER BY id",
+                                  (self._played_cursor,)).fetchall()
+        for row_id, a, b in rows:
+            engine.record_game(a, b)
+            self._played_cursor = row_id
+
+
+def open_state_store(url):
+    """
+    Opens a store from a STATE_STORE setting: 'memory' or 'sqlite:/path/to/state.db'.
+    """
+    if not url or url == 'memory':
+        return MemoryStateStore()
+    if url.startswith('sqlite:'):
+        path = url[len('sqlite:'):]
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return SQLiteStateStore(path)
+    raise ValueError(f"Unknown STATE_STORE '{url}' (use 'memory' or 'sqlite:/path/to/state.db')")
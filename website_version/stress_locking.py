@@ -0,0 +1,228 @@
+"""
+Stress test for the matchmaking server's move path: imports app_gemini.py with a state
+store and drives its real 'join', 'commander_start' and 'move' handlers from many
+concurrent Socket.IO test clients, one thread each. Every client clicks as fast as it
+can whether or not it is its turn, and sometimes twice in a row, so both players of a
+game (and duplicate clicks) race through handle_move -> locked_game -> _apply_move.
+
+    python stress_locking.py --store memory --players 2 4 8 16 32 64 --seconds 5
+    python stress_locking.py --store sqlite --players 8 16 32 --seconds 5 --workers 2
+
+Each --players count (clients per worker) is a fresh server run with about half as many
+concurrent games. It reports the moves applied per second at each size; with per-game
+locks that should grow with the number of concurrent games.
+
+With --store sqlite and several workers, each worker is a separate process serving its
+own clients against one SQLite store, so the cross-process stripe locks are in play too.
+Emits between workers need a message queue and are not checked; state is.
+
+After each run it checks that the state stayed consistent and exits with status 1 if not:
+  - every logged game has exactly one take, as its last move, and no pair played twice
+  - every player's total equals the sum of their payoffs in the session logs
+  - every game still in the store has no take, both players in it, and the turn flag
+    on the player whose turn it is by the move count; every player in a game has one stored
+  - every idle, ready player is in the ready pool or has played every other idle player
+"""
+import argparse, collections, json, os, random, subprocess, sys, tempfile, threading, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def stored_state(store, engine=None):
+    """
+    Returns the players ({sid: record}), games (dicts), ready pool (sids) and played-with
+    pairs in a state store. The memory store keeps no played-with rows, so pass its engine.
+    """
+    players = {sid: dict(data) for sid, data in list(store.players.items())}
+    if hasattr(store, 'games'):
+        games = [game.to_dict() for game in list(store.games.values())]
+        played = [[engine.sids[a], engine.sids[b]] for a, mask in enumerate(engine.played)
+                  for b in range(a + 1, len(engine.sids)) if mask >> b & 1]
+    else:
+        games = [json.loads(row[0]) for row in store._db().execute("SELECT data FROM games")]
+        played = [list(row) for row in store._db().execute("SELECT a, b FROM played")]
+    return {'players': players, 'games': games, 'ready': store.ready.snapshot(), 'played': played}
+
+
+def run_worker(args):
+    """
+    One server process: joins its clients, starts matching, and hammers the move handler.
+    """
+    os.chdir(args.dir)  # app_gemini.py writes its logs under ./logs
+    sys.path.insert(0, HERE)
+    import app_gemini
+
+    rng = random.Random(args.seed * 1000 + args.worker)
+    clients = []
+    for i in range(args.players[0]):
+        client = app_gemini.socketio.test_client(app_gemini.app)
+        client.emit('join', {'name': f"w{args.worker}p{i}"})
+        clients.append(client)
+    total = args.players[0] * args.workers
+    deadline = time.monotonic() + 30
+    while len(app_gemini.players) < total and time.monotonic() < deadline:
+        time.sleep(0.05)  # Other workers are still joining
+    clients[0].emit('commander_start')
+
+    sent = collections.Counter()
+
+    def click(client, seed):
+        client_rng = random.Random(seed)
+        stop = time.monotonic() + args.seconds
+        while time.monotonic() < stop:
+            move = 'take' if client_rng.random() < args.take else 'pass'
+            client.emit('move', {'move': move})
+            sent[id(client)] += 1
+            if client_rng.random() < args.duplicate:
+                client.emit('move', {'move': move})  # A double click
+                sent[id(client)] += 1
+            client.get_received()  # Drop the frames so the queue does not grow
+
+    threads = [threading.Thread(target=click, args=(client, rng.random())) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    time.sleep(args.settle)  # Let the last matching passes and game starts finish
+
+    with app_gemini.state_store.match_lock():  # No matching pass half done
+        app_gemini.state_store.sync_matching(app_gemini.matching_engine)
+        state = stored_state(app_gemini.state_store, app_gemini.matching_engine)
+    with open(os.path.join(args.dir, f"worker{args.worker}.json"), 'w') as f:
+        json.dump(dict(state, moves_sent=sum(sent.values()), seconds=elapsed), f)
+    app_gemini.score_ledger.close()
+    app_gemini.log_pipeline.close()
+    os._exit(0)  # Background tasks are still sleeping; the results are written
+
+
+def check(directory, state):
+    """
+    Returns a list of consistency errors (empty if the state is consistent), the games
+    logged and the moves applied (logged games and games in progress).
+    """
+    from analytics import find_session_logs, iter_games
+
+    players, games = state['players'], state['games']
+    errors = []
+    expected = collections.Counter()
+    pairs = set()
+    logged = moves_applied = 0
+    for path in find_session_logs([os.path.join(directory, 'logs')]):
+        for game in iter_games(path, names={}):
+            logged += 1
+            moves_applied += len(game.moves)
+            if game.moves.count('x') != 1 or not game.moves.endswith('x'):
+                errors.append(f"{game.p1[:4]}-{game.p2[:4]}: moves {game.moves} do not end in exactly one take")
+            pair = frozenset((game.p1, game.p2))
+            if pair in pairs:
+                errors.append(f"{game.p1[:4]}-{game.p2[:4]}: played twice")
+            pairs.add(pair)
+            expected[game.p1] += game.p1_payoff
+            expected[game.p2] += game.p2_payoff
+    for sid, data in players.items():
+        if data['total_score'] != expected[sid]:
+            errors.append(f"{sid[:4]}: total {data['total_score']}, logged games add up to {expected[sid]}")
+    for game in games:
+        moves = game['moves']
+        moves_applied += len(moves)
+        p1, p2 = players.get(game['p1_sid']), players.get(game['p2_sid'])
+        name = f"{game['p1_sid'][:4]}-{game['p2_sid'][:4]}"
+        if 'x' in moves:
+            errors.append(f"{name}: taken but still stored ({moves})")
+        if not p1 or not p2 or not p1['in_game'] or not p2['in_game']:
+            errors.append(f"{name}: a player is not in the game")
+        elif p1['turn'] != (len(moves) % 2 == 0) or p2['turn'] == p1['turn']:
+            errors.append(f"{name}: turn flags {p1['turn']}/{p2['turn']} after {len(moves)} moves")
+    stored = {f"{game['p1_sid']}:{game['p2_sid']}" for game in games}
+    for sid, data in players.items():
+        if data['in_game'] and data['game_key'] not in stored:
+            errors.append(f"{sid[:4]}: in a game that is not stored")
+
+    # A player left out of the pool would never be matched again
+    idle = {sid for sid, data in players.items() if not data['in_game'] and data['ready_for_next_game']}
+    ready = set(state['ready'])
+    played = collections.defaultdict(set)
+    for a, b in state['played']:
+        played[a].add(b)
+        played[b].add(a)
+    for sid in idle - ready:
+        unplayed = idle - played[sid] - {sid}
+        if unplayed:
+            errors.append(f"{sid[:4]}: idle and ready but not in the pool, with {len(unplayed)} unplayed idle opponents")
+    return errors, logged, moves_applied
+
+
+def run(args, players):
+    """
+    One server run with players clients per worker. Returns (its directory, errors, games
+    logged, moves applied, clicks sent, seconds).
+    """
+    directory = tempfile.mkdtemp(prefix='stress_locking_')
+    store_url = f"sqlite:{directory}/state.db" if args.store == 'sqlite' else 'memory'
+    env = dict(os.environ, STATE_STORE=store_url, ASYNC_MODE='threading', PAYOFF_SCHEDULE='linear',
+               SEED=str(args.seed), PROFILE='', CHECKPOINT_DIR='')
+    env.pop('PAYOFF_CONFIG', None)
+    env.pop('SOCKETIO_MESSAGE_QUEUE', None)
+    workers = []
+    for worker in range(args.workers):
+        command = [sys.executable, os.path.abspath(__file__), '--worker', str(worker), '--dir', directory,
+                   '--store', args.store, '--players', str(players), '--workers', str(args.workers),
+                   '--seconds', str(args.seconds), '--take', str(args.take), '--duplicate', str(args.duplicate),
+                   '--settle', str(args.settle), '--seed', str(args.seed)]
+        workers.append(subprocess.Popen(command, env=dict(env, WORKER_ID=str(worker) if args.workers > 1 else ''),
+                                        stdout=subprocess.DEVNULL))
+    if any(worker.wait() for worker in workers):
+        sys.exit(f"A worker failed (logs in {directory})")
+
+    results = []
+    for worker in range(args.workers):
+        with open(os.path.join(directory, f"worker{worker}.json")) as f:
+            results.append(json.load(f))
+    if args.store == 'sqlite':
+        from state_store import open_state_store
+        state = stored_state(open_state_store(store_url))  # The shared state after every worker
+    else:
+        state = results[0]
+    errors, logged, moves_applied = check(directory, state)
+    sent = sum(result['moves_sent'] for result in results)
+    seconds = max(result['seconds'] for result in results)
+    return directory, errors, logged, moves_applied, sent, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the real move path from concurrent clients and check consistency.")
+    parser.add_argument('--store', choices=['memory', 'sqlite'], default='memory')
+    parser.add_argument('--players', type=int, nargs='+', default=[2, 4, 8, 16, 32, 64],
+                        help="clients per worker, one run per count")
+    parser.add_argument('--workers', type=int, default=1, help="server processes (sqlite only)")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--take', type=float, default=0.1, help="probability a click is 'take'")
+    parser.add_argument('--duplicate', type=float, default=0.2, help="probability a click is sent twice")
+    parser.add_argument('--settle', type=float, default=1.0, help="seconds to wait after the clicking stops")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--dir', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker is not None:
+        run_worker(args)
+    if args.store == 'memory' and args.workers != 1:
+        parser.error("the memory store serves a single worker")
+
+    print(f"{args.store} store, {args.workers} worker(s), {args.seconds:g}s per run")
+    print(f"{'games':>6} {'players':>8} {'clicks/s':>9} {'moves/s':>9} {'finished':>9}  state")
+    failed = False
+    for players in args.players:
+        directory, errors, logged, moves_applied, sent, seconds = run(args, players)
+        total = players * args.workers
+        print(f"{total // 2:>6} {total:>8} {sent / seconds:>9.0f} {moves_applied / seconds:>9.0f} {logged:>9}  "
+              f"{'consistent' if not errors else f'{len(errors)} INCONSISTENCIES (logs in {directory})'}")
+        for error in errors[:20]:
+            print(f"    {error}")
+        failed = failed or bool(errors)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import heapq, itertools, threading, time
+
+
+class DeadlineScheduler:
+    """
+    One background task for every pending deadline (e.g. one turn deadline per game).
+    Deadlines live in a heap keyed by an id; setting a key again replaces its deadline
+    and cancelling it is O(1): replaced entries are left in the heap and skipped when
+    they surface, and the heap is rebuilt once stale entries outnumber live ones.
+    The loop wakes every `tick` seconds and runs every callback that is due, so
+    thousands of pending deadlines cost one sleeping task plus O(log n) per change.
+    """
+
+    def __init__(self, socketio, tick=0.25):
+        self.socketio = socketio
+        self.tick = tick
+        self.lock = threading.Lock()
+        self.heap = []  # (due, seq, key)
+        self.pending = {}  # key -> (seq, callback, args) for the live deadline
+        self.seq = itertools.count()
+        self.running = False
+        self.fired = 0
+
+    def set(self, key, delay, callback, *args):
+        """
+        Calls callback(*args) in delay seconds unless key is set again or cancelled first.
+        """
+        seq = next(self.seq)
+        with self.lock:
+            self.pending[key] = (seq, callback, args)
+            heapq.heappush(self.heap, (time.monotonic() + delay, seq, key))
+            if len(self.heap) > 64 and len(self.heap) > 2 * len(self.pending):
+                self._compact()
+            start = not self.running
+            self.running = True
+        if start:
+            self.socketio.start_background_task(self._run)
+
+    def cancel(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _compact(self):
+        live = {seq for seq, _, _ in self.pending.values()}
+        self.heap = [entry for entry in self.heap if entry[1] in live]
+        heapq.heapify(self.heap)
+
+    def _pop_due(self, now):
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self.heap)
+                entry = self.pending.get(key)
+                if entry is not None and entry[0] == seq:  # Not replaced or cancelled since
+                    del self.pending[key]
+                    due.append(entry)
+        return due
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.tick)
+            for _, callback, args in self._pop_due(time.monotonic()):
+                self.fired += 1
+                try:
+                    callback(*args)
+                except Exception as e:  # One failing callback must not stop every other deadline
+                    print(f"Deadline callback {getattr(callback, '__name__', callback)} failed: {e!r}")